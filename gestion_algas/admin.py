@@ -3,7 +3,7 @@
 Configuración del panel de administración de Django
 """
 from django.contrib import admin
-from .models import Usuario, TipoAlga, RegistroProduccion, ControlAcceso, CapacidadProductiva, ConfiguracionReporte
+from .models import Usuario, TipoAlga, Sector, RegistroProduccion, ControlAcceso, CapacidadProductiva, ConfiguracionReporte, ProduccionMensual, TrabajoReporte
 
 
 @admin.register(Usuario)
@@ -42,10 +42,11 @@ class UsuarioAdmin(admin.ModelAdmin):
 @admin.register(TipoAlga)
 class TipoAlgaAdmin(admin.ModelAdmin):
     """Administración de tipos de algas"""
-    list_display = ['nombre', 'factor_conversion', 'activo', 'fecha_creacion']
+    list_display = ['nombre', 'factor_conversion', 'activo', 'total_registros', 'total_cosechado', 'ultima_cosecha']
     list_filter = ['activo', 'fecha_creacion']
     search_fields = ['nombre', 'descripcion']
     ordering = ['nombre']
+    readonly_fields = ['total_cosechado', 'total_registros', 'primera_cosecha', 'ultima_cosecha']
     
     fieldsets = (
         ('Información Básica', {
@@ -54,14 +55,27 @@ class TipoAlgaAdmin(admin.ModelAdmin):
         ('Configuración', {
             'fields': ('factor_conversion', 'activo')
         }),
+        ('Producción Histórica', {
+            'fields': ('total_cosechado', 'total_registros', 'primera_cosecha', 'ultima_cosecha')
+        }),
     )
 
 
+@admin.register(Sector)
+class SectorAdmin(admin.ModelAdmin):
+    """Administración del catálogo de sectores"""
+    list_display = ['nombre', 'clave', 'activo', 'fecha_creacion']
+    list_filter = ['activo']
+    search_fields = ['nombre', 'clave']
+    ordering = ['nombre']
+    readonly_fields = ['clave']
+
+
 @admin.register(RegistroProduccion)
 class RegistroProduccionAdmin(admin.ModelAdmin):
     """Administración de registros de producción"""
     list_display = ['fecha_registro', 'usuario', 'tipo_alga', 'cantidad_cosechada', 'sector']
-    list_filter = ['fecha_registro', 'tipo_alga', 'usuario']
+    list_filter = ['fecha_registro', 'tipo_alga', 'sector_catalogo', 'usuario']
     search_fields = ['sector', 'observaciones', 'usuario__username', 'tipo_alga__nombre']
     date_hierarchy = 'fecha_registro'
     ordering = ['-fecha_registro']
@@ -124,6 +138,10 @@ class CapacidadProductivaAdmin(admin.ModelAdmin):
     
     readonly_fields = ['fecha_creacion', 'fecha_modificacion']
     
+    def get_queryset(self, request):
+        """Anotar el volumen producido para no consultar el resumen por cada fila"""
+        return super().get_queryset(request).con_volumen_producido()
+    
     def disponibilidad_mensual(self, obj):
         """Mostrar disponibilidad calculada"""
         return f"{obj.disponibilidad_mensual:.2f} kg"
@@ -135,6 +153,19 @@ class CapacidadProductivaAdmin(admin.ModelAdmin):
     porcentaje_utilizado.short_description = '% Utilizado'
 
 
+@admin.register(ProduccionMensual)
+class ProduccionMensualAdmin(admin.ModelAdmin):
+    """Consulta del resumen mensual de producción (mantenido automáticamente)"""
+    list_display = ['mes', 'total_cosechado', 'total_registros']
+    ordering = ['-mes']
+    
+    readonly_fields = ['mes', 'total_cosechado', 'total_registros']
+    
+    def has_add_permission(self, request):
+        """El resumen se mantiene desde los registros de producción"""
+        return False
+
+
 @admin.register(ConfiguracionReporte)
 class ConfiguracionReporteAdmin(admin.ModelAdmin):
     """Administración de configuraciones de reportes"""
@@ -163,3 +194,13 @@ class ConfiguracionReporteAdmin(admin.ModelAdmin):
     )
     
     readonly_fields = ['fecha_creacion', 'fecha_modificacion']
+
+
+@admin.register(TrabajoReporte)
+class TrabajoReporteAdmin(admin.ModelAdmin):
+    """Seguimiento de los trabajos de reportes en segundo plano"""
+    list_display = ['id', 'tipo', 'configuracion', 'estado', 'usuario', 'fecha_creacion', 'fecha_fin']
+    list_filter = ['estado', 'tipo']
+    ordering = ['-fecha_creacion']
+    
+    readonly_fields = ['fecha_creacion', 'fecha_inicio', 'fecha_fin', 'error']
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class GestionAlgasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gestion_algas'
+
+    def ready(self):
+        from . import conexion, signals  # noqa: F401
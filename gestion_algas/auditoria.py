@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Registro diferido de eventos de acceso (ControlAcceso)
+
+Los eventos se acumulan en memoria y se insertan con bulk_create desde un
+hilo en segundo plano, al llegar a AUDITORIA_TAMANO_LOTE eventos o cada
+AUDITORIA_INTERVALO segundos. Con AUDITORIA_ASINCRONA = False cada evento
+se inserta de inmediato (modo usado en los tests).
+
+archivar_accesos mantiene la tabla acotada: mueve los accesos anteriores a
+una fecha a archivos mensuales NDJSON comprimidos con gzip y los elimina
+en lotes.
+"""
+import atexit
+import gzip
+import json
+import logging
+import os
+import threading
+from collections import Counter, defaultdict
+from pathlib import Path
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections
+from django.utils import timezone
+from .models import ControlAcceso
+
+logger = logging.getLogger(__name__)
+
+
+class AuditoriaDiferida:
+    """Buffer de eventos de acceso que se vacía en lotes"""
+
+    def __init__(self, tamano_lote=50, intervalo=2.0):
+        self.tamano_lote = tamano_lote
+        self.intervalo = intervalo
+        self._pendientes = []
+        self._lock = threading.Lock()
+        self._evento = threading.Event()
+        self._hilo = None
+
+    def registrar(self, **datos):
+        """Encolar un evento; los datos son los campos de ControlAcceso"""
+        datos.setdefault('fecha_acceso', timezone.now())
+        with self._lock:
+            self._pendientes.append(ControlAcceso(**datos))
+            lleno = len(self._pendientes) >= self.tamano_lote
+        self._iniciar_hilo()
+        if lleno:
+            self._evento.set()
+
+    def vaciar(self):
+        """Insertar todos los eventos pendientes. Retorna cuántos se escribieron"""
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, []
+        if not pendientes:
+            return 0
+        try:
+            ControlAcceso.objects.bulk_create(pendientes, batch_size=self.tamano_lote)
+        except IntegrityError:
+            # Algún usuario fue eliminado antes de escribir el lote
+            for acceso in pendientes:
+                acceso.usuario_id = None
+            ControlAcceso.objects.bulk_create(pendientes, batch_size=self.tamano_lote)
+        return len(pendientes)
+
+    def _iniciar_hilo(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(
+                    target=self._ejecutar, name='auditoria-accesos', daemon=True
+                )
+                self._hilo.start()
+
+    def _ejecutar(self):
+        while True:
+            self._evento.wait(self.intervalo)
+            self._evento.clear()
+            try:
+                self.vaciar()
+            except Exception:
+                logger.exception('No se pudieron guardar los eventos de auditoría')
+            finally:
+                close_old_connections()
+
+
+auditoria = AuditoriaDiferida(
+    tamano_lote=getattr(settings, 'AUDITORIA_TAMANO_LOTE', 50),
+    intervalo=getattr(settings, 'AUDITORIA_INTERVALO', 2.0),
+)
+atexit.register(auditoria.vaciar)
+
+
+def registrar_evento_acceso(tipo, ip_origen, usuario=None, detalles=None):
+    """Registrar un evento de acceso, en lote o de inmediato según AUDITORIA_ASINCRONA"""
+    datos = {
+        'usuario_id': getattr(usuario, 'pk', None),
+        'ip_origen': ip_origen,
+        'tipo_acceso': tipo,
+        'detalles': detalles,
+    }
+    if getattr(settings, 'AUDITORIA_ASINCRONA', False):
+        auditoria.registrar(**datos)
+    else:
+        ControlAcceso.objects.create(**datos)
+
+
+# Campos de cada acceso guardados en el archivo; el nombre de usuario se
+# guarda porque el usuario puede eliminarse después
+CAMPOS_ARCHIVO = ('id', 'fecha_acceso', 'usuario_id', 'usuario__username', 'ip_origen', 'tipo_acceso', 'detalles')
+
+
+def ruta_archivo_mes(directorio, mes):
+    """Archivo de los accesos de un mes ('AAAA-MM', hora local)"""
+    return Path(directorio) / f'accesos-{mes}.ndjson.gz'
+
+
+def archivar_accesos(antes_de, directorio, tamano_lote=1000):
+    """
+    Mueve los accesos con fecha_acceso anterior a antes_de a archivos
+    mensuales (accesos-AAAA-MM.ndjson.gz) y los elimina de la tabla.
+
+    Cada lote se agrega a los archivos de sus meses (un miembro gzip más
+    por lote) y se sincroniza a disco antes de eliminar sus filas, con un
+    DELETE por lote para no bloquear la tabla. Si el proceso se interrumpe
+    entre ambos pasos, el lote se vuelve a archivar en la siguiente
+    ejecución: un id puede repetirse en el archivo, pero nunca se pierde.
+
+    Returns:
+        Counter con la cantidad de accesos archivados por mes
+    """
+    directorio = Path(directorio)
+    directorio.mkdir(parents=True, exist_ok=True)
+    archivados = Counter()
+    antiguos = ControlAcceso.objects.filter(fecha_acceso__lt=antes_de).order_by('fecha_acceso', 'id')
+
+    while True:
+        lote = list(antiguos.values(*CAMPOS_ARCHIVO)[:tamano_lote])
+        if not lote:
+            return archivados
+
+        por_mes = defaultdict(list)
+        for fila in lote:
+            fecha = fila['fecha_acceso']
+            fila['fecha_acceso'] = fecha.isoformat()
+            fila['usuario'] = fila.pop('usuario__username')
+            por_mes[timezone.localtime(fecha).strftime('%Y-%m')].append(fila)
+
+        for mes, filas in por_mes.items():
+            with open(ruta_archivo_mes(directorio, mes), 'ab') as archivo:
+                with gzip.GzipFile(fileobj=archivo, mode='wb') as comprimido:
+                    for fila in filas:
+                        comprimido.write((json.dumps(fila, ensure_ascii=False) + '\n').encode('utf-8'))
+                archivo.flush()
+                os.fsync(archivo.fileno())
+            archivados[mes] += len(filas)
+
+        ControlAcceso.objects.filter(id__in=[fila['id'] for fila in lote]).delete()
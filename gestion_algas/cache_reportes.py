@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Caché en disco de los archivos de reportes personalizados
+
+Solo se guardan los reportes de rangos cerrados (fecha personalizada con
+fecha_hasta anterior a hoy), que siempre producen el mismo archivo. La
+clave es un hash de los campos de la configuración, el período y una
+versión de los datos (cantidad, suma, último id y última modificación de
+los registros que coinciden con los filtros), así que cualquier cambio en
+esos registros genera una clave nueva. La clave incluye además la versión
+de los datos del dashboard, que cambia al guardar registros, tipos de alga
+o capacidades (por ejemplo, al renombrar un tipo). El directorio se limita a
+REPORTES_CACHE_MAX_BYTES eliminando primero los archivos usados hace más
+tiempo.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from django.conf import settings
+from django.db.models import Sum, Count, Max
+from django.utils import timezone
+from .estadisticas import version_dashboard
+from .models import CapacidadProductiva, ProduccionMensual
+
+# Subir este número cuando cambien las plantillas o el formato del Excel
+VERSION_FORMATO = 2
+
+EXTENSIONES = {'pdf': '.pdf', 'excel': '.xlsx'}
+
+CAMPOS_EXCLUIDOS = {'id', 'fecha_creacion', 'fecha_modificacion', 'activo'}
+
+
+def directorio_cache():
+    return getattr(settings, 'REPORTES_CACHE_DIR', os.path.join(settings.MEDIA_ROOT, 'cache_reportes'))
+
+
+def es_cacheable(configuracion):
+    """Solo los rangos de fecha personalizados ya cerrados producen siempre el mismo archivo"""
+    return bool(
+        getattr(settings, 'REPORTES_CACHE_MAX_BYTES', 0)
+        and configuracion.usar_fecha_personalizada
+        and configuracion.fecha_desde
+        and configuracion.fecha_hasta
+        and configuracion.fecha_hasta < timezone.localdate()
+    )
+
+
+def version_datos(consulta):
+    """Resumen de los datos que usa el reporte; cambia si cambia algún registro"""
+    configuracion = consulta.configuracion
+    version = consulta.registros.aggregate(
+        cantidad=Count('id'),
+        total=Sum('cantidad_cosechada'),
+        ultimo_id=Max('id'),
+        ultima_modificacion=Max('fecha_modificacion'),
+    )
+
+    if configuracion.mostrar_capacidad_instalada or configuracion.mostrar_disponibilidad:
+        version['capacidad'] = CapacidadProductiva.objects.aggregate(
+            cantidad=Count('id'), ultima_modificacion=Max('fecha_modificacion')
+        )
+        version['produccion_mensual'] = ProduccionMensual.objects.filter(
+            mes__lte=consulta.fecha_hasta.date()
+        ).aggregate(total=Sum('total_cosechado'), registros=Sum('total_registros'))
+
+    return version
+
+
+def clave_reporte(consulta):
+    """Clave del archivo en caché de un ConsultaReporte, o None si el reporte no es cacheable"""
+    configuracion = consulta.configuracion
+    if not es_cacheable(configuracion):
+        return None
+
+    campos = {
+        campo.name: campo.value_from_object(configuracion)
+        for campo in configuracion._meta.concrete_fields
+        if campo.name not in CAMPOS_EXCLUIDOS
+    }
+    datos = {
+        'version_formato': VERSION_FORMATO,
+        'configuracion': campos,
+        'tipos_alga': consulta.tipos_ids,
+        'sectores': consulta.sectores_ids,
+        'periodo': [consulta.fecha_desde, consulta.fecha_hasta],
+        'datos': version_datos(consulta),
+        'version_dashboard': version_dashboard(),
+    }
+    serializado = json.dumps(datos, sort_keys=True, default=str)
+    return hashlib.sha256(serializado.encode('utf-8')).hexdigest()
+
+
+def ruta_archivo(clave, formato):
+    return os.path.join(directorio_cache(), clave + EXTENSIONES[formato])
+
+
+def abrir(clave, formato):
+    """
+    Archivo en caché abierto en modo binario (marcándolo como recién usado)
+    o None. Se retorna abierto para que una limpieza concurrente que lo
+    elimine no deje una ruta que ya no existe.
+    """
+    ruta = ruta_archivo(clave, formato)
+    try:
+        archivo = open(ruta, 'rb')
+    except OSError:
+        return None
+    try:
+        os.utime(ruta)
+    except OSError:
+        # Eliminado después de abrirlo: el archivo abierto se puede leer igual
+        pass
+    return archivo
+
+
+def guardar(clave, formato, contenido):
+    """Guardar el archivo en la caché y aplicar el límite de tamaño"""
+    directorio = directorio_cache()
+    os.makedirs(directorio, exist_ok=True)
+
+    # Escribir en un temporal y renombrar para no servir archivos a medio escribir
+    descriptor, temporal = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+    with os.fdopen(descriptor, 'wb') as archivo:
+        archivo.write(contenido)
+    ruta = ruta_archivo(clave, formato)
+    os.replace(temporal, ruta)
+
+    limpiar(getattr(settings, 'REPORTES_CACHE_MAX_BYTES', 0))
+    return ruta
+
+
+def limpiar(max_bytes):
+    """Eliminar los archivos usados hace más tiempo hasta quedar bajo max_bytes"""
+    directorio = directorio_cache()
+    archivos = []
+    for entrada in os.scandir(directorio):
+        if entrada.is_file() and not entrada.name.endswith('.tmp'):
+            estado = entrada.stat()
+            archivos.append((estado.st_mtime, estado.st_size, entrada.path))
+
+    total = sum(tamano for _, tamano, _ in archivos)
+    for _, tamano, ruta in sorted(archivos):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(ruta)
+        except OSError:
+            continue
+        total -= tamano
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Verificación de la conexión a la base de datos
+
+probar_conexion ejecuta SELECT 1 y mide cuánto tarda, incluyendo la
+conexión si no había una abierta. Se usa al iniciar el servidor (wsgi.py y
+asgi.py, con DB_PROBAR_AL_INICIAR) y como chequeo del sistema de la
+etiqueta database:
+
+    python manage.py check --database default
+"""
+import logging
+import time
+from django.core import checks
+from django.db import connections, DatabaseError
+
+logger = logging.getLogger(__name__)
+
+
+def probar_conexion(alias='default'):
+    """
+    Prueba la conexión indicada.
+
+    Returns:
+        tuple: (True si respondió, segundos transcurridos, excepción o None)
+    """
+    inicio = time.perf_counter()
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+    except DatabaseError as e:
+        return False, time.perf_counter() - inicio, e
+    return True, time.perf_counter() - inicio, None
+
+
+def probar_conexion_al_iniciar(alias='default'):
+    """Probar la conexión al levantar el servidor y dejar el resultado en el log"""
+    ok, segundos, error = probar_conexion(alias)
+    if ok:
+        logger.info('Base de datos "%s" disponible (%.0f ms)', alias, segundos * 1000)
+    else:
+        logger.error('No se pudo conectar a la base de datos "%s": %s', alias, error)
+    # Cada hilo del servidor abre su propia conexión; no dejar abierta la de este
+    connections[alias].close()
+    return ok
+
+
+@checks.register(checks.Tags.database)
+def verificar_conexion_base_datos(app_configs=None, databases=None, **kwargs):
+    """Chequeo del sistema: las bases de datos indicadas deben responder"""
+    errores = []
+    for alias in databases or []:
+        ok, _, error = probar_conexion(alias)
+        if not ok:
+            errores.append(checks.Error(
+                f'No se pudo conectar a la base de datos "{alias}": {error}',
+                hint='Revisa DB_HOST, DB_PORT, DB_NAME, DB_USER y DB_PASSWORD',
+                id='gestion_algas.E001',
+            ))
+    return errores
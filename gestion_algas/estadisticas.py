@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Cálculo de estadísticas de producción compartidas por las vistas y la API
+
+Los datos del dashboard son iguales para todos los usuarios y se guardan en
+la caché de Django por DASHBOARD_CACHE_TTL segundos. La clave incluye una
+versión que se incrementa al guardar o eliminar registros, tipos de alga o
+capacidades (ver signals.py), y el mes y la semana actuales.
+"""
+import hashlib
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum, Count, Max, Q
+from django.utils import timezone
+from .models import RegistroProduccion, TipoAlga, CapacidadProductiva
+from .periodos import agrupar_por_periodo, rango_fechas, rango_periodo
+
+CLAVE_VERSION_DASHBOARD = 'gestion_algas:dashboard:version'
+
+# Capacidad mensual usada si no hay una definida para el mes
+CAPACIDAD_POR_DEFECTO = 2400
+
+
+def calcular_estadisticas_dashboard(semanas=4, ahora=None):
+    """
+    Calcula las estadísticas generales del dashboard en una sola consulta.
+
+    Usa agregación condicional (Count/Sum con filter) sobre la ventana de
+    fechas más amplia necesaria, de modo que la cantidad de consultas no
+    depende del número de semanas graficadas.
+
+    Args:
+        semanas: Número de semanas de 7 días a incluir en el gráfico
+        ahora: Momento de referencia (por defecto timezone.now())
+
+    Returns:
+        dict con total_registros, produccion_semanal y produccion_total del
+        mes actual, y las listas produccion_por_semana y etiquetas_semanas
+        ordenadas de la semana más antigua a la más reciente.
+    """
+    if ahora is None:
+        ahora = timezone.now()
+
+    inicio_mes, _ = rango_periodo(timezone.localdate(ahora), 'mes')
+    hace_una_semana = ahora - timedelta(days=7)
+
+    # Rangos [inicio, fin) de cada semana, de la más antigua a la más reciente
+    rangos = [
+        (ahora - timedelta(weeks=i + 1), ahora - timedelta(weeks=i))
+        for i in reversed(range(semanas))
+    ]
+
+    agregados = {
+        'total_registros': Count('id', filter=Q(fecha_registro__gte=inicio_mes)),
+        'produccion_semanal': Sum('cantidad_cosechada', filter=Q(fecha_registro__gte=hace_una_semana)),
+        'produccion_total': Sum('cantidad_cosechada', filter=Q(fecha_registro__gte=inicio_mes)),
+    }
+    for indice, (inicio, fin) in enumerate(rangos):
+        agregados[f'semana_{indice}'] = Sum(
+            'cantidad_cosechada',
+            filter=Q(fecha_registro__gte=inicio, fecha_registro__lt=fin)
+        )
+
+    desde = min([inicio_mes, hace_una_semana] + [inicio for inicio, _ in rangos])
+    resultado = RegistroProduccion.objects.filter(
+        fecha_registro__gte=desde
+    ).aggregate(**agregados)
+
+    return {
+        'total_registros': resultado['total_registros'],
+        'produccion_semanal': resultado['produccion_semanal'] or 0,
+        'produccion_total': resultado['produccion_total'] or 0,
+        'produccion_por_semana': [
+            round(float(resultado[f'semana_{indice}'] or 0), 2)
+            for indice in range(len(rangos))
+        ],
+        'etiquetas_semanas': [
+            f"{inicio.strftime('%d/%m')} - {fin.strftime('%d/%m')}"
+            for inicio, fin in rangos
+        ],
+        'inicio_mes': inicio_mes,
+    }
+
+
+def version_dashboard():
+    """Versión actual de los datos del dashboard en la caché"""
+    # Parte de la hora actual para no reutilizar entradas viejas si la clave se pierde
+    cache.add(CLAVE_VERSION_DASHBOARD, time.time_ns(), None)
+    return cache.get(CLAVE_VERSION_DASHBOARD, 0)
+
+
+def invalidar_dashboard():
+    """Incrementar la versión para que el próximo acceso recalcule los datos"""
+    try:
+        cache.incr(CLAVE_VERSION_DASHBOARD)
+    except ValueError:
+        cache.set(CLAVE_VERSION_DASHBOARD, time.time_ns(), None)
+
+
+def datos_dashboard(ahora=None):
+    """
+    Datos del dashboard comunes a todos los usuarios: estadísticas
+    semanales y mensuales, producción por tipo de alga y capacidad del mes.
+
+    Se leen de la caché si DASHBOARD_CACHE_TTL es mayor que cero.
+    """
+    ttl = getattr(settings, 'DASHBOARD_CACHE_TTL', 0)
+    if not ttl:
+        return calcular_datos_dashboard(ahora)
+
+    local = timezone.localtime(ahora or timezone.now())
+    anio, semana, _ = local.isocalendar()
+    clave = 'gestion_algas:dashboard:{}:{}:{}-{:02d}'.format(
+        version_dashboard(), local.strftime('%Y-%m'), anio, semana
+    )
+    datos = cache.get(clave)
+    if datos is None:
+        datos = calcular_datos_dashboard(ahora)
+        cache.set(clave, datos, ttl)
+    return datos
+
+
+def calcular_datos_dashboard(ahora=None):
+    """Calcula los datos compartidos del dashboard (ver datos_dashboard)"""
+    estadisticas = calcular_estadisticas_dashboard(semanas=4, ahora=ahora)
+    inicio_mes = estadisticas['inicio_mes']
+
+    # Producción por tipo de alga (totales mantenidos en cada tipo, sin recorrer los registros)
+    produccion_por_tipo = list(TipoAlga.objects.filter(
+        total_cosechado__gt=0
+    ).order_by('-total_cosechado').values('nombre', 'total_cosechado'))
+
+    # Capacidad del mes actual
+    capacidad_mes_actual = CapacidadProductiva.objects.filter(
+        mes__year=inicio_mes.year,
+        mes__month=inicio_mes.month
+    ).first()
+
+    if capacidad_mes_actual:
+        capacidad_total = capacidad_mes_actual.capacidad_mensual_maxima
+    else:
+        capacidad_total = CAPACIDAD_POR_DEFECTO
+
+    # Calcular porcentaje de capacidad utilizada
+    if capacidad_total > 0:
+        porcentaje_capacidad = round((float(estadisticas['produccion_total']) / float(capacidad_total)) * 100, 1)
+    else:
+        porcentaje_capacidad = 0
+
+    return dict(
+        estadisticas,
+        produccion_por_tipo=produccion_por_tipo,
+        capacidad_total=capacidad_total,
+        porcentaje_capacidad=porcentaje_capacidad,
+    )
+
+
+def registros_periodo(desde, hasta, tipo_alga_id=None, sector_id=None):
+    """Registros entre dos fechas locales (inclusive) con filtros opcionales"""
+    inicio, fin = rango_fechas(desde, hasta)
+    query = RegistroProduccion.objects.filter(fecha_registro__gte=inicio, fecha_registro__lt=fin)
+    if tipo_alga_id:
+        query = query.filter(tipo_alga_id=tipo_alga_id)
+    if sector_id:
+        query = query.filter(sector_catalogo_id=sector_id)
+    return query
+
+
+def version_registros(query, filtros=''):
+    """
+    Retorna (etag, última modificación) de un conjunto de registros.
+
+    Cambia al crear (id y fecha), editar (fecha de modificación) o
+    eliminar (cantidad) cualquiera de ellos. filtros identifica la
+    consulta, para que dos conjuntos distintos no compartan etag.
+    """
+    version = query.order_by().aggregate(
+        cantidad=Count('id'),
+        ultimo_id=Max('id'),
+        ultima_modificacion=Max('fecha_modificacion'),
+    )
+    firma = '{}:{cantidad}:{ultimo_id}:{ultima_modificacion}'.format(filtros, **version)
+    return hashlib.sha256(firma.encode('utf-8')).hexdigest()[:32], version['ultima_modificacion']
+
+
+def produccion_diaria(query, desde, hasta, etag=None):
+    """
+    Total cosechado por día (hora local) de los registros indicados, que
+    deben estar limitados a los días desde..hasta (ver registros_periodo).
+
+    Con etag el resultado se guarda en la caché bajo esa versión, así que
+    no se recalcula mientras los registros no cambien.
+    """
+    ttl = getattr(settings, 'API_PRODUCCION_CACHE_TTL', 0)
+    clave = f'gestion_algas:produccion_diaria:{etag}' if etag and ttl else None
+    if clave:
+        resultado = cache.get(clave)
+        if resultado is not None:
+            return resultado
+
+    totales = agrupar_por_periodo(query, 'dia', desde, hasta, total=Sum('cantidad_cosechada'))
+    resultado = [
+        {'fecha': item['periodo'].isoformat(), 'total': float(item['total'])}
+        for item in totales
+    ]
+    if clave:
+        cache.set(clave, resultado, ttl)
+    return resultado
@@ -0,0 +1,515 @@
+# -*- coding: utf-8 -*-
+"""
+Generación de los reportes exportables (PDF y Excel)
+
+Las funciones de este módulo no dependen del request, de modo que se usan
+tanto desde las vistas como desde el procesador de trabajos en segundo plano.
+"""
+import csv
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import BytesIO
+from django.db.models import Sum, Count, Min, Max
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.functional import cached_property
+from .models import RegistroProduccion, CapacidadProductiva
+from .periodos import agrupar_por_periodo, inicio_periodo, siguiente_periodo
+
+CONTENT_TYPE_PDF = 'application/pdf'
+CONTENT_TYPE_EXCEL = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+class ErrorExportacion(Exception):
+    """No se pudo generar el archivo del reporte"""
+
+
+class DependenciaNoInstalada(ErrorExportacion):
+    """Falta la librería necesaria para el formato (xhtml2pdf u openpyxl)"""
+
+
+# ============================================================================
+# REPORTE PERSONALIZADO
+# ============================================================================
+
+def periodo_reporte(configuracion, ahora=None):
+    """Retorna (fecha_desde, fecha_hasta) del reporte según la configuración"""
+    if configuracion.usar_fecha_personalizada and configuracion.fecha_desde and configuracion.fecha_hasta:
+        fecha_desde = timezone.make_aware(datetime.combine(configuracion.fecha_desde, datetime.min.time()))
+        fecha_hasta = timezone.make_aware(datetime.combine(configuracion.fecha_hasta, datetime.max.time()))
+    else:
+        fecha_hasta = ahora or timezone.now()
+        fecha_desde = fecha_hasta - timedelta(days=30 * configuracion.periodo_historial_meses)
+    return fecha_desde, fecha_hasta
+
+
+def factor_unidad(configuracion):
+    """Factor para convertir kg a la unidad de medida del cliente"""
+    if configuracion.unidad_medida == 'ton':
+        return 0.001  # kg a toneladas
+    elif configuracion.unidad_medida == 'lb':
+        return 2.20462  # kg a libras
+    return 1
+
+
+class ConsultaReporte:
+    """
+    Consultas de un reporte personalizado con los filtros evaluados una vez.
+
+    Al crearla se leen los tipos de alga y los sectores de la configuración
+    (una consulta cada uno, o ninguna si se cargaron con prefetch_related).
+    Cada resultado se consulta la primera vez que se pide y queda guardado,
+    así que el PDF, el Excel y el HTML generados con la misma instancia no
+    repiten consultas.
+    """
+
+    def __init__(self, configuracion, fecha_desde, fecha_hasta):
+        self.configuracion = configuracion
+        self.fecha_desde = fecha_desde
+        self.fecha_hasta = fecha_hasta
+        self.tipos_ids = sorted(tipo.pk for tipo in configuracion.tipos_alga.all())
+        self.sectores_ids = sorted(sector.pk for sector in configuracion.sectores.all())
+
+    @property
+    def registros(self):
+        """
+        Registros de producción que cumplen los filtros de la configuración.
+
+        Todas las consultas de reportes parten de aquí para que usen los
+        índices de RegistroProduccion (fecha, tipo de alga o sector como
+        primera columna). Los tipos se pasan como lista de ids y no como
+        subconsulta, que MySQL no siempre resuelve con el índice; lo mismo
+        los sectores, que se filtran por el id del catálogo.
+        """
+        query = RegistroProduccion.objects.filter(
+            fecha_registro__gte=self.fecha_desde,
+            fecha_registro__lte=self.fecha_hasta
+        )
+        if self.tipos_ids:
+            query = query.filter(tipo_alga__in=self.tipos_ids)
+        if self.sectores_ids:
+            query = query.filter(sector_catalogo__in=self.sectores_ids)
+        return query
+
+    @cached_property
+    def produccion(self):
+        """
+        Retorna (historial por tipo, total por mes en hora local).
+
+        Ambos salen de una sola consulta agrupada por mes y tipo de alga.
+        """
+        historial = {}
+        por_mes = {}
+        totales = agrupar_por_periodo(
+            self.registros, 'mes',
+            timezone.localdate(self.fecha_desde), timezone.localdate(self.fecha_hasta),
+            por=('tipo_alga__nombre',),
+            total=Sum('cantidad_cosechada'), registros=Count('id')
+        )
+        for item in totales:
+            nombre = item['tipo_alga__nombre']
+            tipo = historial.setdefault(nombre, {
+                'tipo_alga__nombre': nombre, 'total_cosechado': Decimal('0'), 'total_registros': 0
+            })
+            tipo['total_cosechado'] += item['total']
+            tipo['total_registros'] += item['registros']
+            por_mes[item['periodo']] = por_mes.get(item['periodo'], Decimal('0')) + item['total']
+
+        historial = sorted(historial.values(), key=lambda tipo: tipo['total_cosechado'], reverse=True)
+        return historial, [{'mes': mes, 'total': total} for mes, total in por_mes.items()]
+
+    @cached_property
+    def capacidad(self):
+        """
+        Capacidad del mes en que termina el período o, si no existe, la
+        última anterior, con su volumen producido (una consulta).
+        """
+        mes_final = inicio_periodo(timezone.localdate(self.fecha_hasta), 'mes')
+        return CapacidadProductiva.objects.con_volumen_producido().filter(
+            mes__lt=siguiente_periodo(mes_final, 'mes')
+        ).order_by('-mes').first()
+
+    @cached_property
+    def registros_detallados(self):
+        """Últimos 50 registros del período, para la tabla de observaciones"""
+        return list(
+            self.registros.select_related('tipo_alga', 'usuario').order_by('-fecha_registro')[:50]
+        )
+
+    def filas(self, columnas, tamano_lote=2000):
+        """Tuplas con las columnas de cada registro, leídas por lotes"""
+        return iterar_por_lotes(self.registros, columnas, tamano_lote)
+
+    @cached_property
+    def contexto(self):
+        """Datos del reporte para las plantillas y el Excel"""
+        configuracion = self.configuracion
+        produccion_historial = None
+        produccion_por_mes = None
+        if configuracion.mostrar_historial_produccion:
+            produccion_historial, produccion_por_mes = self.produccion
+
+        # Factor de conversión según unidad
+        factor_conversion = factor_unidad(configuracion)
+
+        capacidad_actual = None
+        capacidad_convertida = None
+        if configuracion.mostrar_capacidad_instalada or configuracion.mostrar_disponibilidad:
+            capacidad_actual = self.capacidad
+            if capacidad_actual:
+                # Convertir valores según unidad de medida
+                capacidad_convertida = {
+                    'capacidad_mensual_maxima': float(capacidad_actual.capacidad_mensual_maxima) * factor_conversion,
+                    'volumen_producido': float(capacidad_actual.volumen_producido) * factor_conversion,
+                    'disponibilidad_mensual': float(capacidad_actual.disponibilidad_mensual) * factor_conversion,
+                    'porcentaje_utilizado': capacidad_actual.porcentaje_utilizado,
+                    'porcentaje_disponible': capacidad_actual.porcentaje_disponible,
+                }
+
+        return {
+            'configuracion': configuracion,
+            'consulta': self,
+            'produccion_historial': produccion_historial,
+            'produccion_por_mes': produccion_por_mes,
+            'capacidad_actual': capacidad_actual,
+            'capacidad_convertida': capacidad_convertida,
+            'factor_conversion': factor_conversion,
+            'fecha_desde': self.fecha_desde,
+            'fecha_hasta': self.fecha_hasta,
+            'fecha_generacion': timezone.now(),
+            'registros_detallados': self.registros_detallados if configuracion.incluir_observaciones else None,
+        }
+
+
+def contexto_reporte_personalizado(configuracion, fecha_desde, fecha_hasta):
+    """Datos del reporte personalizado para las plantillas y el Excel"""
+    return ConsultaReporte(configuracion, fecha_desde, fecha_hasta).contexto
+
+
+def generar_pdf(template, context):
+    """Renderiza una plantilla HTML y la convierte a PDF con xhtml2pdf"""
+    try:
+        from xhtml2pdf import pisa
+    except ImportError:
+        raise DependenciaNoInstalada('xhtml2pdf no está instalado. Ejecuta: pip install xhtml2pdf')
+
+    html_string = render_to_string(template, context)
+
+    # Generar PDF con encoding UTF-8 usando BytesIO
+    destino = BytesIO()
+    pisa_status = pisa.CreatePDF(
+        BytesIO(html_string.encode('utf-8')),
+        dest=destino,
+        encoding='utf-8'
+    )
+
+    if pisa_status.err:
+        raise ErrorExportacion('Error al generar el PDF')
+
+    return destino.getvalue()
+
+
+COLUMNAS_HOJA_REGISTROS = [
+    ('id', 'ID', 10),
+    ('fecha_registro', 'Fecha', 18),
+    ('nombre_usuario', 'Usuario', 20),
+    ('nombre_tipo_alga', 'Tipo de Alga', 20),
+    ('sector', 'Sector', 15),
+    ('cantidad_cosechada', 'Cantidad', 15),
+    ('observaciones', 'Observaciones', 40),
+]
+
+
+def _estilos_excel():
+    """Estilos con nombre del Excel; se registran una vez en el libro y cada celda solo los referencia"""
+    from openpyxl.styles import NamedStyle, Font, PatternFill, Alignment
+
+    titulo = NamedStyle(name='titulo')
+    titulo.font = Font(size=16, bold=True)
+
+    etiqueta = NamedStyle(name='etiqueta')
+    etiqueta.font = Font(bold=True)
+
+    encabezado = NamedStyle(name='encabezado')
+    encabezado.font = Font(bold=True)
+    encabezado.fill = PatternFill(start_color='CCCCCC', end_color='CCCCCC', fill_type='solid')
+    encabezado.alignment = Alignment(horizontal='center')
+
+    numero = NamedStyle(name='numero', number_format='#,##0.00')
+    fecha = NamedStyle(name='fecha', number_format='DD/MM/YYYY HH:MM')
+
+    return [titulo, etiqueta, encabezado, numero, fecha]
+
+
+def generar_excel_personalizado(contexto, tamano_lote=2000):
+    """
+    Construye el libro Excel del reporte personalizado y retorna sus bytes.
+
+    Usa el modo write_only de openpyxl: las filas se escriben en orden y no
+    quedan en memoria, y los estilos se registran una sola vez como estilos
+    con nombre. Si la configuración tiene incluir_hoja_registros se agrega
+    una hoja con cada registro del período, leída por lotes.
+    """
+    try:
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+    except ImportError:
+        raise DependenciaNoInstalada('openpyxl no está instalado. Ejecuta: pip install openpyxl')
+
+    configuracion = contexto['configuracion']
+    produccion_historial = contexto['produccion_historial']
+    factor_conversion = contexto['factor_conversion']
+    unidad = configuracion.get_unidad_medida_display()
+
+    wb = Workbook(write_only=True)
+    for estilo in _estilos_excel():
+        wb.add_named_style(estilo)
+
+    def celda(hoja, valor, estilo):
+        c = WriteOnlyCell(hoja, value=valor)
+        c.style = estilo
+        return c
+
+    ws = wb.create_sheet('Reporte de Producción')
+    # En modo write_only los anchos se fijan antes de escribir filas
+    for col in 'ABCDE':
+        ws.column_dimensions[col].width = 20
+
+    # Encabezado (el modo write_only no permite combinar celdas)
+    ws.append([celda(ws, f'Reporte de Producción - {configuracion.empresa}', 'titulo')])
+    ws.append([])
+
+    # Información general
+    periodo_texto = '{} - {}'.format(
+        contexto['fecha_desde'].strftime('%d/%m/%Y'),
+        contexto['fecha_hasta'].strftime('%d/%m/%Y')
+    )
+    ws.append([celda(ws, 'País:', 'etiqueta'), configuracion.pais])
+    ws.append([celda(ws, 'Período:', 'etiqueta'), periodo_texto])
+    ws.append([celda(ws, 'Fecha de Generación:', 'etiqueta'), timezone.now().strftime('%d/%m/%Y %H:%M')])
+    ws.append([])
+
+    # Tabla de producción
+    if produccion_historial:
+        headers = ['Tipo de Alga', f'Total Cosechado ({unidad})', 'Total Registros']
+        ws.append([celda(ws, header, 'encabezado') for header in headers])
+        for item in produccion_historial:
+            ws.append([
+                item['tipo_alga__nombre'],
+                celda(ws, float(item['total_cosechado']) * factor_conversion, 'numero'),
+                item['total_registros'],
+            ])
+
+    if configuracion.incluir_hoja_registros:
+        _hoja_registros(wb, contexto, celda, tamano_lote)
+
+    destino = BytesIO()
+    wb.save(destino)
+    return destino.getvalue()
+
+
+def _hoja_registros(wb, contexto, celda, tamano_lote):
+    """Hoja con el detalle de los registros del período, escrita fila a fila"""
+    configuracion = contexto['configuracion']
+    factor_conversion = contexto['factor_conversion']
+
+    ws = wb.create_sheet('Registros')
+    for indice, (_, _, ancho) in enumerate(COLUMNAS_HOJA_REGISTROS):
+        ws.column_dimensions[chr(65 + indice)].width = ancho
+
+    encabezados = [titulo for _, titulo, _ in COLUMNAS_HOJA_REGISTROS]
+    encabezados[5] = f'Cantidad ({configuracion.get_unidad_medida_display()})'
+    ws.append([celda(ws, titulo, 'encabezado') for titulo in encabezados])
+
+    columnas = [columna for columna, _, _ in COLUMNAS_HOJA_REGISTROS]
+    for id_, fecha, usuario, tipo, sector, cantidad, observaciones in contexto['consulta'].filas(columnas, tamano_lote):
+        # Excel no admite zona horaria: se escribe la hora local
+        fecha = timezone.localtime(fecha).replace(tzinfo=None)
+        ws.append([
+            id_,
+            celda(ws, fecha, 'fecha'),
+            usuario,
+            tipo,
+            sector,
+            celda(ws, float(cantidad) * factor_conversion, 'numero'),
+            observaciones,
+        ])
+
+
+def exportar_reporte_personalizado(consulta):
+    """
+    Genera el archivo del reporte personalizado (ConsultaReporte) en el
+    formato preferido de su configuración.
+
+    Returns:
+        tuple: (contenido en bytes, nombre de archivo, content type)
+
+    Raises:
+        ErrorExportacion: si el formato no se puede exportar o falla la generación
+    """
+    configuracion = consulta.configuracion
+    formato = formato_archivo(configuracion)
+    if formato is None:
+        raise ErrorExportacion(f'Formato no exportable: {configuracion.formato_preferido}')
+
+    contexto = consulta.contexto
+    if formato == 'pdf':
+        # PDF optimizado (sin gráficos para mejor compatibilidad)
+        contenido = generar_pdf('gestion_algas/reporte_pdf.html', contexto)
+    else:
+        contenido = generar_excel_personalizado(contexto)
+
+    filename, content_type = nombre_archivo_reporte(configuracion)
+    return contenido, filename, content_type
+
+
+def formato_archivo(configuracion):
+    """Formato de archivo ('pdf' o 'excel') del reporte, o None si no es exportable"""
+    if configuracion.formato_preferido in ('pdf', 'ambos'):
+        return 'pdf'
+    if configuracion.formato_preferido == 'excel':
+        return 'excel'
+    return None
+
+
+def nombre_archivo_reporte(configuracion):
+    """Retorna (nombre de archivo, content type) del reporte personalizado"""
+    fecha = timezone.now().strftime('%Y%m%d')
+    if formato_archivo(configuracion) == 'pdf':
+        return 'reporte_{}_{}.pdf'.format(configuracion.empresa.replace(' ', '_'), fecha), CONTENT_TYPE_PDF
+    return 'reporte_{}_{}.xlsx'.format(configuracion.empresa, fecha), CONTENT_TYPE_EXCEL
+
+
+# ============================================================================
+# REPORTE SEMANAL
+# ============================================================================
+
+def contexto_pdf_semanal(inicio, fin):
+    """Datos del PDF de producción semanal entre dos fechas (inclusive)"""
+    # Convertir a datetime para las consultas
+    inicio_dt = timezone.make_aware(datetime.combine(inicio, datetime.min.time()))
+    fin_dt = timezone.make_aware(datetime.combine(fin, datetime.max.time()))
+
+    # Obtener todos los registros de la semana
+    registros = RegistroProduccion.objects.filter(
+        fecha_registro__gte=inicio_dt,
+        fecha_registro__lte=fin_dt
+    ).select_related('tipo_alga', 'usuario').order_by('fecha_registro')
+
+    # Agrupar por tipo de alga
+    produccion_por_tipo = {}
+    total_general = 0
+
+    for registro in registros:
+        tipo = registro.tipo_alga.nombre
+        if tipo not in produccion_por_tipo:
+            produccion_por_tipo[tipo] = {
+                'cantidad': 0,
+                'registros': []
+            }
+        produccion_por_tipo[tipo]['cantidad'] += float(registro.cantidad_cosechada)
+        produccion_por_tipo[tipo]['registros'].append(registro)
+        total_general += float(registro.cantidad_cosechada)
+
+    return {
+        'inicio': inicio,
+        'fin': fin,
+        'produccion_por_tipo': produccion_por_tipo,
+        'total_general': total_general,
+        'registros': registros,
+        'fecha_generacion': timezone.now(),
+    }
+
+
+def exportar_pdf_semanal(inicio, fin):
+    """
+    Genera el PDF de producción semanal.
+
+    Returns:
+        tuple: (contenido en bytes, nombre de archivo, content type)
+    """
+    contenido = generar_pdf('gestion_algas/pdf_semanal.html', contexto_pdf_semanal(inicio, fin))
+    filename = f'produccion_semanal_{inicio.strftime("%Y%m%d")}_{fin.strftime("%Y%m%d")}.pdf'
+    return contenido, filename, CONTENT_TYPE_PDF
+
+
+# ============================================================================
+# EXPORTACIÓN DE REGISTROS (CSV / NDJSON)
+# ============================================================================
+
+COLUMNAS_EXPORTACION = [
+    'id', 'fecha_registro', 'nombre_usuario', 'nombre_tipo_alga',
+    'sector', 'cantidad_cosechada', 'observaciones',
+]
+
+FORMATOS_EXPORTACION = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def registros_filtrados(configuracion, fecha_desde, fecha_hasta):
+    """Registros de producción que cumplen los filtros de una configuración"""
+    return ConsultaReporte(configuracion, fecha_desde, fecha_hasta).registros
+
+
+def iterar_por_lotes(query, columnas, tamano_lote=2000):
+    """
+    Recorre el queryset por lotes de id creciente (keyset) retornando tuplas.
+
+    Se usa en lugar de .iterator() porque el backend MySQL de Django carga
+    el resultado completo en memoria; así la memoria se mantiene constante
+    sin importar la cantidad de filas.
+
+    El recorrido se limita a los ids mínimo y máximo de los registros del
+    filtro (obtenidos con los índices de fecha), para no leer por clave
+    primaria toda la tabla cuando el período es una parte pequeña de ella.
+    """
+    limites = query.order_by().aggregate(primero=Min('id'), ultimo=Max('id'))
+    if limites['primero'] is None:
+        return
+    ultimo_id = limites['primero'] - 1
+    query = query.filter(id__lte=limites['ultimo'])
+    while True:
+        lote = list(
+            query.filter(id__gt=ultimo_id).order_by('id').values_list(*columnas)[:tamano_lote]
+        )
+        yield from lote
+        if len(lote) < tamano_lote:
+            return
+        ultimo_id = lote[-1][0]
+
+
+class _Eco:
+    """Pseudo-archivo que retorna lo escrito, para usar csv.writer en streaming"""
+
+    def write(self, valor):
+        return valor
+
+
+def _valor_exportable(valor):
+    if isinstance(valor, datetime):
+        return timezone.localtime(valor).isoformat() if timezone.is_aware(valor) else valor.isoformat()
+    if valor is None:
+        return ''
+    return str(valor)
+
+
+def lineas_exportacion(query, formato, tamano_lote=2000):
+    """Genera el archivo de exportación línea por línea (CSV o NDJSON)"""
+    filas = iterar_por_lotes(query, COLUMNAS_EXPORTACION, tamano_lote)
+
+    if formato == 'csv':
+        escritor = csv.writer(_Eco())
+        # BOM para que Excel reconozca los acentos
+        yield '\ufeff' + escritor.writerow(COLUMNAS_EXPORTACION)
+        for fila in filas:
+            yield escritor.writerow([_valor_exportable(valor) for valor in fila])
+    elif formato == 'ndjson':
+        for fila in filas:
+            datos = dict(zip(COLUMNAS_EXPORTACION, (_valor_exportable(valor) for valor in fila)))
+            datos['id'] = fila[0]
+            yield json.dumps(datos, ensure_ascii=False) + '\n'
+    else:
+        raise ErrorExportacion(f'Formato de exportación no soportado: {formato}')
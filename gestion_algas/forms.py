@@ -3,7 +3,10 @@
 Formularios para la aplicación de gestión de algas
 """
 from django import forms
-from .models import Usuario, RegistroProduccion, TipoAlga, CapacidadProductiva, ConfiguracionReporte
+from decimal import Decimal
+from django.db.models import Q
+from django.utils import timezone
+from .models import Usuario, RegistroProduccion, TipoAlga, Sector, CapacidadProductiva, ConfiguracionReporte
 import re
 
 
@@ -77,7 +80,7 @@ class UsuarioCreationForm(forms.ModelForm):
     
     def save(self, commit=True):
         user = super().save(commit=False)
-        user.password = self.cleaned_data['password']
+        user.set_password(self.cleaned_data['password'])
         if commit:
             user.save()
         return user
@@ -126,6 +129,8 @@ class RegistroProduccionForm(forms.ModelForm):
             'sector': forms.TextInput(attrs={
                 'class': 'form-control',
                 'placeholder': 'Ej: Sector Norte, Bahía Sur',
+                'list': 'lista_sectores',
+                'autocomplete': 'off',
                 'required': True
             }),
             'observaciones': forms.Textarea(attrs={
@@ -147,6 +152,35 @@ class RegistroProduccionForm(forms.ModelForm):
         self.fields['tipo_alga'].queryset = TipoAlga.objects.filter(activo=True)
 
 
+class RegistroIngestaForm(forms.Form):
+    """
+    Validación de una fila de la carga masiva de registros (API o CSV).
+    
+    El tipo de alga y el usuario llegan por nombre; se resuelven a ids en
+    ingesta.py con una sola consulta por lote.
+    """
+    tipo_alga = forms.CharField(max_length=100)
+    cantidad_cosechada = forms.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        min_value=Decimal('0.01')
+    )
+    sector = forms.CharField(max_length=100)
+    observaciones = forms.CharField(required=False)
+    fecha_registro = forms.DateTimeField(required=False)
+    usuario = forms.CharField(max_length=150, required=False)
+    
+    def clean_fecha_registro(self):
+        return validar_fecha_registro(self.cleaned_data.get('fecha_registro'))
+
+
+def validar_fecha_registro(fecha):
+    """Rechaza fechas de registro posteriores al momento actual"""
+    if fecha is not None and fecha > timezone.now():
+        raise forms.ValidationError('La fecha de registro no puede ser futura.')
+    return fecha
+
+
 class TipoAlgaForm(forms.ModelForm):
     """Formulario para gestionar tipos de algas"""
     
@@ -230,9 +264,9 @@ class ConfiguracionReporteForm(forms.ModelForm):
             'empresa', 'pais', 'contacto', 'email', 'unidad_medida',
             'formato_preferido', 'mostrar_capacidad_instalada', 
             'mostrar_disponibilidad', 'mostrar_historial_produccion',
-            'periodo_historial_meses', 'tipos_alga', 'sectores_especificos',
+            'periodo_historial_meses', 'tipos_alga', 'sectores',
             'usar_fecha_personalizada', 'fecha_desde', 'fecha_hasta',
-            'incluir_observaciones'
+            'incluir_observaciones', 'incluir_hoja_registros'
         ]
         widgets = {
             'empresa': forms.TextInput(attrs={
@@ -279,9 +313,9 @@ class ConfiguracionReporteForm(forms.ModelForm):
                 'class': 'form-select',
                 'size': '5'
             }),
-            'sectores_especificos': forms.TextInput(attrs={
-                'class': 'form-control',
-                'placeholder': 'Sector A, Sector B, Sector C'
+            'sectores': forms.SelectMultiple(attrs={
+                'class': 'form-select',
+                'size': '5'
             }),
             'usar_fecha_personalizada': forms.CheckboxInput(attrs={
                 'class': 'form-check-input'
@@ -297,6 +331,9 @@ class ConfiguracionReporteForm(forms.ModelForm):
             'incluir_observaciones': forms.CheckboxInput(attrs={
                 'class': 'form-check-input'
             }),
+            'incluir_hoja_registros': forms.CheckboxInput(attrs={
+                'class': 'form-check-input'
+            }),
         }
         labels = {
             'empresa': 'Empresa',
@@ -310,10 +347,19 @@ class ConfiguracionReporteForm(forms.ModelForm):
             'mostrar_historial_produccion': 'Mostrar Historial de Producción',
             'periodo_historial_meses': 'Período de Historial (meses)',
             'tipos_alga': 'Tipos de Alga Específicos',
-            'sectores_especificos': 'Sectores Específicos',
+            'sectores': 'Sectores Específicos',
             'usar_fecha_personalizada': 'Usar Rango de Fecha Personalizado',
             'fecha_desde': 'Fecha Desde',
             'fecha_hasta': 'Fecha Hasta',
             'incluir_observaciones': 'Incluir Observaciones',
+            'incluir_hoja_registros': 'Incluir Hoja de Registros (Excel)',
             'activo': 'Configuración Activa'
         }
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Sectores activos y los que ya estaban seleccionados
+        sectores = Q(activo=True)
+        if self.instance.pk:
+            sectores |= Q(pk__in=self.instance.sectores.values('pk'))
+        self.fields['sectores'].queryset = Sector.objects.filter(sectores)
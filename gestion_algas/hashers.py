@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+Hashers de contraseñas con factor de trabajo configurable
+
+Son los hashers PBKDF2-SHA256 y scrypt de Django con el costo tomado de
+settings (PASSWORD_ITERACIONES y PASSWORD_SCRYPT_WORK_FACTOR) en lugar de
+fijo en la clase. Producen hashes con el mismo formato que los de Django;
+al cambiar el costo, los hashes guardados con el anterior se actualizan en
+el siguiente login (Usuario.check_password). El comando medir_login mide
+la latencia de cada configuración para elegir el costo.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, ScryptPasswordHasher
+
+
+class PBKDF2AjustableHasher(PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 con PASSWORD_ITERACIONES iteraciones"""
+
+    def __init__(self, iteraciones=None):
+        self._iteraciones = iteraciones
+
+    @property
+    def iterations(self):
+        return self._iteraciones or getattr(settings, 'PASSWORD_ITERACIONES', PBKDF2PasswordHasher.iterations)
+
+
+class ScryptAjustableHasher(ScryptPasswordHasher):
+    """scrypt con factor de trabajo (N) PASSWORD_SCRYPT_WORK_FACTOR"""
+
+    def __init__(self, work_factor=None):
+        self._work_factor = work_factor
+
+    @property
+    def work_factor(self):
+        return self._work_factor or getattr(settings, 'PASSWORD_SCRYPT_WORK_FACTOR', ScryptPasswordHasher.work_factor)
+
+    @property
+    def maxmem(self):
+        # scrypt usa 128 * r * N bytes; el límite por defecto de OpenSSL (32 MB) no alcanza desde N = 2**15
+        return 2 * 128 * self.block_size * self.work_factor
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Carga masiva de registros de producción (API de ingesta y comando importar_registros)
+
+Las filas se validan por lotes con RegistroIngestaForm. Los tipos de alga se
+resuelven por nombre con una sola consulta, y los usuarios y sectores
+(creando los que no están en el catálogo) con una consulta por lote. Los registros se insertan con bulk_create dentro de una
+transacción. Como bulk_create no dispara las señales, el resumen mensual y
+los totales de cada tipo de alga se actualizan aquí con un acumulado por
+mes y tipo, y se invalida la caché del dashboard.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from .estadisticas import invalidar_dashboard
+from .forms import RegistroIngestaForm, validar_fecha_registro
+from .models import Usuario, TipoAlga, Sector, RegistroProduccion, ProduccionMensual, inicio_de_mes, clave_sector
+
+TAMANO_LOTE_INGESTA = 1000
+
+
+def _en_lotes(iterable, tamano):
+    lote = []
+    for elemento in iterable:
+        lote.append(elemento)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def _tipos_por_nombre():
+    """Tipos de alga activos indexados por nombre en minúsculas"""
+    return {
+        nombre.lower(): (id_, nombre)
+        for id_, nombre in TipoAlga.objects.filter(activo=True).values_list('id', 'nombre')
+    }
+
+
+def ingresar_registros(filas, usuario=None, permitir_otro_usuario=False,
+                       omitir_errores=False, tamano_lote=TAMANO_LOTE_INGESTA, primera_fila=1):
+    """
+    Valida e inserta registros de producción en lotes.
+
+    Args:
+        filas: Iterable de diccionarios con tipo_alga (nombre), cantidad_cosechada,
+            sector y opcionalmente observaciones, fecha_registro y usuario (username)
+        usuario: Usuario asignado a las filas que no indican uno
+        permitir_otro_usuario: Si False, las filas no pueden indicar otro usuario
+        omitir_errores: Si True se insertan las filas válidas aunque otras fallen;
+            si False basta un error para no insertar nada
+        tamano_lote: Filas validadas e insertadas por lote
+        primera_fila: Número con el que se reporta la primera fila
+
+    Returns:
+        dict con 'creados' (cantidad insertada) y 'errores', una lista de
+        {'fila': número, 'errores': {campo: [mensajes]}}
+    """
+    tipos = _tipos_por_nombre()
+    usuarios = {}
+    if usuario is not None:
+        usuarios[usuario.username] = usuario.id
+    resumen = defaultdict(lambda: [Decimal('0'), 0, None, None])
+    creados = 0
+    errores = []
+
+    with transaction.atomic():
+        for lote in _en_lotes(enumerate(filas, start=primera_fila), tamano_lote):
+            registros = _validar_lote(
+                lote, tipos, usuarios, usuario, permitir_otro_usuario, errores
+            )
+            if errores and not omitir_errores:
+                # Se sigue validando solo para reportar todos los errores
+                continue
+            RegistroProduccion.objects.bulk_create(registros, batch_size=tamano_lote)
+            creados += len(registros)
+            for registro in registros:
+                acumulado = resumen[(inicio_de_mes(registro.fecha_registro), registro.tipo_alga_id)]
+                acumulado[0] += registro.cantidad_cosechada
+                acumulado[1] += 1
+                acumulado[2] = min(acumulado[2] or registro.fecha_registro, registro.fecha_registro)
+                acumulado[3] = max(acumulado[3] or registro.fecha_registro, registro.fecha_registro)
+
+        if errores and not omitir_errores:
+            transaction.set_rollback(True)
+            return {'creados': 0, 'errores': errores}
+
+        por_tipo = defaultdict(lambda: [Decimal('0'), 0, None, None])
+        for (mes, tipo_alga_id), (cantidad, registros, primera, ultima) in resumen.items():
+            ProduccionMensual.acumular(mes, cantidad, registros, tipo_alga_id)
+            totales = por_tipo[tipo_alga_id]
+            totales[0] += cantidad
+            totales[1] += registros
+            totales[2] = min(totales[2] or primera, primera)
+            totales[3] = max(totales[3] or ultima, ultima)
+
+        for tipo_alga_id, (cantidad, registros, primera, ultima) in por_tipo.items():
+            TipoAlga.acumular_totales(tipo_alga_id, cantidad, registros, primera, ultima)
+
+        if creados:
+            transaction.on_commit(invalidar_dashboard)
+
+    return {'creados': creados, 'errores': errores}
+
+
+def _limpiar_fila(fila):
+    """
+    Valida una fila con los campos de RegistroIngestaForm.
+
+    Se usan directamente los campos declarados en lugar de instanciar el
+    formulario, que copia todos sus campos en cada instancia y multiplica
+    el tiempo de validación en cargas grandes. Por lo mismo, las
+    validaciones de clean_<campo> del formulario se aplican aquí aparte.
+    """
+    datos = {}
+    errores_fila = {}
+    for nombre, campo in RegistroIngestaForm.base_fields.items():
+        try:
+            datos[nombre] = campo.clean(fila.get(nombre))
+        except ValidationError as e:
+            errores_fila[nombre] = e.messages
+    if 'fecha_registro' in datos:
+        try:
+            validar_fecha_registro(datos['fecha_registro'])
+        except ValidationError as e:
+            errores_fila['fecha_registro'] = e.messages
+    return datos, errores_fila
+
+
+def _validar_lote(lote, tipos, usuarios, usuario, permitir_otro_usuario, errores):
+    """Valida un lote de (número, fila) y retorna los RegistroProduccion de las filas válidas"""
+    errores_lote = []
+    validas = []
+    for numero, fila in lote:
+        if not isinstance(fila, dict):
+            errores_lote.append({'fila': numero, 'errores': {'__all__': ['Se esperaba un objeto con los campos del registro']}})
+            continue
+        datos, errores_fila = _limpiar_fila(fila)
+        if errores_fila:
+            errores_lote.append({'fila': numero, 'errores': errores_fila})
+            continue
+        validas.append((numero, datos))
+
+    # Usuarios indicados por nombre: una consulta por lote para los que faltan
+    faltantes = {
+        datos['usuario'] for _, datos in validas
+        if datos['usuario'] and datos['usuario'] not in usuarios
+    }
+    if faltantes and permitir_otro_usuario:
+        usuarios.update(Usuario.objects.filter(username__in=faltantes).values_list('username', 'id'))
+
+    aceptadas = []
+    for numero, datos in validas:
+        errores_fila = {}
+
+        tipo = tipos.get(datos['tipo_alga'].strip().lower())
+        if tipo is None:
+            errores_fila['tipo_alga'] = [f"No existe un tipo de alga activo llamado '{datos['tipo_alga']}'"]
+
+        nombre_usuario = datos['usuario'] or (usuario.username if usuario is not None else '')
+        if not nombre_usuario:
+            errores_fila['usuario'] = ['Debe indicar el usuario del registro']
+        elif usuario is not None and nombre_usuario != usuario.username and not permitir_otro_usuario:
+            errores_fila['usuario'] = ['Solo un administrador puede registrar a nombre de otro usuario']
+        elif nombre_usuario not in usuarios:
+            errores_fila['usuario'] = [f"No existe el usuario '{nombre_usuario}'"]
+
+        if errores_fila:
+            errores_lote.append({'fila': numero, 'errores': errores_fila})
+            continue
+        aceptadas.append((datos, tipo, nombre_usuario))
+
+    # Sectores del lote: se resuelven (y crean los nuevos) de una vez
+    sectores = Sector.desde_nombres(datos['sector'] for datos, _, _ in aceptadas)
+    ahora = timezone.now()
+    registros = []
+    for datos, tipo, nombre_usuario in aceptadas:
+        sector = sectores[clave_sector(datos['sector'])]
+        registros.append(RegistroProduccion(
+            usuario_id=usuarios[nombre_usuario],
+            nombre_usuario=nombre_usuario,
+            tipo_alga_id=tipo[0],
+            nombre_tipo_alga=tipo[1],
+            cantidad_cosechada=datos['cantidad_cosechada'],
+            sector=sector.nombre,
+            sector_catalogo_id=sector.id,
+            observaciones=datos['observaciones'] or None,
+            fecha_registro=datos['fecha_registro'] or ahora,
+        ))
+
+    errores.extend(sorted(errores_lote, key=lambda error: error['fila']))
+    return registros
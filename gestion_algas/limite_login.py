@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Límite de intentos de login fallidos por IP y por nombre de usuario
+
+Los fallos se cuentan en la caché con una ventana deslizante aproximada:
+dos contadores de ventana fija (la actual y la anterior) y el estimado
+
+    fallos = anterior * (1 - transcurrido / ventana) + actual
+
+que evita el salto de una ventana fija (el doble de intentos en el borde)
+sin guardar un registro por intento. Un intento sobre el límite se
+rechaza antes de consultar la base de datos: no se busca el usuario ni se
+guarda un ControlAcceso por intento. Los intentos bloqueados se acumulan y
+se informan con un único evento de auditoría por ventana y clave
+("N intentos de login bloqueados"); los de la última ventana de un ataque
+se informan con el siguiente bloqueo de la misma IP o usuario.
+
+Con la caché en memoria local (por defecto) cada proceso cuenta por su
+cuenta; con CACHE_BACKEND=file los contadores se comparten.
+"""
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+_PREFIJO = 'gestion_algas:login'
+
+# Tiempo máximo que se guardan los intentos bloqueados aún no informados
+_DURACION_PENDIENTES = 24 * 3600
+
+
+class LimitadorLogin:
+    """
+    Contadores de fallos de login con ventana deslizante.
+
+    Args:
+        ventana: Segundos de la ventana
+        max_por_ip: Fallos permitidos por IP en la ventana
+        max_por_usuario: Fallos permitidos por nombre de usuario en la ventana
+        reloj: Función que retorna la hora actual en segundos
+    """
+
+    def __init__(self, ventana=300, max_por_ip=20, max_por_usuario=5, reloj=time.time):
+        self.ventana = ventana
+        self.max_por_ip = max_por_ip
+        self.max_por_usuario = max_por_usuario
+        self.reloj = reloj
+
+    def bloqueo(self, ip, username):
+        """
+        Retorna la clave que superó su límite, ('ip', ip) o ('usuario',
+        username), o None si el intento puede continuar. Es una sola
+        lectura de la caché.
+        """
+        ahora = self.reloj()
+        numero = int(ahora // self.ventana)
+        transcurrido = (ahora % self.ventana) / self.ventana
+        claves = [('ip', ip, self.max_por_ip), ('usuario', username, self.max_por_usuario)]
+
+        contadores = cache.get_many([
+            self._clave(tipo, valor, n) for tipo, valor, _ in claves for n in (numero - 1, numero)
+        ])
+        for tipo, valor, maximo in claves:
+            anterior = contadores.get(self._clave(tipo, valor, numero - 1), 0)
+            actual = contadores.get(self._clave(tipo, valor, numero), 0)
+            if anterior * (1 - transcurrido) + actual >= maximo:
+                return tipo, valor
+        return None
+
+    def registrar_fallo(self, ip, username):
+        """Sumar un fallo a los contadores de la IP y del usuario"""
+        numero = int(self.reloj() // self.ventana)
+        for tipo, valor in (('ip', ip), ('usuario', username)):
+            self._incrementar(self._clave(tipo, valor, numero), 2 * self.ventana)
+
+    def registrar_exito(self, username):
+        """Un login correcto limpia los fallos del usuario (no los de la IP)"""
+        numero = int(self.reloj() // self.ventana)
+        cache.delete_many([self._clave('usuario', username, n) for n in (numero - 1, numero)])
+
+    def registrar_bloqueo(self, tipo, valor):
+        """
+        Acumula un intento bloqueado. Retorna cuántos intentos informar en
+        el evento de auditoría (a lo más una vez por ventana y clave) o
+        None si todavía no corresponde informar.
+        """
+        pendientes = self._clave(tipo, valor, 'bloqueados')
+        total = self._incrementar(pendientes, _DURACION_PENDIENTES)
+        if not cache.add(self._clave(tipo, valor, 'informado'), True, self.ventana):
+            return None
+        cache.delete(pendientes)
+        return total
+
+    def _clave(self, tipo, valor, sufijo):
+        # El valor viene del cliente: se resume para que la clave sea válida en cualquier backend
+        resumen = hashlib.sha256(str(valor).strip().lower().encode('utf-8')).hexdigest()[:32]
+        return f'{_PREFIJO}:{tipo}:{resumen}:{sufijo}'
+
+    def _incrementar(self, clave, timeout):
+        cache.add(clave, 0, timeout)
+        try:
+            return cache.incr(clave)
+        except ValueError:
+            # La entrada venció entre add e incr
+            cache.set(clave, 1, timeout)
+            return 1
+
+
+limitador_login = LimitadorLogin(
+    ventana=getattr(settings, 'LOGIN_VENTANA_SEGUNDOS', 300),
+    max_por_ip=getattr(settings, 'LOGIN_MAX_FALLOS_IP', 20),
+    max_por_usuario=getattr(settings, 'LOGIN_MAX_FALLOS_USUARIO', 5),
+)
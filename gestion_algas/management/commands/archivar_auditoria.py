@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Archiva y elimina los accesos (ControlAcceso) más antiguos que el período de retención
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from gestion_algas.auditoria import archivar_accesos
+from gestion_algas.models import ControlAcceso
+from gestion_algas.periodos import inicio_del_dia
+
+
+class Command(BaseCommand):
+    help = (
+        'Mueve los accesos anteriores al período de retención a archivos mensuales '
+        'NDJSON comprimidos (accesos-AAAA-MM.ndjson.gz) y los elimina en lotes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=getattr(settings, 'AUDITORIA_RETENCION_DIAS', 180),
+            help='Días de accesos que se mantienen en la tabla (por defecto AUDITORIA_RETENCION_DIAS)'
+        )
+        parser.add_argument(
+            '--directorio',
+            default=getattr(settings, 'AUDITORIA_ARCHIVO_DIR', None),
+            help='Directorio de los archivos (por defecto AUDITORIA_ARCHIVO_DIR)'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=1000,
+            help='Accesos archivados y eliminados por lote (por defecto 1000)'
+        )
+        parser.add_argument(
+            '--simular',
+            action='store_true',
+            help='Solo mostrar cuántos accesos se archivarían'
+        )
+
+    def handle(self, *args, **options):
+        if options['dias'] < 1:
+            raise CommandError('--dias debe ser al menos 1')
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser al menos 1')
+        if not options['directorio']:
+            raise CommandError('Indique --directorio o configure AUDITORIA_ARCHIVO_DIR')
+
+        # Se conservan los días locales completos dentro de la retención
+        antes_de = inicio_del_dia(timezone.localdate() - timedelta(days=options['dias']))
+
+        if options['simular']:
+            cantidad = ControlAcceso.objects.filter(fecha_acceso__lt=antes_de).count()
+            self.stdout.write(f'Se archivarían {cantidad} accesos anteriores a {antes_de:%Y-%m-%d}')
+            return
+
+        archivados = archivar_accesos(antes_de, options['directorio'], options['lote'])
+        for mes, cantidad in sorted(archivados.items()):
+            self.stdout.write(f'{mes}: {cantidad} accesos archivados')
+        self.stdout.write(self.style.SUCCESS(
+            f'{sum(archivados.values())} accesos anteriores a {antes_de:%Y-%m-%d} '
+            f'archivados en {options["directorio"]}'
+        ))
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Exporta los registros de producción que cumplen los filtros de una configuración
+"""
+from django.core.management.base import BaseCommand, CommandError
+from gestion_algas.exportacion import (
+    FORMATOS_EXPORTACION, periodo_reporte, registros_filtrados, lineas_exportacion
+)
+from gestion_algas.models import ConfiguracionReporte
+
+
+class Command(BaseCommand):
+    help = 'Exporta en CSV o NDJSON los registros de producción filtrados según una ConfiguracionReporte'
+
+    def add_arguments(self, parser):
+        parser.add_argument('config_id', type=int, help='Id de la configuración de reporte')
+        parser.add_argument(
+            '--formato',
+            choices=sorted(FORMATOS_EXPORTACION),
+            default='csv',
+            help='Formato de salida (por defecto csv)'
+        )
+        parser.add_argument(
+            '--salida',
+            help='Archivo de salida (por defecto la salida estándar)'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=2000,
+            help='Registros leídos por consulta (por defecto 2000)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            configuracion = ConfiguracionReporte.objects.get(id=options['config_id'])
+        except ConfiguracionReporte.DoesNotExist:
+            raise CommandError(f"No existe la configuración {options['config_id']}")
+
+        fecha_desde, fecha_hasta = periodo_reporte(configuracion)
+        query = registros_filtrados(configuracion, fecha_desde, fecha_hasta)
+        lineas = lineas_exportacion(query, options['formato'], options['lote'])
+
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8', newline='') as archivo:
+                archivo.writelines(lineas)
+        else:
+            for linea in lineas:
+                self.stdout.write(linea, ending='')
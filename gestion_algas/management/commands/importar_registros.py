@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Importa registros de producción desde un archivo CSV
+"""
+import csv
+from django.core.management.base import BaseCommand, CommandError
+from gestion_algas.ingesta import ingresar_registros, TAMANO_LOTE_INGESTA
+from gestion_algas.models import Usuario
+
+# Columnas del CSV de exportar_registros que se leen con otro nombre
+ALIAS_COLUMNAS = {
+    'nombre_tipo_alga': 'tipo_alga',
+    'nombre_usuario': 'usuario',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa registros de producción desde un CSV con columnas tipo_alga, '
+        'cantidad_cosechada, sector y opcionalmente observaciones, fecha_registro '
+        'y usuario (acepta también el CSV generado por exportar_registros)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo CSV (UTF-8)')
+        parser.add_argument(
+            '--usuario',
+            help='Username asignado a las filas sin columna usuario'
+        )
+        parser.add_argument(
+            '--delimitador',
+            default=',',
+            help='Separador de columnas (por defecto ",")'
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=TAMANO_LOTE_INGESTA,
+            help=f'Filas validadas e insertadas por lote (por defecto {TAMANO_LOTE_INGESTA})'
+        )
+        parser.add_argument(
+            '--omitir-errores',
+            action='store_true',
+            help='Importar las filas válidas aunque otras tengan errores'
+        )
+
+    def handle(self, *args, **options):
+        usuario = None
+        if options['usuario']:
+            usuario = Usuario.objects.filter(username=options['usuario']).first()
+            if usuario is None:
+                raise CommandError(f"No existe el usuario {options['usuario']}")
+
+        try:
+            archivo = open(options['archivo'], encoding='utf-8-sig', newline='')
+        except OSError as e:
+            raise CommandError(f'No se pudo abrir el archivo: {e}')
+
+        with archivo:
+            lector = csv.DictReader(archivo, delimiter=options['delimitador'])
+            filas = (
+                {ALIAS_COLUMNAS.get(columna, columna): valor for columna, valor in fila.items()}
+                for fila in lector
+            )
+            # La fila 1 del archivo es el encabezado
+            resultado = ingresar_registros(
+                filas,
+                usuario=usuario,
+                permitir_otro_usuario=True,
+                omitir_errores=options['omitir_errores'],
+                tamano_lote=options['lote'],
+                primera_fila=2,
+            )
+
+        for error in resultado['errores']:
+            detalle = '; '.join(
+                f"{campo}: {' '.join(mensajes)}" for campo, mensajes in error['errores'].items()
+            )
+            self.stderr.write(f"Fila {error['fila']}: {detalle}")
+
+        if resultado['errores'] and not options['omitir_errores']:
+            raise CommandError(
+                f"{len(resultado['errores'])} filas con errores; no se importó ningún registro "
+                '(usa --omitir-errores para importar las filas válidas)'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['creados']} registros importados, {len(resultado['errores'])} filas con errores"
+        ))
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Mide el costo de conexión por petición con y sin conexiones persistentes
+"""
+import time
+from django.core.management.base import BaseCommand
+from django.core.signals import request_started, request_finished
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+class Command(BaseCommand):
+    help = (
+        'Simula peticiones (señales request_started/request_finished y consultas SELECT 1) '
+        'con CONN_MAX_AGE = 0 y con conexiones persistentes, y compara el tiempo por petición'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--peticiones',
+            type=int,
+            default=200,
+            help='Peticiones simuladas por modo (por defecto 200)'
+        )
+        parser.add_argument(
+            '--consultas',
+            type=int,
+            default=3,
+            help='Consultas por petición (por defecto 3)'
+        )
+        parser.add_argument(
+            '--max-age',
+            type=int,
+            default=60,
+            help='CONN_MAX_AGE del modo persistente (por defecto 60)'
+        )
+        parser.add_argument(
+            '--database',
+            default='default',
+            help='Alias de la base de datos (por defecto default)'
+        )
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        conexion = connections[alias]
+        original = {
+            clave: conexion.settings_dict.get(clave)
+            for clave in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')
+        }
+
+        self.stdout.write(
+            f"Base de datos: {conexion.vendor} ({conexion.settings_dict.get('HOST') or conexion.settings_dict['NAME']})"
+        )
+        modos = [
+            ('Sin persistencia (CONN_MAX_AGE=0)', 0, False),
+            (f"Persistente (CONN_MAX_AGE={options['max_age']})", options['max_age'], False),
+            ("Persistente + health checks", options['max_age'], True),
+        ]
+        try:
+            resultados = [
+                (nombre, *self.medir(conexion, max_age, health_checks, options['peticiones'], options['consultas']))
+                for nombre, max_age, health_checks in modos
+            ]
+        finally:
+            conexion.close()
+            conexion.settings_dict.update(original)
+
+        base = resultados[0][1]
+        for nombre, por_peticion, conexiones in resultados:
+            self.stdout.write(
+                f'{nombre:<40} {por_peticion * 1000:8.3f} ms/petición  '
+                f'{conexiones:5d} conexiones  x{base / por_peticion if por_peticion else 0:.1f}'
+            )
+
+    def medir(self, conexion, max_age, health_checks, peticiones, consultas):
+        """Retorna (segundos por petición, conexiones abiertas)"""
+        conexion.close()
+        conexion.settings_dict['CONN_MAX_AGE'] = max_age
+        conexion.settings_dict['CONN_HEALTH_CHECKS'] = health_checks
+
+        abiertas = []
+
+        def contar(sender, connection, **kwargs):
+            if connection.alias == conexion.alias:
+                abiertas.append(1)
+
+        connection_created.connect(contar)
+        try:
+            inicio = time.perf_counter()
+            for _ in range(peticiones):
+                # Las mismas señales que dispara el manejador de Django en cada petición
+                request_started.send(sender=self.__class__)
+                for _ in range(consultas):
+                    with conexion.cursor() as cursor:
+                        cursor.execute('SELECT 1')
+                        cursor.fetchone()
+                request_finished.send(sender=self.__class__)
+            transcurrido = time.perf_counter() - inicio
+        finally:
+            connection_created.disconnect(contar)
+
+        return transcurrido / peticiones, len(abiertas)
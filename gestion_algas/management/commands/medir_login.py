@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Mide la latencia de verificar una contraseña con cada configuración de hasher
+"""
+import statistics
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from gestion_algas.hashers import PBKDF2AjustableHasher, ScryptAjustableHasher
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide p50/p99 de la verificación de contraseña de un login (el costo que '
+        'domina login_view) con PBKDF2 a distintas iteraciones y scrypt a distintos '
+        'factores de trabajo, para elegir PASSWORD_ITERACIONES o PASSWORD_SCRYPT_WORK_FACTOR'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iteraciones',
+            type=int,
+            nargs='*',
+            default=[100000, 300000, 600000, 1000000],
+            help='Iteraciones de PBKDF2 a medir (por defecto 100000 300000 600000 1000000)'
+        )
+        parser.add_argument(
+            '--factores-scrypt',
+            type=int,
+            nargs='*',
+            default=[2 ** 14, 2 ** 15],
+            help='Factores de trabajo (N, potencia de 2) de scrypt a medir (por defecto 16384 32768)'
+        )
+        parser.add_argument(
+            '--repeticiones',
+            type=int,
+            default=30,
+            help='Verificaciones por configuración (por defecto 30)'
+        )
+
+    def handle(self, *args, **options):
+        if options['repeticiones'] < 2:
+            raise CommandError('--repeticiones debe ser al menos 2')
+
+        configuraciones = [
+            (f'pbkdf2_sha256 {iteraciones} iteraciones', PBKDF2AjustableHasher(iteraciones))
+            for iteraciones in options['iteraciones']
+        ] + [
+            (f'scrypt N={factor}', ScryptAjustableHasher(factor))
+            for factor in options['factores_scrypt']
+        ]
+
+        self.stdout.write(
+            f'Configuración actual: {settings.PASSWORD_HASHERS[0]} '
+            f'(PASSWORD_ITERACIONES={PBKDF2AjustableHasher().iterations}, '
+            f'PASSWORD_SCRYPT_WORK_FACTOR={ScryptAjustableHasher().work_factor})'
+        )
+        self.stdout.write(f'{"Hasher":<36} {"p50 ms":>9} {"p99 ms":>9} {"logins/s":>9}')
+        for nombre, hasher in configuraciones:
+            try:
+                tiempos = self.medir(hasher, options['repeticiones'])
+            except ValueError as e:
+                self.stderr.write(f'{nombre}: no se pudo medir ({e})')
+                continue
+            p50 = statistics.median(tiempos)
+            p99 = statistics.quantiles(tiempos, n=100, method='inclusive')[98]
+            # Logins por segundo que soporta un proceso con un solo núcleo
+            self.stdout.write(f'{nombre:<36} {p50 * 1000:9.1f} {p99 * 1000:9.1f} {1 / p50:9.1f}')
+
+    def medir(self, hasher, repeticiones):
+        """Tiempos en segundos de verificar una contraseña correcta"""
+        codificado = hasher.encode('contraseña-de-prueba', hasher.salt())
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            hasher.verify('contraseña-de-prueba', codificado)
+            tiempos.append(time.perf_counter() - inicio)
+        return tiempos
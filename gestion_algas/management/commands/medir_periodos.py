@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Compara filtros por período con funciones sobre la columna y con rangos
+"""
+import time
+from datetime import date, timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum, Count
+from django.utils import timezone
+from gestion_algas.models import RegistroProduccion
+from gestion_algas.periodos import UNIDADES, rango_periodo, rango_fechas, truncar, periodo_por_rangos
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el filtro de un día y de un mes con lookups sobre la columna '
+        '(fecha_registro__date, __year/__month) y con rangos [inicio, fin) de '
+        'periodos.py, muestra el EXPLAIN de cada consulta y compara la agrupación '
+        'con Trunc y con rangos (CASE)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fecha',
+            help='Fecha local de referencia AAAA-MM-DD (por defecto hoy)'
+        )
+        parser.add_argument(
+            '--repeticiones',
+            type=int,
+            default=20,
+            help='Ejecuciones de cada consulta (por defecto 20)'
+        )
+        parser.add_argument(
+            '--unidad',
+            choices=UNIDADES,
+            default='dia',
+            help='Unidad de la agrupación comparada (por defecto dia)'
+        )
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=90,
+            help='Días hacia atrás de la agrupación comparada (por defecto 90)'
+        )
+        parser.add_argument(
+            '--sin-explain',
+            action='store_true',
+            help='No mostrar los planes de ejecución'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            fecha = date.fromisoformat(options['fecha']) if options['fecha'] else timezone.localdate()
+        except ValueError:
+            raise CommandError('La fecha debe tener formato AAAA-MM-DD')
+
+        registros = RegistroProduccion.objects.all()
+        inicio_dia, fin_dia = rango_periodo(fecha, 'dia')
+        inicio_mes, fin_mes = rango_periodo(fecha, 'mes')
+        consultas = [
+            ('Día con fecha_registro__date', registros.filter(fecha_registro__date=fecha)),
+            ('Día con rango', registros.filter(fecha_registro__gte=inicio_dia, fecha_registro__lt=fin_dia)),
+            ('Mes con __year/__month', registros.filter(
+                fecha_registro__year=fecha.year, fecha_registro__month=fecha.month
+            )),
+            ('Mes con rango', registros.filter(fecha_registro__gte=inicio_mes, fecha_registro__lt=fin_mes)),
+        ]
+
+        desde = fecha - timedelta(days=options['dias'])
+        inicio, fin = rango_fechas(desde, fecha)
+        ventana = registros.filter(fecha_registro__gte=inicio, fecha_registro__lt=fin)
+        unidad = options['unidad']
+        agregados = {'total': Sum('cantidad_cosechada'), 'registros': Count('id')}
+        agrupaciones = [
+            (f'Agrupar por {unidad} con Trunc', ventana.annotate(
+                periodo=truncar('fecha_registro', unidad)
+            ).values('periodo').annotate(**agregados).order_by('periodo')),
+            (f'Agrupar por {unidad} con rangos', ventana.annotate(
+                periodo=periodo_por_rangos('fecha_registro', unidad, desde, fecha)
+            ).values('periodo').annotate(**agregados).order_by('periodo')),
+        ]
+
+        self.stdout.write(f'Registros en la tabla: {registros.count()}  Fecha de referencia: {fecha}')
+        for nombre, query in consultas:
+            self.medir(nombre, query.aggregate, options, total=Sum('cantidad_cosechada'))
+            if not options['sin_explain']:
+                self.explicar(query)
+        for nombre, query in agrupaciones:
+            self.medir(nombre, lambda: list(query.all()), options)
+            if not options['sin_explain']:
+                self.explicar(query)
+
+        # Los dos caminos de agrupar_por_periodo deben dar lo mismo
+        trunc, rangos = (list(query.all()) for _, query in agrupaciones)
+        if trunc != rangos:
+            self.stderr.write(self.style.WARNING(
+                'La agrupación con Trunc y con rangos no coincide: revisa que la base de datos '
+                'tenga cargadas las zonas horarias y ajusta DB_ZONAS_HORARIAS'
+            ))
+        else:
+            camino = 'Trunc' if getattr(settings, 'BD_ZONAS_HORARIAS', True) else 'rangos'
+            self.stdout.write(self.style.SUCCESS(
+                f'{len(trunc)} períodos iguales con Trunc y con rangos (agrupar_por_periodo usa {camino})'
+            ))
+
+    def medir(self, nombre, funcion, options, **kwargs):
+        funcion(**kwargs)
+        inicio = time.perf_counter()
+        for _ in range(options['repeticiones']):
+            funcion(**kwargs)
+        promedio = (time.perf_counter() - inicio) / options['repeticiones']
+        self.stdout.write(f'{nombre:<40} {promedio * 1000:9.3f} ms')
+
+    def explicar(self, query):
+        try:
+            plan = query.explain()
+        except Exception as e:
+            plan = f'(EXPLAIN no disponible: {e})'
+        for linea in plan.splitlines():
+            self.stdout.write(f'    {linea}')
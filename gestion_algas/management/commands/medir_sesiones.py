@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Cuenta las lecturas y escrituras de sesión por cada 1000 peticiones con cada motor de sesiones
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse, NoReverseMatch
+from gestion_algas.models import Usuario
+
+ESCRITURAS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class Command(BaseCommand):
+    help = (
+        'Inicia sesión con un usuario temporal y hace peticiones GET a una vista con '
+        'cada configuración de sesiones (la anterior: base de datos y '
+        'SESSION_SAVE_EVERY_REQUEST; y los motores db, cached_db y cookie con '
+        'renovación por umbral). Muestra las consultas a la tabla de sesiones y '
+        'las escrituras por cada 1000 peticiones. Los cambios se revierten al terminar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--peticiones',
+            type=int,
+            default=1000,
+            help='Peticiones por configuración (por defecto 1000)'
+        )
+        parser.add_argument(
+            '--vista',
+            default='dashboard',
+            help='Nombre de la URL pedida (por defecto dashboard)'
+        )
+
+    def handle(self, *args, **options):
+        if options['peticiones'] < 1:
+            raise CommandError('--peticiones debe ser al menos 1')
+        try:
+            url = reverse(options['vista'])
+        except NoReverseMatch:
+            raise CommandError(f"No existe la URL '{options['vista']}'")
+
+        motores = settings.SESSION_ENGINES
+        configuraciones = [
+            ('Anterior: db + guardar en cada petición', motores['db'], True),
+            ('db + renovación por umbral', motores['db'], False),
+            ('cached_db + renovación por umbral', motores['cached_db'], False),
+            ('cookie firmada + renovación por umbral', motores['cookie'], False),
+        ]
+
+        self.stdout.write(
+            f"{options['peticiones']} peticiones GET a {url}; "
+            f"SESSION_RENOVAR_CADA={getattr(settings, 'SESSION_RENOVAR_CADA', 900)} s"
+        )
+        self.stdout.write(f'{"Configuración":<42} {"Lecturas sesión":>16} {"Escrituras sesión":>18} {"Escrituras":>11}')
+        escala = 1000 / options['peticiones']
+        for nombre, motor, guardar_siempre in configuraciones:
+            lecturas, escrituras_sesion, escrituras = self.medir(url, motor, guardar_siempre, options['peticiones'])
+            self.stdout.write(
+                f'{nombre:<42} {lecturas * escala:16.0f} {escrituras_sesion * escala:18.0f} {escrituras * escala:11.0f}'
+            )
+        self.stdout.write('(por cada 1000 peticiones; la cookie firmada no usa la base de datos ni la caché)')
+
+    def medir(self, url, motor, guardar_siempre, peticiones):
+        """Retorna (lecturas de sesión, escrituras de sesión, escrituras totales)"""
+        ajustes = override_settings(
+            SESSION_ENGINE=motor,
+            SESSION_SAVE_EVERY_REQUEST=guardar_siempre,
+            AUDITORIA_ASINCRONA=False,
+        )
+        with ajustes, transaction.atomic():
+            usuario = Usuario.objects.create(
+                username='_medir_sesiones', password='medir-sesiones', email='medir@localhost',
+                telefono='0', rol='Administrador'
+            )
+            cliente = Client()
+            respuesta = cliente.post(reverse('login'), {'username': usuario.username, 'password': 'medir-sesiones'})
+            if respuesta.status_code != 302:
+                raise CommandError(f'No se pudo iniciar sesión (estado {respuesta.status_code})')
+
+            with CaptureQueriesContext(connection) as consultas:
+                for _ in range(peticiones):
+                    cliente.get(url)
+            transaction.set_rollback(True)
+
+        sesion = [consulta['sql'] for consulta in consultas.captured_queries if 'django_session' in consulta['sql']]
+        escrituras = [consulta['sql'] for consulta in consultas.captured_queries if consulta['sql'].startswith(ESCRITURAS)]
+        return (
+            sum(not sql.startswith(ESCRITURAS) for sql in sesion),
+            sum(sql.startswith(ESCRITURAS) for sql in sesion),
+            len(escrituras),
+        )
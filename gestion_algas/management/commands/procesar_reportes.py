@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Procesa la cola de trabajos de reportes (TrabajoReporte)
+"""
+import threading
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from gestion_algas.trabajos import procesar_pendientes
+
+
+class Command(BaseCommand):
+    help = 'Genera en segundo plano los reportes PDF/Excel encolados por las vistas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hilos',
+            type=int,
+            default=2,
+            help='Cantidad de trabajadores en paralelo (por defecto 2)'
+        )
+        parser.add_argument(
+            '--espera',
+            type=float,
+            default=2.0,
+            help='Segundos de espera cuando la cola está vacía (por defecto 2)'
+        )
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Procesar los trabajos pendientes y terminar'
+        )
+
+    def handle(self, *args, **options):
+        if options['una_vez']:
+            procesados = procesar_pendientes()
+            self.stdout.write(self.style.SUCCESS(f'{procesados} trabajos procesados'))
+            return
+
+        self.stdout.write(f"Procesando reportes con {options['hilos']} trabajadores (Ctrl+C para salir)")
+        hilos = [
+            threading.Thread(target=self._trabajar, args=(options['espera'],), daemon=True)
+            for _ in range(options['hilos'])
+        ]
+        for hilo in hilos:
+            hilo.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.stdout.write('Deteniendo procesador de reportes')
+
+    def _trabajar(self, espera):
+        while True:
+            try:
+                if not procesar_pendientes():
+                    time.sleep(espera)
+            except Exception as e:
+                self.stderr.write(f'Error en el procesador de reportes: {e}')
+                time.sleep(espera)
+            finally:
+                close_old_connections()
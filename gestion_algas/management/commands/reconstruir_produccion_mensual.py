@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Reconstruye desde cero los resúmenes de producción mensual
+"""
+from collections import defaultdict
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from gestion_algas.models import (
+    RegistroProduccion, ProduccionMensual, ProduccionMensualTipo, inicio_de_mes
+)
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las tablas ProduccionMensual y ProduccionMensualTipo a partir de RegistroProduccion'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Cantidad de registros leídos por lote (por defecto 2000)'
+        )
+
+    def handle(self, *args, **options):
+        por_mes = defaultdict(lambda: [Decimal('0.00'), 0])
+        por_tipo = defaultdict(lambda: [Decimal('0.00'), 0])
+
+        # El mes se calcula en Python con la hora local: la base MySQL no tiene
+        # cargadas las tablas de zona horaria que necesita TruncMonth(tzinfo=...)
+        filas = RegistroProduccion.objects.order_by().values_list(
+            'fecha_registro', 'tipo_alga_id', 'cantidad_cosechada'
+        ).iterator(chunk_size=options['chunk_size'])
+
+        for fecha_registro, tipo_alga_id, cantidad in filas:
+            mes = inicio_de_mes(fecha_registro)
+            por_mes[mes][0] += cantidad
+            por_mes[mes][1] += 1
+            if tipo_alga_id:
+                por_tipo[(mes, tipo_alga_id)][0] += cantidad
+                por_tipo[(mes, tipo_alga_id)][1] += 1
+
+        with transaction.atomic():
+            ProduccionMensualTipo.objects.all().delete()
+            ProduccionMensual.objects.all().delete()
+            ProduccionMensual.objects.bulk_create([
+                ProduccionMensual(mes=mes, total_cosechado=total, total_registros=cantidad)
+                for mes, (total, cantidad) in por_mes.items()
+            ])
+            ProduccionMensualTipo.objects.bulk_create([
+                ProduccionMensualTipo(
+                    mes=mes, tipo_alga_id=tipo_alga_id,
+                    total_cosechado=total, total_registros=cantidad
+                )
+                for (mes, tipo_alga_id), (total, cantidad) in por_tipo.items()
+            ])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Resumen reconstruido: {len(por_mes)} meses, {len(por_tipo)} combinaciones mes/tipo'
+        ))
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Verifica y repara los totales históricos guardados en cada tipo de alga
+"""
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum, Count, Min, Max
+from gestion_algas.estadisticas import invalidar_dashboard
+from gestion_algas.models import TipoAlga, RegistroProduccion
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula desde RegistroProduccion los totales de cada TipoAlga '
+        '(kg, registros, primera y última cosecha) y corrige las diferencias'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--solo-verificar',
+            action='store_true',
+            help='Informar las diferencias sin corregirlas'
+        )
+
+    def handle(self, *args, **options):
+        diferencias = 0
+
+        with transaction.atomic():
+            # Bloquear los tipos para que ningún registro nuevo cambie los
+            # contadores entre el cálculo y la corrección
+            tipos = list(TipoAlga.objects.select_for_update().order_by('pk').values(
+                'pk', 'nombre', *TipoAlga.CAMPOS_CONTADORES
+            ))
+            reales = {
+                fila['tipo_alga']: fila
+                for fila in RegistroProduccion.objects.filter(tipo_alga__isnull=False).order_by().values(
+                    'tipo_alga'
+                ).annotate(
+                    total_cosechado=Sum('cantidad_cosechada'),
+                    total_registros=Count('id'),
+                    primera_cosecha=Min('fecha_registro'),
+                    ultima_cosecha=Max('fecha_registro'),
+                )
+            }
+
+            for tipo in tipos:
+                real = reales.get(tipo['pk'], {})
+                esperado = {
+                    'total_cosechado': real.get('total_cosechado') or Decimal('0.00'),
+                    'total_registros': real.get('total_registros', 0),
+                    'primera_cosecha': real.get('primera_cosecha'),
+                    'ultima_cosecha': real.get('ultima_cosecha'),
+                }
+                cambios = {
+                    campo: valor for campo, valor in esperado.items()
+                    if tipo[campo] != valor
+                }
+                if not cambios:
+                    continue
+
+                diferencias += 1
+                detalle = ', '.join(
+                    f'{campo}: {tipo[campo]} -> {valor}' for campo, valor in cambios.items()
+                )
+                self.stdout.write(f"{tipo['nombre']}: {detalle}")
+                if not options['solo_verificar']:
+                    TipoAlga.objects.filter(pk=tipo['pk']).update(**cambios)
+
+            if diferencias and not options['solo_verificar']:
+                transaction.on_commit(invalidar_dashboard)
+
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS(f'Contadores correctos en {len(tipos)} tipos de alga'))
+        elif options['solo_verificar']:
+            self.stdout.write(self.style.WARNING(f'{diferencias} tipos de alga con diferencias'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{diferencias} tipos de alga corregidos'))
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Middleware de la aplicación de gestión de algas
+"""
+import time
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.shortcuts import redirect
+from django.utils.functional import SimpleLazyObject
+from .models import Usuario
+from .routers import replica_configurada, fijar_sesion_a_primaria
+
+
+def clave_rol_cache(usuario_id):
+    """Clave del rol de un usuario en la caché"""
+    return f'gestion_algas:usuario_rol:{usuario_id}'
+
+
+def obtener_usuario_sesion(request):
+    """
+    Retorna el Usuario de la sesión actual o None.
+
+    La consulta se hace como máximo una vez por petición; el resultado
+    queda guardado en el propio request.
+    """
+    if not hasattr(request, '_usuario_sesion'):
+        usuario = None
+        user_id = request.session.get('user_id')
+        if request.session.get('user_logged', False) and user_id:
+            usuario = Usuario.objects.filter(id=user_id).first()
+        request._usuario_sesion = usuario
+    return request._usuario_sesion
+
+
+def obtener_rol_sesion(request):
+    """
+    Retorna el rol del usuario de la sesión o None si la sesión no es válida.
+
+    Si USUARIO_ROL_CACHE_TTL es mayor que cero el rol se guarda en la caché
+    por ese número de segundos, así las peticiones que solo necesitan
+    verificar permisos no consultan la base de datos. La entrada se borra
+    al guardar o eliminar el usuario (ver signals.py); con la caché en
+    memoria local eso solo llega al proceso que lo modificó, y en los
+    demás un usuario eliminado se detecta al cargar request.usuario (ver
+    UsuarioSesionMiddleware).
+    """
+    ttl = getattr(settings, 'USUARIO_ROL_CACHE_TTL', 0)
+    user_id = request.session.get('user_id')
+
+    if ttl and user_id and not hasattr(request, '_usuario_sesion'):
+        rol = cache.get(clave_rol_cache(user_id))
+        if rol is not None:
+            return rol
+
+    usuario = obtener_usuario_sesion(request)
+    if usuario is None:
+        return None
+    if ttl:
+        cache.set(clave_rol_cache(usuario.id), usuario.rol, ttl)
+    return usuario.rol
+
+
+CLAVE_SESION_RENOVADA = '_renovada'
+
+
+class RenovarSesionMiddleware:
+    """
+    Vencimiento deslizante de la sesión sin guardarla en cada petición.
+
+    Con SESSION_SAVE_EVERY_REQUEST cada página vista escribe la sesión en
+    la base de datos. Aquí la sesión iniciada se marca como modificada
+    (y se guarda, extendiendo la cookie y el vencimiento) solo cuando su
+    última renovación tiene más de SESSION_RENOVAR_CADA segundos: como
+    mucho una escritura por usuario en ese intervalo.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        sesion = getattr(request, 'session', None)
+        if sesion is not None and sesion.get('user_logged', False):
+            ahora = int(time.time())
+            renovada = sesion.get(CLAVE_SESION_RENOVADA, 0)
+            if ahora - renovada >= getattr(settings, 'SESSION_RENOVAR_CADA', 900):
+                sesion[CLAVE_SESION_RENOVADA] = ahora
+        return response
+
+
+class UsuarioEliminado(Exception):
+    """La sesión iniciada apunta a un usuario que ya no existe"""
+
+
+class UsuarioSesionMiddleware:
+    """
+    Agrega request.usuario con el Usuario de la sesión.
+
+    El usuario se resuelve de forma perezosa, al primer acceso, y se
+    reutiliza en los decoradores de permisos y en las vistas.
+
+    Los decoradores pueden aceptar la sesión con el rol en caché sin
+    cargar el usuario; si la vista lo usa y ya no existe (por ejemplo, se
+    eliminó en otro proceso, cuya caché local no se invalidó) la sesión se
+    cierra y se redirige al login en lugar de fallar en la vista.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.usuario = SimpleLazyObject(lambda: self.usuario_sesion(request))
+        return self.get_response(request)
+
+    @staticmethod
+    def usuario_sesion(request):
+        usuario = obtener_usuario_sesion(request)
+        if usuario is None and request.session.get('user_logged', False):
+            cache.delete(clave_rol_cache(request.session.get('user_id')))
+            raise UsuarioEliminado()
+        return usuario
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, UsuarioEliminado):
+            request.session.flush()
+            messages.error(request, 'Sesión inválida. Por favor, inicia sesión nuevamente.')
+            return redirect('login')
+        return None
+
+
+class FijarPrimariaMiddleware:
+    """
+    Después de una petición que puede modificar datos (POST, PUT, PATCH,
+    DELETE) fija la sesión a la base principal por unos segundos, para que
+    las vistas con @usar_replica muestren los propios cambios del usuario.
+    """
+
+    METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            request.method not in self.METODOS_SEGUROS
+            and replica_configurada()
+            and hasattr(request, 'session')
+        ):
+            fijar_sesion_a_primaria(request)
+        return response
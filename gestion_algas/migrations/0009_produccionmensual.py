@@ -0,0 +1,83 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:57
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def poblar_produccion_mensual(apps, schema_editor):
+    """Calcular el resumen mensual inicial a partir de los registros existentes"""
+    RegistroProduccion = apps.get_model('gestion_algas', 'RegistroProduccion')
+    ProduccionMensual = apps.get_model('gestion_algas', 'ProduccionMensual')
+    ProduccionMensualTipo = apps.get_model('gestion_algas', 'ProduccionMensualTipo')
+
+    por_mes = {}
+    por_tipo = {}
+    filas = RegistroProduccion.objects.order_by().values_list(
+        'fecha_registro', 'tipo_alga_id', 'cantidad_cosechada'
+    ).iterator(chunk_size=2000)
+    for fecha_registro, tipo_alga_id, cantidad in filas:
+        if timezone.is_aware(fecha_registro):
+            fecha_registro = timezone.localtime(fecha_registro)
+        mes = fecha_registro.date().replace(day=1)
+        total, registros = por_mes.get(mes, (Decimal('0.00'), 0))
+        por_mes[mes] = (total + cantidad, registros + 1)
+        if tipo_alga_id:
+            total, registros = por_tipo.get((mes, tipo_alga_id), (Decimal('0.00'), 0))
+            por_tipo[(mes, tipo_alga_id)] = (total + cantidad, registros + 1)
+
+    ProduccionMensual.objects.bulk_create([
+        ProduccionMensual(mes=mes, total_cosechado=total, total_registros=registros)
+        for mes, (total, registros) in por_mes.items()
+    ])
+    ProduccionMensualTipo.objects.bulk_create([
+        ProduccionMensualTipo(mes=mes, tipo_alga_id=tipo_alga_id, total_cosechado=total, total_registros=registros)
+        for (mes, tipo_alga_id), (total, registros) in por_tipo.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_algas', '0008_registroproduccion_nombre_tipo_alga_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProduccionMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(help_text='Primer día del mes (hora local)', unique=True, verbose_name='Mes')),
+                ('total_cosechado', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Total Cosechado (kg)')),
+                ('total_registros', models.PositiveIntegerField(default=0, verbose_name='Total de Registros')),
+            ],
+            options={
+                'verbose_name': 'Producción Mensual',
+                'verbose_name_plural': 'Producción Mensual',
+                'ordering': ['-mes'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='configuracionreporte',
+            name='formato_preferido',
+            field=models.CharField(choices=[('pdf', 'PDF'), ('excel', 'Excel')], default='pdf', max_length=10, verbose_name='Formato de Reporte Preferido'),
+        ),
+        migrations.CreateModel(
+            name='ProduccionMensualTipo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(help_text='Primer día del mes (hora local)', verbose_name='Mes')),
+                ('total_cosechado', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Total Cosechado (kg)')),
+                ('total_registros', models.PositiveIntegerField(default=0, verbose_name='Total de Registros')),
+                ('tipo_alga', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='produccion_mensual', to='gestion_algas.tipoalga', verbose_name='Tipo de Alga')),
+            ],
+            options={
+                'verbose_name': 'Producción Mensual por Tipo',
+                'verbose_name_plural': 'Producción Mensual por Tipo',
+                'ordering': ['-mes', 'tipo_alga'],
+                'unique_together': {('mes', 'tipo_alga')},
+            },
+        ),
+        migrations.RunPython(poblar_produccion_mensual, migrations.RunPython.noop),
+    ]
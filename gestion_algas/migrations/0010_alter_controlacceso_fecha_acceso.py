@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_algas', '0009_produccionmensual'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='controlacceso',
+            name='fecha_acceso',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Fecha de Acceso'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_algas', '0010_alter_controlacceso_fecha_acceso'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoReporte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('personalizado', 'Reporte Personalizado'), ('semanal', 'Producción Semanal')], max_length=20, verbose_name='Tipo de Reporte')),
+                ('fecha_desde', models.DateTimeField(verbose_name='Fecha Desde')),
+                ('fecha_hasta', models.DateTimeField(verbose_name='Fecha Hasta')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En Proceso'), ('completado', 'Completado'), ('error', 'Error')], default='pendiente', max_length=20, verbose_name='Estado')),
+                ('archivo', models.FileField(blank=True, upload_to='reportes/', verbose_name='Archivo')),
+                ('nombre_archivo', models.CharField(blank=True, max_length=255, verbose_name='Nombre del Archivo')),
+                ('content_type', models.CharField(blank=True, max_length=100, verbose_name='Tipo de Contenido')),
+                ('error', models.TextField(blank=True, null=True, verbose_name='Error')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True, verbose_name='Inicio del Proceso')),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True, verbose_name='Fin del Proceso')),
+                ('configuracion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='trabajos', to='gestion_algas.configuracionreporte', verbose_name='Configuración')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='trabajos_reporte', to='gestion_algas.usuario', verbose_name='Solicitado por')),
+            ],
+            options={
+                'verbose_name': 'Trabajo de Reporte',
+                'verbose_name_plural': 'Trabajos de Reportes',
+                'ordering': ['-fecha_creacion'],
+                'indexes': [models.Index(fields=['estado', 'fecha_creacion'], name='gestion_alg_estado_913286_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_algas', '0011_trabajoreporte'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='configuracionreporte',
+            name='incluir_hoja_registros',
+            field=models.BooleanField(default=False, help_text='Agregar al Excel una hoja con cada registro de producción del período', verbose_name='Incluir Hoja de Registros (Excel)'),
+        ),
+    ]
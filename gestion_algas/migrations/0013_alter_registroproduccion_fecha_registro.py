@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:08
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_algas', '0012_configuracionreporte_incluir_hoja_registros'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='registroproduccion',
+            name='fecha_registro',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Fecha de Registro'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:11
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Sum, Count, Min, Max
+
+
+def poblar_contadores(apps, schema_editor):
+    """Calcular los totales iniciales de cada tipo a partir de los registros existentes"""
+    TipoAlga = apps.get_model('gestion_algas', 'TipoAlga')
+    RegistroProduccion = apps.get_model('gestion_algas', 'RegistroProduccion')
+
+    totales = RegistroProduccion.objects.filter(tipo_alga__isnull=False).order_by().values(
+        'tipo_alga'
+    ).annotate(
+        total=Sum('cantidad_cosechada'),
+        cantidad=Count('id'),
+        primera=Min('fecha_registro'),
+        ultima=Max('fecha_registro'),
+    )
+    for fila in totales:
+        TipoAlga.objects.filter(pk=fila['tipo_alga']).update(
+            total_cosechado=fila['total'],
+            total_registros=fila['cantidad'],
+            primera_cosecha=fila['primera'],
+            ultima_cosecha=fila['ultima'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_algas', '0013_alter_registroproduccion_fecha_registro'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tipoalga',
+            name='primera_cosecha',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Primera Cosecha'),
+        ),
+        migrations.AddField(
+            model_name='tipoalga',
+            name='total_cosechado',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=14, verbose_name='Total Cosechado (kg)'),
+        ),
+        migrations.AddField(
+            model_name='tipoalga',
+            name='total_registros',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Total de Registros'),
+        ),
+        migrations.AddField(
+            model_name='tipoalga',
+            name='ultima_cosecha',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Última Cosecha'),
+        ),
+        migrations.RunPython(poblar_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_algas', '0014_tipoalga_contadores'),
+    ]
+
+    # Crear los índices nuevos antes de eliminar los que reemplazan
+    operations = [
+        migrations.AddIndex(
+            model_name='registroproduccion',
+            index=models.Index(fields=['-fecha_registro', 'tipo_alga', 'sector', 'cantidad_cosechada'], name='gestion_alg_fecha_r_a835c4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registroproduccion',
+            index=models.Index(fields=['tipo_alga', '-fecha_registro', 'sector', 'cantidad_cosechada'], name='gestion_alg_tipo_al_bfc750_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registroproduccion',
+            index=models.Index(fields=['sector', '-fecha_registro', 'tipo_alga', 'cantidad_cosechada'], name='gestion_alg_sector_5343a3_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='registroproduccion',
+            name='gestion_alg_fecha_r_a21518_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='registroproduccion',
+            name='gestion_alg_tipo_al_030625_idx',
+        ),
+    ]
@@ -0,0 +1,137 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:26
+
+from collections import defaultdict
+import unicodedata
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+# Copias de las funciones de models.py de esta versión: la migración no
+# debe cambiar si esas funciones cambian después
+def normalizar_sector(nombre):
+    """Nombre de sector sin espacios repetidos ni al inicio o al final"""
+    return ' '.join((nombre or '').split())
+
+
+def clave_sector(nombre):
+    """Clave para comparar sectores sin distinguir mayúsculas, tildes ni espacios"""
+    descompuesto = unicodedata.normalize('NFKD', normalizar_sector(nombre))
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).casefold()
+
+
+def normalizar_sectores(apps, schema_editor):
+    """
+    Crear el catálogo de sectores a partir de los nombres escritos en los
+    registros y en las configuraciones de reportes.
+
+    Las variantes de un mismo sector (mayúsculas, tildes, espacios) quedan
+    en un solo Sector con el nombre más usado, y los registros pasan a
+    usar ese nombre.
+    """
+    Sector = apps.get_model('gestion_algas', 'Sector')
+    RegistroProduccion = apps.get_model('gestion_algas', 'RegistroProduccion')
+    ConfiguracionReporte = apps.get_model('gestion_algas', 'ConfiguracionReporte')
+
+    variantes = defaultdict(list)
+    nombres = RegistroProduccion.objects.values_list('sector').annotate(cantidad=Count('id')).order_by()
+    for nombre, cantidad in nombres:
+        if normalizar_sector(nombre):
+            variantes[clave_sector(nombre)].append((cantidad, nombre))
+
+    sectores = {}
+    for clave, nombres in variantes.items():
+        _, nombre = max(nombres)
+        sector = Sector.objects.create(nombre=normalizar_sector(nombre), clave=clave)
+        sectores[clave] = sector
+        for _, variante in nombres:
+            RegistroProduccion.objects.filter(sector=variante).update(
+                sector_catalogo=sector, sector=sector.nombre
+            )
+
+    configuraciones = ConfiguracionReporte.objects.exclude(sectores_especificos__isnull=True)
+    for configuracion in configuraciones.exclude(sectores_especificos=''):
+        seleccionados = []
+        for nombre in configuracion.sectores_especificos.split(','):
+            if not normalizar_sector(nombre):
+                continue
+            clave = clave_sector(nombre)
+            if clave not in sectores:
+                # Sector sin registros: se crea para que el filtro se mantenga
+                sectores[clave] = Sector.objects.create(nombre=normalizar_sector(nombre), clave=clave)
+            seleccionados.append(sectores[clave])
+        configuracion.sectores.add(*seleccionados)
+
+
+def restaurar_sectores_especificos(apps, schema_editor):
+    ConfiguracionReporte = apps.get_model('gestion_algas', 'ConfiguracionReporte')
+    for configuracion in ConfiguracionReporte.objects.prefetch_related('sectores'):
+        nombres = [sector.nombre for sector in configuracion.sectores.all()]
+        if nombres:
+            configuracion.sectores_especificos = ', '.join(nombres)
+            configuracion.save(update_fields=['sectores_especificos'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_algas', '0015_indices_reportes'),
+    ]
+
+    # Los índices nuevos se crean después de llenar sector_catalogo
+    operations = [
+        migrations.CreateModel(
+            name='Sector',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, verbose_name='Nombre')),
+                ('clave', models.CharField(editable=False, help_text='Nombre normalizado para evitar sectores duplicados', max_length=100, unique=True, verbose_name='Clave')),
+                ('activo', models.BooleanField(default=True, verbose_name='Activo')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+            ],
+            options={
+                'verbose_name': 'Sector',
+                'verbose_name_plural': 'Sectores',
+                'ordering': ['nombre'],
+            },
+        ),
+        migrations.AddField(
+            model_name='configuracionreporte',
+            name='sectores',
+            field=models.ManyToManyField(blank=True, help_text='Selecciona sectores específicos (vacío = todos)', to='gestion_algas.sector', verbose_name='Sectores'),
+        ),
+        migrations.AddField(
+            model_name='registroproduccion',
+            name='sector_catalogo',
+            field=models.ForeignKey(blank=True, help_text='Sector normalizado; se asigna al guardar a partir del nombre del sector', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='registros', to='gestion_algas.sector', verbose_name='Sector (catálogo)'),
+        ),
+        migrations.RunPython(normalizar_sectores, restaurar_sectores_especificos),
+        migrations.RemoveField(
+            model_name='configuracionreporte',
+            name='sectores_especificos',
+        ),
+        migrations.AddIndex(
+            model_name='registroproduccion',
+            index=models.Index(fields=['-fecha_registro', 'tipo_alga', 'sector_catalogo', 'cantidad_cosechada'], name='gestion_alg_fecha_r_1c2b3c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registroproduccion',
+            index=models.Index(fields=['tipo_alga', '-fecha_registro', 'sector_catalogo', 'cantidad_cosechada'], name='gestion_alg_tipo_al_aaf199_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registroproduccion',
+            index=models.Index(fields=['sector_catalogo', '-fecha_registro', 'tipo_alga', 'cantidad_cosechada'], name='gestion_alg_sector__a03e4c_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='registroproduccion',
+            name='gestion_alg_fecha_r_a835c4_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='registroproduccion',
+            name='gestion_alg_tipo_al_bfc750_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='registroproduccion',
+            name='gestion_alg_sector_5343a3_idx',
+        ),
+    ]
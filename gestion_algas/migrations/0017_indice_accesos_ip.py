@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_algas', '0016_sectores'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='controlacceso',
+            index=models.Index(fields=['ip_origen', '-fecha_acceso'], name='gestion_alg_ip_orig_af1875_idx'),
+        ),
+    ]
@@ -2,9 +2,35 @@
 """
 Modelos de la aplicación de gestión de algas
 """
-from django.db import models
+from django.contrib.auth.hashers import make_password, check_password, identify_hasher
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest, Least, TruncMonth
 from django.core.validators import MinValueValidator
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
 from decimal import Decimal
+import unicodedata
+
+
+def normalizar_sector(nombre):
+    """Nombre de sector sin espacios repetidos ni al inicio o al final"""
+    return ' '.join((nombre or '').split())
+
+
+def clave_sector(nombre):
+    """Clave para comparar sectores sin distinguir mayúsculas, tildes ni espacios"""
+    descompuesto = unicodedata.normalize('NFKD', normalizar_sector(nombre))
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).casefold()
+
+
+def inicio_de_mes(fecha):
+    """Primer día del mes (hora local) al que pertenece una fecha o datetime"""
+    if hasattr(fecha, 'hour'):
+        if timezone.is_aware(fecha):
+            fecha = timezone.localtime(fecha)
+        fecha = fecha.date()
+    return fecha.replace(day=1)
 
 
 class Usuario(models.Model):
@@ -51,6 +77,45 @@ class Usuario(models.Model):
     def __str__(self):
         return f"{self.username} - {self.rol}"
     
+    def save(self, *args, **kwargs):
+        """Guardar el usuario con la contraseña como hash si viene en texto plano"""
+        if not self.password_con_hash():
+            self.set_password(self.password)
+        super().save(*args, **kwargs)
+    
+    def set_password(self, password):
+        """Reemplazar la contraseña por su hash con el hasher de PASSWORD_HASHERS"""
+        self.password = make_password(password)
+    
+    def password_con_hash(self):
+        """True si la contraseña guardada es un hash de un hasher conocido"""
+        try:
+            identify_hasher(self.password)
+        except ValueError:
+            return False
+        return True
+    
+    def check_password(self, password):
+        """
+        Verifica la contraseña.
+        
+        Las filas anteriores al hash guardan la contraseña en texto plano: se
+        comparan en tiempo constante y, si coinciden, se guarda el hash. Lo
+        mismo con los hashes de otro hasher o costo que el configurado. Así
+        cada usuario se migra en su siguiente login, sin migrar la tabla.
+        """
+        def actualizar(password):
+            self.set_password(password)
+            if self.pk:
+                Usuario.objects.filter(pk=self.pk).update(password=self.password)
+        
+        if self.password_con_hash():
+            return check_password(password, self.password, actualizar)
+        if not constant_time_compare(password, self.password or ''):
+            return False
+        actualizar(password)
+        return True
+    
     def es_admin(self):
         return self.rol == 'Administrador'
     
@@ -89,6 +154,35 @@ class TipoAlga(models.Model):
         verbose_name='Fecha de Creación'
     )
     
+    # Totales históricos mantenidos por las señales de RegistroProduccion
+    # (ver signals.py y el comando verificar_contadores)
+    total_cosechado = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        editable=False,
+        verbose_name='Total Cosechado (kg)'
+    )
+    total_registros = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Total de Registros'
+    )
+    primera_cosecha = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Primera Cosecha'
+    )
+    ultima_cosecha = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Última Cosecha'
+    )
+    
+    CAMPOS_CONTADORES = ('total_cosechado', 'total_registros', 'primera_cosecha', 'ultima_cosecha')
+    
     class Meta:
         verbose_name = 'Tipo de Alga'
         verbose_name_plural = 'Tipos de Algas'
@@ -96,6 +190,118 @@ class TipoAlga(models.Model):
     
     def __str__(self):
         return self.nombre
+    
+    def save(self, *args, **kwargs):
+        """Guardar sin pisar los contadores, que solo cambian con acumular_totales"""
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name not in self.CAMPOS_CONTADORES
+            ]
+        super().save(*args, **kwargs)
+    
+    @classmethod
+    def acumular_totales(cls, tipo_alga_id, cantidad, registros, primera=None, ultima=None):
+        """
+        Suma (o resta, con valores negativos) cantidad y registros a los
+        totales del tipo de alga con F(), sin leer la fila.
+        
+        Al sumar, primera y ultima amplían el rango de fechas de cosecha. Al
+        restar, el rango se recalcula con subconsultas sobre el índice
+        (tipo_alga, fecha_registro), ya que no se puede descontar un mínimo.
+        """
+        cambios = {
+            'total_cosechado': F('total_cosechado') + Decimal(str(cantidad)),
+            'total_registros': F('total_registros') + registros,
+        }
+        if registros > 0:
+            cambios['primera_cosecha'] = Least(Coalesce('primera_cosecha', Value(primera)), Value(primera))
+            cambios['ultima_cosecha'] = Greatest(Coalesce('ultima_cosecha', Value(ultima)), Value(ultima))
+        else:
+            fechas = RegistroProduccion.objects.filter(tipo_alga=OuterRef('pk')).values('fecha_registro')
+            cambios['primera_cosecha'] = Subquery(fechas.order_by('fecha_registro')[:1])
+            cambios['ultima_cosecha'] = Subquery(fechas.order_by('-fecha_registro')[:1])
+        cls.objects.filter(pk=tipo_alga_id).update(**cambios)
+
+
+class Sector(models.Model):
+    """
+    Catálogo de sectores de cosecha.
+    
+    Los registros guardan el nombre del sector y una referencia a este
+    catálogo. La clave normalizada (sin mayúsculas, tildes ni espacios
+    extra) evita que "Sector Norte" y "sector  norte" sean sectores
+    distintos; los sectores nuevos se crean al registrar producción en
+    ellos por primera vez.
+    """
+    nombre = models.CharField(
+        max_length=100,
+        verbose_name='Nombre'
+    )
+    clave = models.CharField(
+        max_length=100,
+        unique=True,
+        editable=False,
+        verbose_name='Clave',
+        help_text='Nombre normalizado para evitar sectores duplicados'
+    )
+    activo = models.BooleanField(
+        default=True,
+        verbose_name='Activo'
+    )
+    fecha_creacion = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Fecha de Creación'
+    )
+    
+    class Meta:
+        verbose_name = 'Sector'
+        verbose_name_plural = 'Sectores'
+        ordering = ['nombre']
+    
+    def __str__(self):
+        return self.nombre
+    
+    def save(self, *args, **kwargs):
+        """Guardar con el nombre normalizado y su clave"""
+        self.nombre = normalizar_sector(self.nombre)
+        self.clave = clave_sector(self.nombre)
+        super().save(*args, **kwargs)
+    
+    @classmethod
+    def desde_nombres(cls, nombres):
+        """
+        Sectores del catálogo para los nombres indicados, creando los que
+        no existen.
+        
+        Returns:
+            dict {clave: Sector}. Usa una consulta si todos existen y tres
+            si hay que crear alguno (la creación ignora los conflictos con
+            otra petición que cree el mismo sector al mismo tiempo).
+        """
+        por_clave = {}
+        for nombre in nombres:
+            nombre = normalizar_sector(nombre)
+            if nombre:
+                por_clave.setdefault(clave_sector(nombre), nombre)
+        
+        sectores = {sector.clave: sector for sector in cls.objects.filter(clave__in=por_clave)}
+        faltantes = [
+            cls(nombre=nombre, clave=clave)
+            for clave, nombre in por_clave.items() if clave not in sectores
+        ]
+        if faltantes:
+            cls.objects.bulk_create(faltantes, ignore_conflicts=True)
+            sectores.update(
+                (sector.clave, sector)
+                for sector in cls.objects.filter(clave__in=[sector.clave for sector in faltantes])
+            )
+        return sectores
+    
+    @classmethod
+    def desde_nombre(cls, nombre):
+        """Sector del catálogo para un nombre, creándolo si no existe (None si está vacío)"""
+        return cls.desde_nombres([nombre]).get(clave_sector(nombre))
 
 
 class RegistroProduccion(models.Model):
@@ -139,13 +345,23 @@ class RegistroProduccion(models.Model):
         max_length=100,
         verbose_name='Sector de Cosecha'
     )
+    sector_catalogo = models.ForeignKey(
+        Sector,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='registros',
+        verbose_name='Sector (catálogo)',
+        help_text='Sector normalizado; se asigna al guardar a partir del nombre del sector'
+    )
     observaciones = models.TextField(
         blank=True,
         null=True,
         verbose_name='Observaciones'
     )
     fecha_registro = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
+        editable=False,
         verbose_name='Fecha de Registro'
     )
     fecha_modificacion = models.DateTimeField(
@@ -157,17 +373,39 @@ class RegistroProduccion(models.Model):
         verbose_name = 'Registro de Producción'
         verbose_name_plural = 'Registros de Producción'
         ordering = ['-fecha_registro']
+        # Los índices de reportes terminan en sector y cantidad_cosechada para
+        # cubrir los filtros (fecha + tipos + sectores) y la suma sin leer la
+        # fila completa; cada uno empieza por la columna más selectiva de un
+        # tipo de filtro: solo fechas, tipos de alga o sectores.
         indexes = [
-            models.Index(fields=['-fecha_registro']),
+            models.Index(fields=['-fecha_registro', 'tipo_alga', 'sector_catalogo', 'cantidad_cosechada']),
             models.Index(fields=['usuario', '-fecha_registro']),
-            models.Index(fields=['tipo_alga', '-fecha_registro']),
+            models.Index(fields=['tipo_alga', '-fecha_registro', 'sector_catalogo', 'cantidad_cosechada']),
+            models.Index(fields=['sector_catalogo', '-fecha_registro', 'tipo_alga', 'cantidad_cosechada']),
         ]
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        registro = super().from_db(db, field_names, values)
+        # Sector leído de la base, para no volver a resolverlo al guardar si no cambió
+        registro._sector_guardado = (registro.__dict__.get('sector'), registro.__dict__.get('sector_catalogo_id'))
+        return registro
+    
     def save(self, *args, **kwargs):
-        """Guardar registro y actualizar el nombre del tipo de alga"""
+        """Guardar registro y actualizar el nombre del tipo de alga y el sector del catálogo"""
         if self.tipo_alga:
             self.nombre_tipo_alga = self.tipo_alga.nombre
+        sector_guardado = getattr(self, '_sector_guardado', None)
+        if self.sector_catalogo_id is None or (self.sector, self.sector_catalogo_id) != sector_guardado:
+            # Sin consultar el sector asignado si no está cargado: se resuelve por nombre
+            campo = self._meta.get_field('sector_catalogo')
+            catalogo = self.sector_catalogo if campo.is_cached(self) else None
+            if catalogo is None or catalogo.clave != clave_sector(self.sector):
+                self.sector_catalogo = Sector.desde_nombre(self.sector)
+            if self.sector_catalogo:
+                self.sector = self.sector_catalogo.nombre
         super().save(*args, **kwargs)
+        self._sector_guardado = (self.sector, self.sector_catalogo_id)
     
     def __str__(self):
         nombre_tipo = self.nombre_tipo_alga if self.nombre_tipo_alga else (self.tipo_alga.nombre if self.tipo_alga else 'Desconocido')
@@ -194,6 +432,18 @@ class RegistroProduccion(models.Model):
         }
 
 
+class CapacidadProductivaQuerySet(models.QuerySet):
+    
+    def con_volumen_producido(self):
+        """
+        Anota el volumen producido de cada mes con una subconsulta al resumen
+        mensual. El mes se trunca al primer día, como en volumen_producido,
+        por si la capacidad se guardó con otro día del mes.
+        """
+        resumen = ProduccionMensual.objects.filter(mes=OuterRef('mes_inicio')).values('total_cosechado')[:1]
+        return self.annotate(mes_inicio=TruncMonth('mes')).annotate(volumen_mensual=Subquery(resumen))
+
+
 class CapacidadProductiva(models.Model):
     """
     Modelo para registrar la capacidad productiva instalada y disponibilidad
@@ -223,6 +473,8 @@ class CapacidadProductiva(models.Model):
         verbose_name='Última Modificación'
     )
     
+    objects = CapacidadProductivaQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Capacidad Productiva'
         verbose_name_plural = 'Capacidades Productivas'
@@ -237,28 +489,19 @@ class CapacidadProductiva(models.Model):
     
     @property
     def volumen_producido(self):
-        """Calcula el volumen producido en el mes sumando los registros de producción"""
-        from datetime import datetime
-        # Obtener el primer y último día del mes
-        año = self.mes.year
-        mes = self.mes.month
-        
-        # Calcular el primer día del siguiente mes
-        if mes == 12:
-            siguiente_mes = datetime(año + 1, 1, 1)
-        else:
-            siguiente_mes = datetime(año, mes + 1, 1)
-        
-        primer_dia = datetime(año, mes, 1)
-        
-        # Sumar todas las cantidades cosechadas en ese mes
-        from django.db.models import Sum
-        total = RegistroProduccion.objects.filter(
-            fecha_registro__gte=primer_dia,
-            fecha_registro__lt=siguiente_mes
-        ).aggregate(total=Sum('cantidad_cosechada'))['total']
+        """
+        Volumen producido en el mes, leído desde el resumen mensual.
         
-        return total or Decimal('0.00')
+        Si el queryset fue anotado con con_volumen_producido() no se hace
+        ninguna consulta; en caso contrario se consulta una sola vez y el
+        valor queda guardado en la instancia para las demás propiedades.
+        """
+        if 'volumen_mensual' not in self.__dict__:
+            total = ProduccionMensual.objects.filter(
+                mes=inicio_de_mes(self.mes)
+            ).values_list('total_cosechado', flat=True).first()
+            self.volumen_mensual = total
+        return self.volumen_mensual or Decimal('0.00')
     
     @property
     def disponibilidad_mensual(self):
@@ -280,6 +523,114 @@ class CapacidadProductiva(models.Model):
         return Decimal('0.00')
 
 
+class ProduccionMensual(models.Model):
+    """
+    Resumen mensual de producción (kg y cantidad de registros).
+    
+    Se mantiene de forma incremental cada vez que se guarda o elimina un
+    RegistroProduccion (ver signals.py) y puede reconstruirse completo con
+    el comando reconstruir_produccion_mensual.
+    """
+    mes = models.DateField(
+        unique=True,
+        verbose_name='Mes',
+        help_text='Primer día del mes (hora local)'
+    )
+    total_cosechado = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Total Cosechado (kg)'
+    )
+    total_registros = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Total de Registros'
+    )
+    
+    class Meta:
+        verbose_name = 'Producción Mensual'
+        verbose_name_plural = 'Producción Mensual'
+        ordering = ['-mes']
+    
+    def __str__(self):
+        return f"Producción {self.mes.strftime('%m/%Y')} - {self.total_cosechado}kg"
+    
+    @classmethod
+    def acumular(cls, mes, cantidad, registros, tipo_alga_id=None):
+        """
+        Suma (o resta, con valores negativos) cantidad y registros al mes
+        indicado y, si corresponde, al resumen del tipo de alga.
+        """
+        cantidad = Decimal(str(cantidad))
+        _acumular(cls.objects.filter(mes=mes), {'mes': mes}, cantidad, registros)
+        if tipo_alga_id:
+            _acumular(
+                ProduccionMensualTipo.objects.filter(mes=mes, tipo_alga_id=tipo_alga_id),
+                {'mes': mes, 'tipo_alga_id': tipo_alga_id},
+                cantidad, registros
+            )
+
+
+class ProduccionMensualTipo(models.Model):
+    """
+    Resumen mensual de producción por tipo de alga
+    """
+    mes = models.DateField(
+        verbose_name='Mes',
+        help_text='Primer día del mes (hora local)'
+    )
+    tipo_alga = models.ForeignKey(
+        TipoAlga,
+        on_delete=models.CASCADE,
+        related_name='produccion_mensual',
+        verbose_name='Tipo de Alga'
+    )
+    total_cosechado = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Total Cosechado (kg)'
+    )
+    total_registros = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Total de Registros'
+    )
+    
+    class Meta:
+        verbose_name = 'Producción Mensual por Tipo'
+        verbose_name_plural = 'Producción Mensual por Tipo'
+        ordering = ['-mes', 'tipo_alga']
+        unique_together = [['mes', 'tipo_alga']]
+    
+    def __str__(self):
+        return f"{self.tipo_alga} {self.mes.strftime('%m/%Y')} - {self.total_cosechado}kg"
+
+
+def _acumular(filas, claves, cantidad, registros):
+    """Actualiza una fila de resumen con F() y la crea si todavía no existe"""
+    cambios = {
+        'total_cosechado': F('total_cosechado') + cantidad,
+        'total_registros': F('total_registros') + registros,
+    }
+    if filas.update(**cambios) or registros <= 0:
+        return
+    try:
+        with transaction.atomic():
+            filas.model.objects.create(
+                total_cosechado=cantidad, total_registros=registros, **claves
+            )
+    except IntegrityError:
+        # Otra petición creó la fila entre el update y el create
+        filas.update(**cambios)
+
+
+class ConfiguracionReporteQuerySet(models.QuerySet):
+    
+    def con_filtros(self):
+        """Precarga los tipos de alga y sectores que usa ConsultaReporte"""
+        return self.prefetch_related('tipos_alga', 'sectores')
+
+
 class ConfiguracionReporte(models.Model):
     """
     Configuración personalizada de reportes para clientes internacionales
@@ -354,12 +705,11 @@ class ConfiguracionReporte(models.Model):
         verbose_name='Tipos de Alga',
         help_text='Selecciona tipos específicos (vacío = todos)'
     )
-    sectores_especificos = models.CharField(
-        max_length=500,
+    sectores = models.ManyToManyField(
+        Sector,
         blank=True,
-        null=True,
-        verbose_name='Sectores Específicos',
-        help_text='Sectores separados por comas (vacío = todos)'
+        verbose_name='Sectores',
+        help_text='Selecciona sectores específicos (vacío = todos)'
     )
     usar_fecha_personalizada = models.BooleanField(
         default=False,
@@ -389,6 +739,11 @@ class ConfiguracionReporte(models.Model):
         verbose_name='Incluir Observaciones',
         help_text='Mostrar observaciones de cada registro'
     )
+    incluir_hoja_registros = models.BooleanField(
+        default=False,
+        verbose_name='Incluir Hoja de Registros (Excel)',
+        help_text='Agregar al Excel una hoja con cada registro de producción del período'
+    )
     activo = models.BooleanField(
         default=True,
         verbose_name='Configuración Activa'
@@ -402,6 +757,8 @@ class ConfiguracionReporte(models.Model):
         verbose_name='Última Modificación'
     )
     
+    objects = ConfiguracionReporteQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Configuración de Reporte'
         verbose_name_plural = 'Configuraciones de Reportes'
@@ -443,7 +800,8 @@ class ControlAcceso(models.Model):
         verbose_name='Tipo de Acceso'
     )
     fecha_acceso = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
+        editable=False,
         verbose_name='Fecha de Acceso'
     )
     detalles = models.TextField(
@@ -459,7 +817,112 @@ class ControlAcceso(models.Model):
         indexes = [
             models.Index(fields=['-fecha_acceso']),
             models.Index(fields=['usuario', '-fecha_acceso']),
+            models.Index(fields=['ip_origen', '-fecha_acceso']),
         ]
     
     def __str__(self):
         return f"{self.get_tipo_acceso_display()} - {self.ip_origen} ({self.fecha_acceso.strftime('%d/%m/%Y %H:%M')})"
+
+
+class TrabajoReporte(models.Model):
+    """
+    Trabajo de generación de un reporte (PDF/Excel) en segundo plano.
+    
+    La tabla funciona como cola: las vistas crean trabajos pendientes y el
+    comando procesar_reportes los toma, genera el archivo y lo guarda en
+    MEDIA_ROOT/reportes.
+    """
+    TIPOS_REPORTE = [
+        ('personalizado', 'Reporte Personalizado'),
+        ('semanal', 'Producción Semanal'),
+    ]
+    
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En Proceso'),
+        ('completado', 'Completado'),
+        ('error', 'Error'),
+    ]
+    
+    tipo = models.CharField(
+        max_length=20,
+        choices=TIPOS_REPORTE,
+        verbose_name='Tipo de Reporte'
+    )
+    configuracion = models.ForeignKey(
+        ConfiguracionReporte,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='trabajos',
+        verbose_name='Configuración'
+    )
+    fecha_desde = models.DateTimeField(
+        verbose_name='Fecha Desde'
+    )
+    fecha_hasta = models.DateTimeField(
+        verbose_name='Fecha Hasta'
+    )
+    usuario = models.ForeignKey(
+        Usuario,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='trabajos_reporte',
+        verbose_name='Solicitado por'
+    )
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADOS,
+        default='pendiente',
+        verbose_name='Estado'
+    )
+    archivo = models.FileField(
+        upload_to='reportes/',
+        blank=True,
+        verbose_name='Archivo'
+    )
+    nombre_archivo = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name='Nombre del Archivo'
+    )
+    content_type = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name='Tipo de Contenido'
+    )
+    error = models.TextField(
+        blank=True,
+        null=True,
+        verbose_name='Error'
+    )
+    fecha_creacion = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Fecha de Creación'
+    )
+    fecha_inicio = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name='Inicio del Proceso'
+    )
+    fecha_fin = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name='Fin del Proceso'
+    )
+    
+    class Meta:
+        verbose_name = 'Trabajo de Reporte'
+        verbose_name_plural = 'Trabajos de Reportes'
+        ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['estado', 'fecha_creacion']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_tipo_display()} #{self.pk} - {self.get_estado_display()}"
+    
+    @property
+    def terminado(self):
+        return self.estado in ('completado', 'error')
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Paginación por cursor (keyset) para listados grandes
+
+django.core.paginator.Paginator cuenta todas las filas (COUNT(*)) y salta a
+la página con OFFSET, que recorre y descarta todas las filas anteriores: la
+página 10.000 cuesta 10.000 veces más que la primera. PaginadorCursor
+ordena por (campo, id) y continúa desde la última fila vista con
+
+    WHERE campo < valor OR (campo = valor AND id < id_valor)
+
+que usa el índice del campo (en InnoDB y SQLite los índices secundarios
+incluyen la clave primaria), así que todas las páginas cuestan lo mismo.
+
+El cursor es opaco: la posición y la dirección van firmadas con
+django.core.signing, de modo que no se puede fabricar ni alterar. Un
+cursor inválido vuelve a la primera página.
+"""
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+TAMANO_PAGINA = 25
+
+_SALT_CURSOR = 'gestion_algas.paginacion'
+
+# Direcciones del cursor: filas después de la posición o antes de ella
+SIGUIENTE = 's'
+ANTERIOR = 'a'
+
+
+class PaginaCursor:
+    """
+    Una página de resultados.
+
+    Se puede iterar y preguntar su largo como una página de Paginator; los
+    enlaces se arman con los cursores siguiente/anterior (None si no hay
+    más páginas en esa dirección).
+    """
+
+    def __init__(self, object_list, siguiente, anterior):
+        self.object_list = object_list
+        self.siguiente = siguiente
+        self.anterior = anterior
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, indice):
+        return self.object_list[indice]
+
+    def has_next(self):
+        return self.siguiente is not None
+
+    def has_previous(self):
+        return self.anterior is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class PaginadorCursor:
+    """
+    Pagina un queryset por (campo, id) sin COUNT ni OFFSET.
+
+    Args:
+        queryset: QuerySet ya filtrado; su orden se reemplaza
+        campo: Campo de orden, no nulo (por ejemplo 'fecha_registro')
+        tamano: Filas por página
+        descendente: Si True, las filas más recientes (mayor campo) primero
+    """
+
+    def __init__(self, queryset, campo, tamano=TAMANO_PAGINA, descendente=True):
+        self.queryset = queryset
+        self.campo = campo
+        self.tamano = tamano
+        self.descendente = descendente
+        self._campo_modelo = queryset.model._meta.get_field(campo)
+
+    def get_page(self, cursor=None):
+        """
+        Página indicada por el cursor: la primera si no hay cursor o no es
+        válido, y la última con cursor_ultima().
+        """
+        posicion, direccion = self._leer_cursor(cursor)
+
+        adelante = direccion == SIGUIENTE
+        query = self.queryset.order_by(*self._orden(invertido=not adelante))
+        if posicion is not None:
+            query = query.filter(self._despues_de(*posicion, invertido=not adelante))
+
+        # Una fila de más indica si hay otra página en esa dirección
+        filas = list(query[:self.tamano + 1])
+        hay_mas = len(filas) > self.tamano
+        filas = filas[:self.tamano]
+        if not adelante:
+            filas.reverse()
+
+        if not filas:
+            return PaginaCursor(filas, None, None)
+
+        hay_siguiente = hay_mas if adelante else posicion is not None
+        hay_anterior = posicion is not None if adelante else hay_mas
+        return PaginaCursor(
+            filas,
+            self._cursor(filas[-1], SIGUIENTE) if hay_siguiente else None,
+            self._cursor(filas[0], ANTERIOR) if hay_anterior else None,
+        )
+
+    def cursor_ultima(self):
+        """Cursor de la última página (las filas más antiguas si es descendente)"""
+        return signing.dumps([None, None, ANTERIOR], salt=_SALT_CURSOR, compress=True)
+
+    def _orden(self, invertido=False):
+        descendente = self.descendente != invertido
+        prefijo = '-' if descendente else ''
+        return f'{prefijo}{self.campo}', f'{prefijo}id'
+
+    def _despues_de(self, valor, id_, invertido=False):
+        """Filas que van después de (valor, id_) en el orden de la consulta"""
+        comparacion = 'lt' if self.descendente != invertido else 'gt'
+        return (
+            Q(**{f'{self.campo}__{comparacion}': valor})
+            | Q(**{self.campo: valor, f'id__{comparacion}': id_})
+        )
+
+    def _cursor(self, objeto, direccion):
+        valor = self._campo_modelo.value_to_string(objeto)
+        return signing.dumps([valor, objeto.pk, direccion], salt=_SALT_CURSOR, compress=True)
+
+    def _leer_cursor(self, cursor):
+        """(posición o None, dirección) del cursor; la primera página si no es válido"""
+        if not cursor:
+            return None, SIGUIENTE
+        try:
+            valor, id_, direccion = signing.loads(cursor, salt=_SALT_CURSOR)
+        except (signing.BadSignature, ValueError, TypeError):
+            return None, SIGUIENTE
+        if direccion not in (SIGUIENTE, ANTERIOR):
+            return None, SIGUIENTE
+        if valor is None:
+            return None, direccion
+        try:
+            return (self._campo_modelo.to_python(valor), int(id_)), direccion
+        except (ValidationError, ValueError, TypeError):
+            return None, SIGUIENTE
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Agrupación de registros por período (día, semana, mes, trimestre) en hora local
+
+Todas las agregaciones por fecha de las vistas y reportes usan este módulo:
+
+- rango_fechas / rango_periodo convierten fechas locales en rangos
+  [inicio, fin) de datetimes con zona horaria, para filtrar con
+  fecha_registro__gte/__lt y aprovechar los índices (nunca se aplica una
+  función a la columna en el WHERE).
+- agrupar_por_periodo agrega un queryset por período. Si la base de datos
+  convierte zonas horarias (BD_ZONAS_HORARIAS) usa Trunc* con tzinfo; si
+  no (MySQL sin las tablas de mysql_tzinfo_to_sql), agrupa con un CASE de
+  rangos calculados en Python. Ambos caminos dan los mismos resultados,
+  también en los cambios de horario de Chile.
+"""
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db.models import Case, When, Value, DateField
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth, TruncQuarter
+from django.utils import timezone
+
+UNIDADES = ('dia', 'semana', 'mes', 'trimestre')
+
+_TRUNC = {
+    'dia': TruncDay,
+    'semana': TruncWeek,
+    'mes': TruncMonth,
+    'trimestre': TruncQuarter,
+}
+
+
+def inicio_periodo(fecha, unidad):
+    """Primer día del período que contiene la fecha (date local)"""
+    if unidad == 'dia':
+        return fecha
+    if unidad == 'semana':
+        return fecha - timedelta(days=fecha.weekday())
+    if unidad == 'mes':
+        return fecha.replace(day=1)
+    if unidad == 'trimestre':
+        return fecha.replace(month=3 * ((fecha.month - 1) // 3) + 1, day=1)
+    raise ValueError(f'Unidad de período no soportada: {unidad}')
+
+
+def siguiente_periodo(inicio, unidad):
+    """Primer día del período siguiente al que empieza en inicio"""
+    if unidad == 'dia':
+        return inicio + timedelta(days=1)
+    if unidad == 'semana':
+        return inicio + timedelta(weeks=1)
+    meses = 1 if unidad == 'mes' else 3
+    anio, mes = divmod(inicio.month - 1 + meses, 12)
+    return inicio.replace(year=inicio.year + anio, month=mes + 1, day=1)
+
+
+def inicio_del_dia(fecha):
+    """Medianoche local de la fecha como datetime con zona horaria"""
+    return timezone.make_aware(datetime.combine(fecha, datetime.min.time()))
+
+
+def rango_fechas(desde, hasta):
+    """Rango [inicio, fin) que cubre los días locales desde..hasta (inclusive)"""
+    return inicio_del_dia(desde), inicio_del_dia(hasta + timedelta(days=1))
+
+
+def rango_periodo(fecha, unidad):
+    """Rango [inicio, fin) del período que contiene la fecha local"""
+    inicio = inicio_periodo(fecha, unidad)
+    return inicio_del_dia(inicio), inicio_del_dia(siguiente_periodo(inicio, unidad))
+
+
+def periodos(desde, hasta, unidad):
+    """Fechas de inicio de los períodos que tocan el rango desde..hasta"""
+    actual = inicio_periodo(desde, unidad)
+    while actual <= hasta:
+        yield actual
+        actual = siguiente_periodo(actual, unidad)
+
+
+def truncar(campo, unidad):
+    """Trunc* en la zona horaria actual, como fecha (sin hora)"""
+    return _TRUNC[unidad](campo, output_field=DateField(), tzinfo=timezone.get_current_timezone())
+
+
+def periodo_por_rangos(campo, unidad, desde, hasta):
+    """Equivalente a truncar() sin funciones de zona horaria en la base de datos"""
+    casos = []
+    for inicio in periodos(desde, hasta, unidad):
+        limite_inferior, limite_superior = inicio_del_dia(inicio), inicio_del_dia(siguiente_periodo(inicio, unidad))
+        casos.append(When(
+            **{f'{campo}__gte': limite_inferior, f'{campo}__lt': limite_superior},
+            then=Value(inicio)
+        ))
+    return Case(*casos, default=None, output_field=DateField())
+
+
+def agrupar_por_periodo(query, unidad, desde, hasta, campo='fecha_registro', por=(), **agregados):
+    """
+    Agrega por período un queryset filtrado a los días locales desde..hasta
+    (por ejemplo con rango_fechas). Las filas fuera de ese rango se
+    descartan aquí también: con el CASE de rangos quedarían con período
+    None y con Trunc en períodos fuera de la ventana.
+
+    Args:
+        por: Campos adicionales por los que agrupar dentro de cada período
+
+    Returns:
+        QuerySet de diccionarios con 'periodo' (date de inicio), los campos
+        de por y los agregados indicados, ordenado del período más antiguo
+        al más reciente.
+    """
+    if unidad not in UNIDADES:
+        raise ValueError(f'Unidad de período no soportada: {unidad}')
+
+    if getattr(settings, 'BD_ZONAS_HORARIAS', True):
+        periodo = truncar(campo, unidad)
+    else:
+        periodo = periodo_por_rangos(campo, unidad, desde, hasta)
+
+    inicio, fin = rango_fechas(desde, hasta)
+    query = query.filter(**{f'{campo}__gte': inicio, f'{campo}__lt': fin})
+    return query.annotate(periodo=periodo).values('periodo', *por).annotate(**agregados).order_by('periodo', *por)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Enrutamiento de lecturas a una réplica de la base de datos
+
+Las vistas decoradas con @usar_replica leen los modelos de gestion_algas
+desde DATABASES['replica'] (si está configurada); todo lo demás, incluidas
+las escrituras y las sesiones, usa 'default'. Después de una petición que
+modifica datos la sesión queda fijada a 'default' por
+REPLICA_VENTANA_LECTURA segundos (ver FijarPrimariaMiddleware), así el
+usuario ve sus propios cambios aunque la réplica vaya con retraso; dentro
+de la misma petición, las lecturas posteriores a una escritura también van
+a 'default'.
+"""
+import time
+from contextvars import ContextVar
+from functools import wraps
+from django.conf import settings
+
+ALIAS_REPLICA = 'replica'
+
+CLAVE_SESION_PRIMARIA = 'leer_primaria_hasta'
+
+_leer_de_replica = ContextVar('leer_de_replica', default=False)
+
+
+def replica_configurada():
+    return ALIAS_REPLICA in settings.DATABASES
+
+
+def sesion_fijada_a_primaria(request):
+    """True si la sesión escribió hace poco y debe leer de 'default'"""
+    session = getattr(request, 'session', None)
+    return session is not None and session.get(CLAVE_SESION_PRIMARIA, 0) > time.time()
+
+
+def fijar_sesion_a_primaria(request):
+    """Leer de 'default' durante REPLICA_VENTANA_LECTURA segundos"""
+    ventana = getattr(settings, 'REPLICA_VENTANA_LECTURA', 10)
+    request.session[CLAVE_SESION_PRIMARIA] = time.time() + ventana
+
+
+def usar_replica(view_func):
+    """
+    Decorador para vistas de solo lectura (reportes, dashboard, API de
+    gráficos): sus consultas a los modelos de la aplicación van a la
+    réplica, salvo que la sesión esté fijada a la base principal.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not replica_configurada() or sesion_fijada_a_primaria(request):
+            return view_func(request, *args, **kwargs)
+        token = _leer_de_replica.set(True)
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            _leer_de_replica.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Envía a la réplica las lecturas de gestion_algas dentro de @usar_replica"""
+
+    def db_for_read(self, model, **hints):
+        if (
+            _leer_de_replica.get()
+            and model._meta.app_label == 'gestion_algas'
+            and replica_configurada()
+        ):
+            return ALIAS_REPLICA
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        # Después de una escritura el resto de la petición lee de 'default'
+        if _leer_de_replica.get():
+            _leer_de_replica.set(False)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # La réplica tiene los mismos datos que la base principal
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplica recibe el esquema por replicación
+        return db != ALIAS_REPLICA
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Señales de la aplicación de gestión de algas
+"""
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.core.cache import cache
+from django.dispatch import receiver
+from .estadisticas import invalidar_dashboard
+from .middleware import clave_rol_cache
+from .models import Usuario, TipoAlga, RegistroProduccion, CapacidadProductiva, ProduccionMensual, inicio_de_mes
+
+
+@receiver(pre_save, sender=RegistroProduccion)
+def guardar_estado_anterior(sender, instance, raw=False, **kwargs):
+    """Recordar mes, tipo y cantidad previos para poder descontarlos al editar"""
+    instance._estado_anterior = None
+    if raw or instance.pk is None:
+        return
+    instance._estado_anterior = sender.objects.filter(pk=instance.pk).values(
+        'fecha_registro', 'tipo_alga_id', 'cantidad_cosechada'
+    ).first()
+
+
+@receiver(post_save, sender=RegistroProduccion)
+def actualizar_produccion_mensual(sender, instance, raw=False, **kwargs):
+    """Aplicar al resumen mensual la diferencia introducida por el registro"""
+    if raw:
+        return
+    anterior = getattr(instance, '_estado_anterior', None)
+    if anterior:
+        ProduccionMensual.acumular(
+            inicio_de_mes(anterior['fecha_registro']),
+            -anterior['cantidad_cosechada'], -1,
+            anterior['tipo_alga_id']
+        )
+    ProduccionMensual.acumular(
+        inicio_de_mes(instance.fecha_registro),
+        instance.cantidad_cosechada, 1,
+        instance.tipo_alga_id
+    )
+
+    # Totales históricos del tipo de alga
+    if anterior and anterior['tipo_alga_id']:
+        TipoAlga.acumular_totales(anterior['tipo_alga_id'], -anterior['cantidad_cosechada'], -1)
+    if instance.tipo_alga_id:
+        TipoAlga.acumular_totales(
+            instance.tipo_alga_id, instance.cantidad_cosechada, 1,
+            instance.fecha_registro, instance.fecha_registro
+        )
+    instance._estado_anterior = None
+
+
+@receiver(post_delete, sender=RegistroProduccion)
+def descontar_produccion_mensual(sender, instance, **kwargs):
+    """Descontar del resumen mensual y de los totales del tipo un registro eliminado"""
+    ProduccionMensual.acumular(
+        inicio_de_mes(instance.fecha_registro),
+        -instance.cantidad_cosechada, -1,
+        instance.tipo_alga_id
+    )
+    if instance.tipo_alga_id:
+        TipoAlga.acumular_totales(instance.tipo_alga_id, -instance.cantidad_cosechada, -1)
+
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def invalidar_rol_usuario(sender, instance, **kwargs):
+    """Descartar el rol en caché cuando el usuario cambia o se elimina"""
+    cache.delete(clave_rol_cache(instance.pk))
+
+
+@receiver(post_save, sender=RegistroProduccion)
+@receiver(post_delete, sender=RegistroProduccion)
+@receiver(post_save, sender=TipoAlga)
+@receiver(post_delete, sender=TipoAlga)
+@receiver(post_save, sender=CapacidadProductiva)
+@receiver(post_delete, sender=CapacidadProductiva)
+def invalidar_datos_dashboard(sender, raw=False, **kwargs):
+    """Descartar los datos del dashboard en caché una vez confirmada la transacción"""
+    if raw:
+        return
+    transaction.on_commit(invalidar_dashboard)
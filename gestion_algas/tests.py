@@ -1,15 +1,49 @@
 """
 Tests para la aplicación de gestión de algas
 """
-from django.test import TestCase, Client
+from django.conf import settings
+from django.test import TestCase, Client, RequestFactory, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from decimal import Decimal
-from .models import TipoAlga, RegistroProduccion, ControlAcceso
+from io import BytesIO, StringIO
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock, skipUnless
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from datetime import timedelta
+from . import cache_reportes
+from .auditoria import AuditoriaDiferida, ruta_archivo_mes
+from .exportacion import ConsultaReporte, DependenciaNoInstalada, periodo_reporte, contexto_reporte_personalizado, generar_excel_personalizado
+from .estadisticas import calcular_estadisticas_dashboard
+from .forms import RegistroIngestaForm
+from .limite_login import LimitadorLogin, limitador_login
+from .middleware import CLAVE_SESION_RENOVADA, clave_rol_cache
+from .trabajos import procesar_pendientes
+from .paginacion import PaginadorCursor
+from .views import get_client_ip
+from .models import Usuario as UsuarioSistema, TipoAlga, Sector, RegistroProduccion, ControlAcceso, CapacidadProductiva, ProduccionMensual, ProduccionMensualTipo, ConfiguracionReporte, TrabajoReporte, inicio_de_mes
 
 Usuario = get_user_model()
 
 
+def iniciar_sesion(client, usuario):
+    """Dejar al cliente con la sesión del sistema iniciada para el usuario"""
+    session = client.session
+    session['user_logged'] = True
+    session['user_id'] = usuario.id
+    session['username'] = usuario.username
+    session['rol'] = usuario.rol
+    session.save()
+
+
 class UsuarioModelTest(TestCase):
     """Tests para el modelo Usuario"""
     
@@ -140,6 +174,143 @@ class LoginViewTest(TestCase):
         self.assertEqual(response.status_code, 200)
 
 
+class LimiteLoginTest(TestCase):
+    """Tests para el límite de intentos de login fallidos"""
+    
+    def setUp(self):
+        cache.clear()
+        self.ahora = [1000.0]
+        self.usuario = UsuarioSistema.objects.create(
+            username='trabajador', password='secreta', email='t@test.cl',
+            telefono='123', rol='Trabajador'
+        )
+    
+    def test_ventana_deslizante(self):
+        """Test de que los fallos de la ventana anterior pesan según el tiempo transcurrido"""
+        limitador = LimitadorLogin(ventana=60, max_por_ip=100, max_por_usuario=3, reloj=lambda: self.ahora[0])
+        self.ahora[0] = 6030.0
+        for _ in range(3):
+            self.assertIsNone(limitador.bloqueo('10.0.0.1', 'Trabajador'))
+            limitador.registrar_fallo('10.0.0.1', 'Trabajador')
+        self.assertEqual(limitador.bloqueo('10.0.0.2', ' trabajador'), ('usuario', ' trabajador'))
+        
+        # En la ventana siguiente los 3 fallos anteriores pesan 3 * (1 - 40/60) = 1
+        self.ahora[0] = 6100.0
+        self.assertIsNone(limitador.bloqueo('10.0.0.1', 'trabajador'))
+        limitador.registrar_fallo('10.0.0.1', 'trabajador')
+        self.assertIsNone(limitador.bloqueo('10.0.0.1', 'trabajador'))
+        limitador.registrar_fallo('10.0.0.1', 'trabajador')
+        self.assertIsNotNone(limitador.bloqueo('10.0.0.1', 'trabajador'))
+        
+        # Un login correcto limpia los fallos del usuario
+        limitador.registrar_exito('trabajador')
+        self.assertIsNone(limitador.bloqueo('10.0.0.1', 'trabajador'))
+    
+    def test_intentos_bloqueados_sin_consultar_la_base_de_datos(self):
+        """Test de que sobre el límite no se consulta la base de datos y se audita un solo evento"""
+        url = reverse('login')
+        datos = {'username': 'trabajador', 'password': 'incorrecta'}
+        with mock.patch.object(limitador_login, 'reloj', lambda: self.ahora[0]):
+            for _ in range(limitador_login.max_por_usuario):
+                self.assertEqual(self.client.post(url, datos).status_code, 200)
+            self.assertEqual(ControlAcceso.objects.filter(tipo_acceso='login_fallido').count(), 5)
+            
+            self.assertEqual(self.client.post(url, datos).status_code, 429)
+            with self.assertNumQueries(0):
+                for _ in range(10):
+                    response = self.client.post(url, dict(datos, password='secreta'))
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(
+                list(ControlAcceso.objects.filter(tipo_acceso='acceso_denegado').values_list('detalles', flat=True)),
+                ['1 intentos de login bloqueados - usuario: trabajador']
+            )
+            
+            # Pasadas dos ventanas se puede volver a entrar
+            self.ahora[0] += 2 * limitador_login.ventana
+            self.assertEqual(self.client.post(url, dict(datos, password='secreta')).status_code, 302)
+    
+    def test_limite_por_ip(self):
+        """Test de que muchos usuarios distintos desde una IP también se bloquean"""
+        url = reverse('login')
+        with mock.patch.object(limitador_login, 'reloj', lambda: self.ahora[0]):
+            for i in range(limitador_login.max_por_ip):
+                self.client.post(url, {'username': f'usuario{i}', 'password': 'x'})
+            self.assertEqual(self.client.post(url, {'username': 'otro', 'password': 'x'}).status_code, 429)
+            self.assertEqual(
+                self.client.post(url, {'username': 'otro', 'password': 'x'}, REMOTE_ADDR='10.0.0.5').status_code, 200
+            )
+    
+    def test_x_forwarded_for_no_cambia_la_ip(self):
+        """Test de que cambiar X-Forwarded-For en cada intento no reinicia el contador de la IP"""
+        url = reverse('login')
+        with mock.patch.object(limitador_login, 'reloj', lambda: self.ahora[0]):
+            for i in range(limitador_login.max_por_ip):
+                self.client.post(url, {'username': f'usuario{i}', 'password': 'x'}, HTTP_X_FORWARDED_FOR=f'203.0.113.{i}')
+            response = self.client.post(url, {'username': 'otro', 'password': 'x'}, HTTP_X_FORWARDED_FOR='198.51.100.1')
+            self.assertEqual(response.status_code, 429)
+    
+    @override_settings(PROXIES_CONFIABLES=['127.0.0.0/8', '10.0.0.0/8'])
+    def test_ip_detras_de_proxy_confiable(self):
+        """Test de que detrás de un proxy confiable se usa el salto más a la derecha no confiable"""
+        request = RequestFactory().get('/', HTTP_X_FORWARDED_FOR='1.2.3.4, 203.0.113.7, 10.0.0.2')
+        self.assertEqual(get_client_ip(request), '203.0.113.7')
+        request = RequestFactory().get('/', REMOTE_ADDR='198.51.100.9', HTTP_X_FORWARDED_FOR='1.2.3.4')
+        self.assertEqual(get_client_ip(request), '198.51.100.9')
+
+
+class PasswordUsuarioTest(TestCase):
+    """Tests para el hash de contraseñas de Usuario y su migración en el login"""
+    
+    def setUp(self):
+        cache.clear()
+        self.usuario = UsuarioSistema.objects.create(
+            username='trabajador', password='testpass123', email='t@test.cl',
+            telefono='123', rol='Trabajador'
+        )
+    
+    def test_guarda_hash(self):
+        """Test de que las contraseñas nuevas se guardan como hash"""
+        self.usuario.refresh_from_db()
+        self.assertTrue(self.usuario.password.startswith('pbkdf2_sha256$1000$'))
+        self.assertTrue(self.usuario.check_password('testpass123'))
+        self.assertFalse(self.usuario.check_password('otra'))
+    
+    def test_migra_texto_plano_en_el_login(self):
+        """Test de que una fila con la contraseña en texto plano se migra al iniciar sesión"""
+        UsuarioSistema.objects.filter(pk=self.usuario.pk).update(password='legado1')
+        url = reverse('login')
+        self.assertEqual(self.client.post(url, {'username': 'trabajador', 'password': 'legado'}).status_code, 200)
+        self.usuario.refresh_from_db()
+        self.assertEqual(self.usuario.password, 'legado1')
+        
+        self.assertEqual(self.client.post(url, {'username': 'trabajador', 'password': 'legado1'}).status_code, 302)
+        self.usuario.refresh_from_db()
+        self.assertTrue(self.usuario.password_con_hash())
+        self.assertTrue(self.usuario.check_password('legado1'))
+    
+    def test_actualiza_el_costo_en_el_login(self):
+        """Test de que al subir PASSWORD_ITERACIONES el hash se rehace en el siguiente login"""
+        with override_settings(PASSWORD_ITERACIONES=2000):
+            self.assertTrue(self.usuario.check_password('testpass123'))
+        self.usuario.refresh_from_db()
+        self.assertTrue(self.usuario.password.startswith('pbkdf2_sha256$2000$'))
+    
+    def test_cambio_de_password_en_perfil(self):
+        """Test de que el perfil guarda la contraseña nueva como hash"""
+        iniciar_sesion(self.client, self.usuario)
+        self.client.post(reverse('perfil_usuario'), {'password': 'nueva123', 'confirmar_password': 'nueva123'})
+        self.usuario.refresh_from_db()
+        self.assertTrue(self.usuario.check_password('nueva123'))
+        self.assertFalse(self.usuario.check_password('testpass123'))
+    
+    def test_medir_login(self):
+        """Test del comando que mide la latencia de cada configuración"""
+        salida = StringIO()
+        call_command('medir_login', iteraciones=[1000], factores_scrypt=[2 ** 8], repeticiones=3, stdout=salida)
+        self.assertIn('pbkdf2_sha256 1000 iteraciones', salida.getvalue())
+        self.assertIn('scrypt N=256', salida.getvalue())
+
+
 class DashboardViewTest(TestCase):
     """Tests para la vista del dashboard"""
     
@@ -255,3 +426,1459 @@ class ControlAccesoModelTest(TestCase):
         self.assertEqual(acceso.usuario, self.usuario)
         self.assertEqual(acceso.tipo_acceso, 'login_exitoso')
         self.assertIsNotNone(acceso.fecha_acceso)
+
+
+class ProduccionMensualTest(TestCase):
+    """Tests para el resumen mensual de producción"""
+    
+    def setUp(self):
+        self.tipo_a = TipoAlga.objects.create(nombre='Alga A')
+        self.tipo_b = TipoAlga.objects.create(nombre='Alga B')
+        self.registro = RegistroProduccion.objects.create(
+            tipo_alga=self.tipo_a,
+            cantidad_cosechada=Decimal('100.00'),
+            sector='Sector Norte'
+        )
+        RegistroProduccion.objects.create(
+            tipo_alga=self.tipo_b,
+            cantidad_cosechada=Decimal('50.00'),
+            sector='Sector Sur'
+        )
+        self.mes = inicio_de_mes(self.registro.fecha_registro)
+    
+    def test_resumen_al_crear(self):
+        """Test de acumulación al crear registros"""
+        resumen = ProduccionMensual.objects.get(mes=self.mes)
+        self.assertEqual(resumen.total_cosechado, Decimal('150.00'))
+        self.assertEqual(resumen.total_registros, 2)
+        por_tipo = ProduccionMensualTipo.objects.get(mes=self.mes, tipo_alga=self.tipo_a)
+        self.assertEqual(por_tipo.total_cosechado, Decimal('100.00'))
+    
+    def test_resumen_al_editar_y_eliminar(self):
+        """Test de actualización al editar y eliminar un registro"""
+        self.registro.cantidad_cosechada = Decimal('30.00')
+        self.registro.tipo_alga = self.tipo_b
+        self.registro.save()
+        resumen = ProduccionMensual.objects.get(mes=self.mes)
+        self.assertEqual(resumen.total_cosechado, Decimal('80.00'))
+        self.assertEqual(resumen.total_registros, 2)
+        self.assertEqual(
+            ProduccionMensualTipo.objects.get(mes=self.mes, tipo_alga=self.tipo_a).total_registros, 0
+        )
+        self.assertEqual(
+            ProduccionMensualTipo.objects.get(mes=self.mes, tipo_alga=self.tipo_b).total_cosechado,
+            Decimal('80.00')
+        )
+        
+        self.registro.delete()
+        resumen.refresh_from_db()
+        self.assertEqual(resumen.total_cosechado, Decimal('50.00'))
+        self.assertEqual(resumen.total_registros, 1)
+    
+    def test_reconstruir_resumen(self):
+        """Test del comando que reconstruye el resumen desde cero"""
+        ProduccionMensual.objects.all().update(total_cosechado=Decimal('0.00'), total_registros=0)
+        ProduccionMensualTipo.objects.all().delete()
+        call_command('reconstruir_produccion_mensual', stdout=StringIO())
+        resumen = ProduccionMensual.objects.get(mes=self.mes)
+        self.assertEqual(resumen.total_cosechado, Decimal('150.00'))
+        self.assertEqual(ProduccionMensualTipo.objects.filter(mes=self.mes).count(), 2)
+    
+    def test_capacidad_lee_del_resumen(self):
+        """Test de que la capacidad usa una sola consulta para todas sus propiedades"""
+        capacidad = CapacidadProductiva.objects.create(
+            mes=self.mes, capacidad_mensual_maxima=Decimal('300.00')
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(capacidad.volumen_producido, Decimal('150.00'))
+            self.assertEqual(capacidad.disponibilidad_mensual, Decimal('150.00'))
+            self.assertEqual(capacidad.porcentaje_utilizado, Decimal('50.00'))
+            self.assertEqual(capacidad.porcentaje_disponible, Decimal('50.00'))
+        
+        with self.assertNumQueries(1):
+            capacidades = list(CapacidadProductiva.objects.con_volumen_producido())
+            self.assertEqual(capacidades[0].porcentaje_utilizado, Decimal('50.00'))
+    
+    def test_capacidad_con_mes_a_mitad_de_mes(self):
+        """Test de que una capacidad guardada con otro día del mes encuentra su resumen"""
+        CapacidadProductiva.objects.create(
+            mes=self.mes.replace(day=15), capacidad_mensual_maxima=Decimal('300.00')
+        )
+        capacidad = CapacidadProductiva.objects.con_volumen_producido().get()
+        self.assertEqual(capacidad.volumen_producido, Decimal('150.00'))
+
+
+class EstadisticasDashboardTest(TestCase):
+    """Tests para el cálculo de estadísticas del dashboard"""
+    
+    def setUp(self):
+        self.tipo_alga = TipoAlga.objects.create(nombre='Alga Test')
+        self.ahora = timezone.now()
+        for dias, cantidad in [(1, '10.00'), (9, '20.00'), (16, '30.00'), (40, '40.00')]:
+            registro = RegistroProduccion.objects.create(
+                tipo_alga=self.tipo_alga,
+                cantidad_cosechada=Decimal(cantidad),
+                sector='Sector Norte'
+            )
+            RegistroProduccion.objects.filter(pk=registro.pk).update(
+                fecha_registro=self.ahora - timedelta(days=dias)
+            )
+    
+    def test_series_semanales(self):
+        """Test de los totales por semana y de la última semana"""
+        estadisticas = calcular_estadisticas_dashboard(semanas=4, ahora=self.ahora)
+        self.assertEqual(estadisticas['produccion_por_semana'], [0.0, 30.0, 20.0, 10.0])
+        self.assertEqual(len(estadisticas['etiquetas_semanas']), 4)
+        self.assertEqual(estadisticas['produccion_semanal'], Decimal('10.00'))
+    
+    def test_cantidad_fija_de_consultas(self):
+        """Test de que se usa una sola consulta sin importar las semanas graficadas"""
+        with self.assertNumQueries(1):
+            calcular_estadisticas_dashboard(semanas=4, ahora=self.ahora)
+        with self.assertNumQueries(1):
+            estadisticas = calcular_estadisticas_dashboard(semanas=12, ahora=self.ahora)
+        self.assertEqual(len(estadisticas['produccion_por_semana']), 12)
+        self.assertEqual(sum(estadisticas['produccion_por_semana']), 100.0)
+
+
+class ReportesViewTest(TestCase):
+    """Tests para la agrupación semanal de la vista de reportes"""
+    
+    def setUp(self):
+        self.usuario = UsuarioSistema.objects.create(
+            username='trabajador', password='testpass123', email='t@test.cl',
+            telefono='123', rol='Trabajador'
+        )
+        iniciar_sesion(self.client, self.usuario)
+        tipo_alga = TipoAlga.objects.create(nombre='Alga Test')
+        hoy = timezone.localtime().replace(hour=12, minute=0, second=0, microsecond=0)
+        self.lunes = (hoy - timedelta(days=hoy.weekday())).date()
+        for dias, cantidad in [(0, '10.00'), (0, '5.00'), (14, '20.00'), (300, '40.00')]:
+            registro = RegistroProduccion.objects.create(
+                tipo_alga=tipo_alga,
+                cantidad_cosechada=Decimal(cantidad),
+                sector='Sector Norte'
+            )
+            RegistroProduccion.objects.filter(pk=registro.pk).update(
+                fecha_registro=hoy - timedelta(days=hoy.weekday() + dias)
+            )
+    
+    def test_agrupacion_por_semana(self):
+        """Test de totales por semana (lunes a domingo) en la ventana por defecto"""
+        response = self.client.get(reverse('reportes'))
+        self.assertEqual(response.status_code, 200)
+        semanas = response.context['reporte_semanas'].object_list
+        self.assertEqual(len(semanas), 2)
+        self.assertEqual(semanas[0]['inicio'], self.lunes)
+        self.assertEqual(semanas[0]['fin'], self.lunes + timedelta(days=6))
+        self.assertEqual(semanas[0]['total_cosechado'], Decimal('15.00'))
+        self.assertEqual(semanas[0]['registros_count'], 2)
+    
+    def test_ventana_configurable(self):
+        """Test de ventana de un año"""
+        response = self.client.get(reverse('reportes'), {'semanas': 52})
+        self.assertEqual(response.context['semanas'], 52)
+        self.assertEqual(response.context['reporte_semanas'].paginator.count, 3)
+    
+    @override_settings(BD_ZONAS_HORARIAS=False)
+    def test_registro_futuro_con_rangos(self):
+        """Test de que un registro con fecha futura no rompe la agrupación con CASE de rangos"""
+        RegistroProduccion.objects.create(
+            tipo_alga=TipoAlga.objects.get(), cantidad_cosechada=Decimal('7.00'),
+            sector='Sector Norte', fecha_registro=timezone.now() + timedelta(days=10)
+        )
+        response = self.client.get(reverse('reportes'))
+        self.assertEqual(response.status_code, 200)
+        semanas = response.context['reporte_semanas'].object_list
+        self.assertEqual([semana['inicio'] for semana in semanas], [self.lunes, self.lunes - timedelta(weeks=2)])
+        self.assertEqual(semanas[0]['total_cosechado'], Decimal('15.00'))
+
+
+class UsuarioSesionMiddlewareTest(TestCase):
+    """Tests para la resolución del usuario de la sesión una vez por petición"""
+    
+    def setUp(self):
+        cache.clear()
+        self.usuario = UsuarioSistema.objects.create(
+            username='trabajador', password='testpass123', email='t@test.cl',
+            telefono='123', rol='Trabajador'
+        )
+        iniciar_sesion(self.client, self.usuario)
+    
+    def consultas_usuario(self, url):
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.get(url)
+        tabla = UsuarioSistema._meta.db_table
+        return response, [q for q in contexto.captured_queries if f'FROM "{tabla}"' in q['sql']]
+    
+    def test_usuario_una_sola_vez(self):
+        """Test de que decorador y vista comparten la misma consulta del usuario"""
+        response, consultas = self.consultas_usuario(reverse('registro_produccion'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(consultas), 1)
+    
+    def test_rol_en_cache(self):
+        """Test de que el rol en caché evita consultar al denegar acceso"""
+        self.client.get(reverse('dashboard'))
+        self.assertEqual(cache.get(clave_rol_cache(self.usuario.id)), 'Trabajador')
+        
+        response, consultas = self.consultas_usuario(reverse('capacidad_productiva'))
+        self.assertEqual(response.status_code, 302)
+        # Solo se carga el usuario para registrar el acceso denegado
+        self.assertEqual(len(consultas), 1)
+        
+        self.usuario.rol = 'Administrador'
+        self.usuario.save()
+        self.assertIsNone(cache.get(clave_rol_cache(self.usuario.id)))
+        response = self.client.get(reverse('capacidad_productiva'))
+        self.assertEqual(response.status_code, 200)
+    
+    def test_usuario_eliminado(self):
+        """Test de sesión inválida cuando el usuario ya no existe"""
+        self.client.get(reverse('dashboard'))
+        self.usuario.delete()
+        response = self.client.get(reverse('dashboard'))
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+    
+    def test_usuario_eliminado_sin_invalidar_cache(self):
+        """Test de un usuario eliminado en otro proceso: el rol sigue en la caché local"""
+        self.client.get(reverse('dashboard'))
+        self.assertEqual(cache.get(clave_rol_cache(self.usuario.id)), 'Trabajador')
+        # Sin la señal post_delete, como si la eliminación ocurriera en otro proceso
+        UsuarioSistema.objects.filter(pk=self.usuario.pk)._raw_delete(UsuarioSistema.objects.db)
+        
+        response = self.client.get(reverse('registro_produccion'))
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+        self.assertNotIn('user_logged', self.client.session)
+        self.assertIsNone(cache.get(clave_rol_cache(self.usuario.id)))
+
+
+class RenovarSesionTest(TestCase):
+    """Tests para la renovación de la sesión por umbral"""
+    
+    def setUp(self):
+        cache.clear()
+        self.usuario = UsuarioSistema.objects.create(
+            username='trabajador', password='testpass123', email='t@test.cl',
+            telefono='123', rol='Trabajador'
+        )
+        self.client.post(reverse('login'), {'username': 'trabajador', 'password': 'testpass123'})
+    
+    def escrituras_sesion(self):
+        """Escrituras a la tabla de sesiones de una petición al dashboard"""
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('dashboard'))
+        return [
+            consulta['sql'] for consulta in consultas.captured_queries
+            if 'django_session' in consulta['sql'] and not consulta['sql'].startswith('SELECT')
+        ]
+    
+    def test_no_escribe_la_sesion_en_cada_peticion(self):
+        """Test de que las páginas vistas dentro del umbral no guardan la sesión"""
+        for _ in range(3):
+            self.assertEqual(self.escrituras_sesion(), [])
+    
+    def test_renueva_pasado_el_umbral(self):
+        """Test de que una sesión renovada hace más de SESSION_RENOVAR_CADA se guarda una vez"""
+        sesion = self.client.session
+        sesion[CLAVE_SESION_RENOVADA] -= settings.SESSION_RENOVAR_CADA
+        sesion.save()
+        self.assertEqual(len(self.escrituras_sesion()), 1)
+        self.assertEqual(self.escrituras_sesion(), [])
+    
+    def test_medir_sesiones(self):
+        """Test del comando que compara las escrituras de sesión"""
+        salida = StringIO()
+        call_command('medir_sesiones', peticiones=5, stdout=salida)
+        lineas = salida.getvalue().splitlines()
+        self.assertIn('Anterior: db + guardar en cada petición', lineas[2])
+        self.assertEqual(lineas[2].split()[-2:], ['1000', '1000'])
+        self.assertEqual(lineas[4].split()[-3:], ['0', '0', '0'])
+        self.assertFalse(UsuarioSistema.objects.filter(username='_medir_sesiones').exists())
+
+
+class AuditoriaDiferidaTest(TestCase):
+    """Tests para el registro de accesos en lotes"""
+    
+    @mock.patch.object(AuditoriaDiferida, '_iniciar_hilo')
+    def test_eventos_en_un_solo_insert(self, iniciar_hilo):
+        """Test de que una ráfaga de eventos se guarda con un solo INSERT"""
+        auditoria = AuditoriaDiferida(tamano_lote=100, intervalo=60)
+        for _ in range(20):
+            auditoria.registrar(ip_origen='10.0.0.1', tipo_acceso='acceso_denegado')
+        self.assertEqual(ControlAcceso.objects.count(), 0)
+        
+        with self.assertNumQueries(1):
+            self.assertEqual(auditoria.vaciar(), 20)
+        self.assertEqual(ControlAcceso.objects.count(), 20)
+        self.assertEqual(auditoria.vaciar(), 0)
+    
+    @mock.patch.object(AuditoriaDiferida, '_iniciar_hilo')
+    def test_conserva_fecha_del_evento(self, iniciar_hilo):
+        """Test de que la fecha guardada es la del evento y no la del lote"""
+        auditoria = AuditoriaDiferida()
+        fecha = timezone.now() - timedelta(minutes=5)
+        auditoria.registrar(ip_origen='10.0.0.1', tipo_acceso='logout', fecha_acceso=fecha)
+        auditoria.vaciar()
+        self.assertEqual(ControlAcceso.objects.get().fecha_acceso, fecha)
+
+
+class ArchivarAuditoriaTest(TestCase):
+    """Tests para la retención y el archivo de accesos"""
+    
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        self.usuario = UsuarioSistema.objects.create(
+            username='trabajador', password='testpass123', email='t@test.cl',
+            telefono='123', rol='Trabajador'
+        )
+        ahora = timezone.now()
+        self.antiguos = [
+            ControlAcceso.objects.create(
+                usuario=self.usuario, ip_origen='10.0.0.1', tipo_acceso='login_exitoso',
+                fecha_acceso=ahora - timedelta(days=dias)
+            )
+            for dias in (400, 401, 430)
+        ]
+        self.reciente = ControlAcceso.objects.create(ip_origen='10.0.0.2', tipo_acceso='login_fallido')
+    
+    def leer_archivos(self):
+        """Ids archivados por mes (AAAA-MM)"""
+        ids = {}
+        for acceso in self.antiguos:
+            mes = timezone.localtime(acceso.fecha_acceso).strftime('%Y-%m')
+            with gzip.open(ruta_archivo_mes(self.directorio, mes), 'rt', encoding='utf-8') as archivo:
+                ids[mes] = [json.loads(linea)['id'] for linea in archivo]
+        return ids
+    
+    def test_archiva_por_mes_y_elimina_en_lotes(self):
+        """Test de que los accesos antiguos quedan en su archivo mensual y se eliminan de la tabla"""
+        salida = StringIO()
+        # Un DELETE por lote de 2
+        with CaptureQueriesContext(connection) as consultas:
+            call_command('archivar_auditoria', dias=180, directorio=self.directorio, lote=2, stdout=salida)
+        self.assertEqual(sum(consulta['sql'].startswith('DELETE') for consulta in consultas.captured_queries), 2)
+        self.assertEqual(list(ControlAcceso.objects.values_list('id', flat=True)), [self.reciente.id])
+        
+        archivados = self.leer_archivos()
+        self.assertEqual(sorted(sum(archivados.values(), [])), sorted(acceso.id for acceso in self.antiguos))
+        mes = timezone.localtime(self.antiguos[0].fecha_acceso).strftime('%Y-%m')
+        with gzip.open(ruta_archivo_mes(self.directorio, mes), 'rt', encoding='utf-8') as archivo:
+            fila = json.loads(archivo.readline())
+        self.assertEqual(fila['usuario'], 'trabajador')
+        self.assertEqual(fila['tipo_acceso'], 'login_exitoso')
+        self.assertIn('3 accesos anteriores', salida.getvalue())
+        
+        # Una segunda ejecución no archiva nada ni duplica filas
+        call_command('archivar_auditoria', dias=180, directorio=self.directorio, stdout=StringIO())
+        self.assertEqual(self.leer_archivos(), archivados)
+    
+    def test_simular_no_modifica_nada(self):
+        """Test de que --simular solo informa la cantidad"""
+        salida = StringIO()
+        call_command('archivar_auditoria', dias=180, directorio=self.directorio, simular=True, stdout=salida)
+        self.assertIn('Se archivarían 3 accesos', salida.getvalue())
+        self.assertEqual(ControlAcceso.objects.count(), 4)
+        self.assertEqual(os.listdir(self.directorio), [])
+
+
+class TrabajoReporteTest(TestCase):
+    """Tests para la generación de reportes en segundo plano"""
+    
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.admin = UsuarioSistema.objects.create(
+            username='admin', password='testpass123', email='a@test.cl',
+            telefono='123', rol='Administrador'
+        )
+        iniciar_sesion(self.client, self.admin)
+        tipo_alga = TipoAlga.objects.create(nombre='Alga Test')
+        RegistroProduccion.objects.create(
+            tipo_alga=tipo_alga, cantidad_cosechada=Decimal('12.50'), sector='Sector Norte'
+        )
+        self.configuracion = ConfiguracionReporte.objects.create(
+            empresa='Cliente', pais='Chile', email='c@test.cl', formato_preferido='excel'
+        )
+    
+    def test_encolar_procesar_y_descargar(self):
+        """Test de que la vista encola el trabajo y el procesador genera el archivo"""
+        with override_settings(REPORTES_EN_SEGUNDO_PLANO=True, MEDIA_ROOT=self.media_root):
+            response = self.client.get(
+                reverse('generar_reporte_personalizado', args=[self.configuracion.id])
+            )
+            trabajo = TrabajoReporte.objects.get()
+            self.assertRedirects(
+                response, reverse('estado_trabajo_reporte', args=[trabajo.id]),
+                fetch_redirect_response=False
+            )
+            self.assertEqual(trabajo.estado, 'pendiente')
+            
+            self.assertEqual(procesar_pendientes(), 1)
+            trabajo.refresh_from_db()
+            self.assertEqual(trabajo.estado, 'completado')
+            self.assertTrue(trabajo.nombre_archivo.endswith('.xlsx'))
+            
+            estado = self.client.get(
+                reverse('estado_trabajo_reporte', args=[trabajo.id]), {'formato': 'json'}
+            ).json()
+            self.assertTrue(estado['terminado'])
+            
+            response = self.client.get(reverse('descargar_trabajo_reporte', args=[trabajo.id]))
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(b''.join(response.streaming_content).startswith(b'PK'))
+    
+    def test_trabajo_no_se_toma_dos_veces(self):
+        """Test de que un trabajo ya reservado no vuelve a procesarse"""
+        TrabajoReporte.objects.create(
+            tipo='personalizado', configuracion=self.configuracion,
+            fecha_desde=timezone.now() - timedelta(days=30), fecha_hasta=timezone.now(),
+            estado='en_proceso', fecha_inicio=timezone.now()
+        )
+        self.assertEqual(procesar_pendientes(), 0)
+    
+    @override_settings(REPORTES_TIMEOUT_TRABAJO=600)
+    def test_trabajo_vencido_vuelve_a_la_cola(self):
+        """Test de que un trabajo en proceso por más del timeout se vuelve a procesar"""
+        trabajo = TrabajoReporte.objects.create(
+            tipo='personalizado', configuracion=self.configuracion,
+            fecha_desde=timezone.now() - timedelta(days=30), fecha_hasta=timezone.now(),
+            estado='en_proceso', fecha_inicio=timezone.now() - timedelta(seconds=601)
+        )
+        with override_settings(MEDIA_ROOT=self.media_root), self.assertLogs('gestion_algas.trabajos', 'WARNING'):
+            self.assertEqual(procesar_pendientes(), 1)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'completado')
+    
+    def test_trabajo_de_otro_usuario(self):
+        """Test de que solo el solicitante (o un admin) ve y descarga el trabajo"""
+        trabajo = TrabajoReporte.objects.create(
+            tipo='semanal', fecha_desde=timezone.now() - timedelta(days=7), fecha_hasta=timezone.now(),
+            usuario=self.admin, estado='completado'
+        )
+        trabajador = UsuarioSistema.objects.create(
+            username='trabajador', password='testpass123', email='t@test.cl',
+            telefono='123', rol='Trabajador'
+        )
+        iniciar_sesion(self.client, trabajador)
+        self.assertEqual(self.client.get(reverse('estado_trabajo_reporte', args=[trabajo.id])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('descargar_trabajo_reporte', args=[trabajo.id])).status_code, 404)
+        
+        TrabajoReporte.objects.filter(pk=trabajo.pk).update(usuario=trabajador)
+        self.assertEqual(self.client.get(reverse('estado_trabajo_reporte', args=[trabajo.id])).status_code, 200)
+
+
+class CacheReportesTest(TestCase):
+    """Tests para la caché en disco de reportes de rangos cerrados"""
+    
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        ajustes = override_settings(REPORTES_CACHE_DIR=self.directorio, REPORTES_CACHE_MAX_BYTES=10 ** 6)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        
+        admin = UsuarioSistema.objects.create(
+            username='admin', password='testpass123', email='a@test.cl',
+            telefono='123', rol='Administrador'
+        )
+        iniciar_sesion(self.client, admin)
+        self.tipo_alga = TipoAlga.objects.create(nombre='Alga Test')
+        self.ayer = timezone.localtime() - timedelta(days=1)
+        self.crear_registro('10.00')
+        self.configuracion = ConfiguracionReporte.objects.create(
+            empresa='Cliente', pais='Chile', email='c@test.cl', formato_preferido='excel',
+            usar_fecha_personalizada=True,
+            fecha_desde=(self.ayer - timedelta(days=7)).date(),
+            fecha_hasta=self.ayer.date()
+        )
+        self.url = reverse('generar_reporte_personalizado', args=[self.configuracion.id])
+    
+    def crear_registro(self, cantidad):
+        registro = RegistroProduccion.objects.create(
+            tipo_alga=self.tipo_alga, cantidad_cosechada=Decimal(cantidad), sector='Sector Norte'
+        )
+        RegistroProduccion.objects.filter(pk=registro.pk).update(fecha_registro=self.ayer)
+    
+    def descargar(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content) if response.streaming else response.content
+    
+    def test_descarga_repetida_desde_cache(self):
+        """Test de que la segunda descarga no vuelve a generar el archivo"""
+        primero = self.descargar()
+        with mock.patch('gestion_algas.views.exportar_reporte_personalizado') as exportar:
+            segundo = self.descargar()
+        exportar.assert_not_called()
+        self.assertEqual(primero, segundo)
+    
+    def test_invalidacion_por_cambio_de_datos(self):
+        """Test de que un registro nuevo en el rango cambia la clave"""
+        desde, hasta = periodo_reporte(self.configuracion)
+        clave = cache_reportes.clave_reporte(ConsultaReporte(self.configuracion, desde, hasta))
+        self.crear_registro('5.00')
+        self.assertNotEqual(clave, cache_reportes.clave_reporte(ConsultaReporte(self.configuracion, desde, hasta)))
+    
+    def test_invalidacion_por_renombrar_tipo(self):
+        """Test de que renombrar un tipo de alga cambia la clave aunque los registros sean los mismos"""
+        desde, hasta = periodo_reporte(self.configuracion)
+        clave = cache_reportes.clave_reporte(ConsultaReporte(self.configuracion, desde, hasta))
+        self.tipo_alga.nombre = 'Alga Renombrada'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tipo_alga.save()
+        self.assertNotEqual(clave, cache_reportes.clave_reporte(ConsultaReporte(self.configuracion, desde, hasta)))
+    
+    def test_archivo_eliminado_al_servir(self):
+        """Test de que un archivo eliminado por una limpieza concurrente después de abrirlo se sirve igual"""
+        primero = self.descargar()
+        
+        def eliminar(ruta, *args):
+            os.remove(ruta)
+            raise FileNotFoundError(ruta)
+        
+        with mock.patch('gestion_algas.cache_reportes.os.utime', side_effect=eliminar), \
+                mock.patch('gestion_algas.views.exportar_reporte_personalizado') as exportar:
+            segundo = self.descargar()
+        exportar.assert_not_called()
+        self.assertEqual(primero, segundo)
+    
+    def test_rango_abierto_no_se_guarda(self):
+        """Test de que los reportes que incluyen hoy no se cachean"""
+        self.configuracion.fecha_hasta = timezone.localdate()
+        self.configuracion.save()
+        self.descargar()
+        self.assertEqual(os.listdir(self.directorio), [])
+    
+    def test_limite_de_tamano(self):
+        """Test de la eliminación de los archivos usados hace más tiempo"""
+        cache_reportes.guardar('a' * 64, 'pdf', b'x' * 600)
+        os.utime(cache_reportes.ruta_archivo('a' * 64, 'pdf'), (0, 0))
+        cache_reportes.guardar('b' * 64, 'pdf', b'x' * 600)
+        cache_reportes.limpiar(1000)
+        self.assertIsNone(cache_reportes.abrir('a' * 64, 'pdf'))
+        with cache_reportes.abrir('b' * 64, 'pdf') as archivo:
+            self.assertEqual(len(archivo.read()), 600)
+
+
+class ExportarRegistrosTest(TestCase):
+    """Tests para la exportación de registros en streaming"""
+    
+    def setUp(self):
+        admin = UsuarioSistema.objects.create(
+            username='admin', password='testpass123', email='a@test.cl',
+            telefono='123', rol='Administrador'
+        )
+        iniciar_sesion(self.client, admin)
+        self.tipo_a = TipoAlga.objects.create(nombre='Alga A')
+        tipo_b = TipoAlga.objects.create(nombre='Alga B')
+        for i in range(5):
+            RegistroProduccion.objects.create(
+                tipo_alga=self.tipo_a, cantidad_cosechada=Decimal('1.50'),
+                sector='Sector Norte', observaciones='Línea, con coma'
+            )
+        RegistroProduccion.objects.create(
+            tipo_alga=tipo_b, cantidad_cosechada=Decimal('3.00'), sector='Sector Norte'
+        )
+        self.configuracion = ConfiguracionReporte.objects.create(
+            empresa='Cliente', pais='Chile', email='c@test.cl'
+        )
+        self.configuracion.tipos_alga.add(self.tipo_a)
+    
+    def test_exportar_csv(self):
+        """Test de exportación CSV con los filtros de la configuración"""
+        response = self.client.get(
+            reverse('exportar_registros', args=[self.configuracion.id]), {'formato': 'csv'}
+        )
+        self.assertTrue(response.streaming)
+        lineas = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lineas), 6)
+        self.assertTrue(lineas[0].startswith('id,fecha_registro'))
+        self.assertIn('"Línea, con coma"', lineas[1])
+    
+    def test_exportar_ndjson_por_lotes(self):
+        """Test de exportación NDJSON leyendo de a 2 registros por consulta"""
+        salida = StringIO()
+        # Configuración, tipos, sectores, límites de ids y tres lotes
+        with self.assertNumQueries(7):
+            call_command(
+                'exportar_registros', str(self.configuracion.id),
+                formato='ndjson', lote=2, stdout=salida
+            )
+        filas = [json.loads(linea) for linea in salida.getvalue().splitlines()]
+        self.assertEqual(len(filas), 5)
+        self.assertEqual(filas[0]['nombre_tipo_alga'], 'Alga A')
+        self.assertEqual(filas[0]['cantidad_cosechada'], '1.50')
+    
+    def test_excel_con_hoja_de_registros(self):
+        """Test del Excel en modo write_only con la hoja de detalle de registros"""
+        from openpyxl import load_workbook
+        self.configuracion.incluir_hoja_registros = True
+        self.configuracion.save()
+        fecha_desde, fecha_hasta = periodo_reporte(self.configuracion)
+        contexto = contexto_reporte_personalizado(self.configuracion, fecha_desde, fecha_hasta)
+        
+        libro = load_workbook(BytesIO(generar_excel_personalizado(contexto, tamano_lote=2)))
+        self.assertEqual(libro.sheetnames, ['Reporte de Producción', 'Registros'])
+        self.assertEqual(libro['Reporte de Producción']['A1'].value, 'Reporte de Producción - Cliente')
+        
+        filas = list(libro['Registros'].iter_rows(values_only=True))
+        self.assertEqual(len(filas), 6)
+        self.assertEqual(filas[0][0], 'ID')
+        self.assertEqual(filas[1][3], 'Alga A')
+        self.assertEqual(filas[1][5], 1.5)
+        self.assertEqual(libro['Registros']['F2'].number_format, '#,##0.00')
+
+
+class IngestaRegistrosTest(TestCase):
+    """Tests para la carga masiva de registros (API y comando CSV)"""
+    
+    def setUp(self):
+        self.admin = UsuarioSistema.objects.create(
+            username='admin', password='testpass123', email='a@test.cl',
+            telefono='123', rol='Administrador'
+        )
+        self.trabajador = UsuarioSistema.objects.create(
+            username='trabajador', password='testpass123', email='t@test.cl',
+            telefono='456', rol='Trabajador'
+        )
+        self.tipo = TipoAlga.objects.create(nombre='Pelillo')
+        self.url = reverse('api_ingesta_registros')
+    
+    def enviar(self, filas, **params):
+        url = self.url + ('?parcial=1' if params.get('parcial') else '')
+        return self.client.post(url, data=json.dumps(filas), content_type='application/json')
+    
+    def test_api_crea_registros_y_resumen(self):
+        """Test de ingesta por API con fecha histórica y resumen mensual"""
+        iniciar_sesion(self.client, self.trabajador)
+        fecha = timezone.now() - timedelta(days=400)
+        filas = [
+            {'tipo_alga': 'pelillo', 'cantidad_cosechada': '10.50', 'sector': 'Norte'},
+            {'tipo_alga': 'Pelillo', 'cantidad_cosechada': '4.50', 'sector': 'Sur',
+             'fecha_registro': fecha.isoformat()},
+        ]
+        response = self.enviar(filas)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'creados': 2, 'errores': []})
+        
+        historico = RegistroProduccion.objects.get(sector='Sur')
+        self.assertEqual(historico.nombre_tipo_alga, 'Pelillo')
+        self.assertEqual(historico.nombre_usuario, 'trabajador')
+        self.assertEqual(historico.fecha_registro, fecha)
+        resumen = ProduccionMensual.objects.get(mes=inicio_de_mes(fecha))
+        self.assertEqual(resumen.total_cosechado, Decimal('4.50'))
+        self.assertEqual(resumen.total_registros, 1)
+    
+    def test_api_errores_por_fila(self):
+        """Test de errores por fila: sin ?parcial=1 no se guarda nada"""
+        iniciar_sesion(self.client, self.trabajador)
+        filas = [
+            {'tipo_alga': 'Pelillo', 'cantidad_cosechada': '1.00', 'sector': 'Norte'},
+            {'tipo_alga': 'Inexistente', 'cantidad_cosechada': '1.00', 'sector': 'Norte'},
+            {'tipo_alga': 'Pelillo', 'cantidad_cosechada': '0', 'sector': 'Norte'},
+            {'tipo_alga': 'Pelillo', 'cantidad_cosechada': '1.00', 'sector': 'Norte', 'usuario': 'admin'},
+        ]
+        response = self.enviar(filas)
+        self.assertEqual(response.status_code, 400)
+        datos = response.json()
+        self.assertEqual(datos['creados'], 0)
+        self.assertEqual([error['fila'] for error in datos['errores']], [2, 3, 4])
+        self.assertIn('tipo_alga', datos['errores'][0]['errores'])
+        self.assertIn('cantidad_cosechada', datos['errores'][1]['errores'])
+        self.assertIn('usuario', datos['errores'][2]['errores'])
+        self.assertFalse(RegistroProduccion.objects.exists())
+        self.assertFalse(ProduccionMensual.objects.exists())
+        
+        response = self.enviar(filas, parcial=True)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['creados'], 1)
+        self.assertEqual(RegistroProduccion.objects.count(), 1)
+    
+    def test_fecha_futura_es_error_de_fila(self):
+        """Test de que una fila con fecha de registro futura se informa como error"""
+        iniciar_sesion(self.client, self.trabajador)
+        futura = (timezone.now() + timedelta(days=2)).isoformat()
+        filas = [
+            {'tipo_alga': 'Pelillo', 'cantidad_cosechada': '1.00', 'sector': 'Norte'},
+            {'tipo_alga': 'Pelillo', 'cantidad_cosechada': '1.00', 'sector': 'Norte', 'fecha_registro': futura},
+        ]
+        response = self.enviar(filas)
+        self.assertEqual(response.status_code, 400)
+        errores = response.json()['errores']
+        self.assertEqual([error['fila'] for error in errores], [2])
+        self.assertIn('fecha_registro', errores[0]['errores'])
+        self.assertFalse(RegistroProduccion.objects.exists())
+        
+        form = RegistroIngestaForm(data=filas[1])
+        self.assertFalse(form.is_valid())
+        self.assertIn('fecha_registro', form.errors)
+    
+    def test_comando_importar_csv(self):
+        """Test de importación CSV con consultas constantes por lote"""
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        ruta = os.path.join(directorio, 'registros.csv')
+        with open(ruta, 'w', encoding='utf-8', newline='') as archivo:
+            archivo.write('nombre_tipo_alga,cantidad_cosechada,sector,usuario\n')
+            for i in range(40):
+                archivo.write(f"Pelillo,2.00,Sector {i % 3},{'admin' if i % 2 else ''}\n")
+        
+        salida = StringIO()
+        with CaptureQueriesContext(connection) as consultas:
+            call_command('importar_registros', ruta, usuario='trabajador', lote=20, stdout=salida)
+        self.assertIn('40 registros importados', salida.getvalue())
+        # Usuario, tipos, y por lote: usuarios, sectores (y su creación) + insert; luego el resumen
+        self.assertLess(len(consultas), 24)
+        self.assertEqual(
+            list(Sector.objects.values_list('nombre', flat=True)), ['Sector 0', 'Sector 1', 'Sector 2']
+        )
+        
+        self.assertEqual(RegistroProduccion.objects.filter(usuario=self.admin).count(), 20)
+        self.assertEqual(RegistroProduccion.objects.filter(nombre_usuario='trabajador').count(), 20)
+        resumen = ProduccionMensual.objects.get()
+        self.assertEqual(resumen.total_cosechado, Decimal('80.00'))
+        self.assertEqual(resumen.total_registros, 40)
+        self.tipo.refresh_from_db()
+        self.assertEqual(self.tipo.total_cosechado, Decimal('80.00'))
+        self.assertEqual(self.tipo.total_registros, 40)
+
+
+class TiposAlgaViewTest(TestCase):
+    """Tests para el catálogo de tipos de alga"""
+    
+    def setUp(self):
+        cache.clear()
+        admin = UsuarioSistema.objects.create(
+            username='admin', password='testpass123', email='a@test.cl',
+            telefono='123', rol='Administrador'
+        )
+        iniciar_sesion(self.client, admin)
+    
+    def crear_tipos(self, cantidad, inicio=0):
+        for i in range(inicio, inicio + cantidad):
+            tipo = TipoAlga.objects.create(nombre=f'Alga {i:02d}', activo=i % 2 == 0)
+            for _ in range(2):
+                RegistroProduccion.objects.create(
+                    tipo_alga=tipo, cantidad_cosechada=Decimal('2.50'), sector='Norte'
+                )
+    
+    def test_consultas_constantes(self):
+        """Test de que la cantidad de consultas no crece con el catálogo"""
+        self.crear_tipos(2)
+        # La primera petición deja el rol de la sesión en caché
+        self.client.get(reverse('tipos_alga'))
+        with CaptureQueriesContext(connection) as pocos:
+            self.client.get(reverse('tipos_alga'))
+        
+        self.crear_tipos(10, inicio=2)
+        with self.assertNumQueries(len(pocos)):
+            response = self.client.get(reverse('tipos_alga'))
+        
+        self.assertEqual(response.context['total_registros'], 24)
+        self.assertEqual(response.context['tipos_activos'], 6)
+        primero = response.context['tipos_alga'][0]
+        self.assertEqual(primero.total_registros, 2)
+        self.assertEqual(primero.total_cosechado, Decimal('5.00'))
+        self.assertIsNotNone(primero.ultima_cosecha)
+
+    def test_eliminar_tipo_consultas_constantes(self):
+        """Test de que eliminar un tipo no guarda registro por registro"""
+        self.crear_tipos(2)
+        self.client.get(reverse('tipos_alga'))
+        url = reverse('eliminar_tipo_alga', args=[TipoAlga.objects.get(nombre='Alga 00').id])
+        with CaptureQueriesContext(connection) as pocos:
+            self.client.post(url)
+
+        tipo = TipoAlga.objects.get(nombre='Alga 01')
+        for _ in range(10):
+            RegistroProduccion.objects.create(
+                tipo_alga=tipo, cantidad_cosechada=Decimal('1.00'), sector='Norte'
+            )
+        RegistroProduccion.objects.filter(tipo_alga=tipo).update(nombre_tipo_alga='')
+        with self.assertNumQueries(len(pocos)):
+            self.client.post(reverse('eliminar_tipo_alga', args=[tipo.id]))
+
+        self.assertFalse(TipoAlga.objects.exists())
+        self.assertFalse(ProduccionMensualTipo.objects.exists())
+        self.assertEqual(
+            set(RegistroProduccion.objects.values_list('nombre_tipo_alga', flat=True)),
+            {'Alga 00', 'Alga 01'}
+        )
+        resumen = ProduccionMensual.objects.get()
+        self.assertEqual(resumen.total_cosechado, Decimal('20.00'))
+        self.assertEqual(resumen.total_registros, 14)
+
+
+class ContadoresTipoAlgaTest(TestCase):
+    """Tests para los totales históricos mantenidos en cada tipo de alga"""
+    
+    def setUp(self):
+        self.tipo_a = TipoAlga.objects.create(nombre='Alga A')
+        self.tipo_b = TipoAlga.objects.create(nombre='Alga B')
+        self.antiguo = RegistroProduccion.objects.create(
+            tipo_alga=self.tipo_a, cantidad_cosechada=Decimal('10.00'), sector='Norte',
+            fecha_registro=timezone.now() - timedelta(days=30)
+        )
+        self.reciente = RegistroProduccion.objects.create(
+            tipo_alga=self.tipo_a, cantidad_cosechada=Decimal('5.00'), sector='Norte'
+        )
+    
+    def test_contadores_al_crear_editar_y_eliminar(self):
+        """Test de actualización de los contadores con cada escritura"""
+        self.tipo_a.refresh_from_db()
+        self.assertEqual(self.tipo_a.total_cosechado, Decimal('15.00'))
+        self.assertEqual(self.tipo_a.total_registros, 2)
+        self.assertEqual(self.tipo_a.primera_cosecha, self.antiguo.fecha_registro)
+        self.assertEqual(self.tipo_a.ultima_cosecha, self.reciente.fecha_registro)
+        
+        # Mover el registro más antiguo a otro tipo
+        self.antiguo.tipo_alga = self.tipo_b
+        self.antiguo.save()
+        self.tipo_a.refresh_from_db()
+        self.tipo_b.refresh_from_db()
+        self.assertEqual(self.tipo_a.total_cosechado, Decimal('5.00'))
+        self.assertEqual(self.tipo_a.primera_cosecha, self.reciente.fecha_registro)
+        self.assertEqual(self.tipo_b.total_registros, 1)
+        
+        self.reciente.delete()
+        self.tipo_a.refresh_from_db()
+        self.assertEqual(self.tipo_a.total_registros, 0)
+        self.assertIsNone(self.tipo_a.ultima_cosecha)
+    
+    def test_guardar_tipo_no_pisa_contadores(self):
+        """Test de que editar el tipo con datos viejos no sobrescribe los contadores"""
+        tipo_viejo = TipoAlga.objects.get(pk=self.tipo_b.pk)
+        RegistroProduccion.objects.create(
+            tipo_alga=self.tipo_b, cantidad_cosechada=Decimal('1.00'), sector='Sur'
+        )
+        tipo_viejo.activo = False
+        tipo_viejo.save()
+        tipo_viejo.refresh_from_db()
+        self.assertFalse(tipo_viejo.activo)
+        self.assertEqual(tipo_viejo.total_registros, 1)
+    
+    def test_verificar_contadores(self):
+        """Test del comando que detecta y corrige diferencias"""
+        TipoAlga.objects.filter(pk=self.tipo_a.pk).update(total_registros=7, primera_cosecha=None)
+        
+        salida = StringIO()
+        call_command('verificar_contadores', solo_verificar=True, stdout=salida)
+        self.assertIn('1 tipos de alga con diferencias', salida.getvalue())
+        self.assertEqual(TipoAlga.objects.get(pk=self.tipo_a.pk).total_registros, 7)
+        
+        call_command('verificar_contadores', stdout=StringIO())
+        self.tipo_a.refresh_from_db()
+        self.assertEqual(self.tipo_a.total_registros, 2)
+        self.assertEqual(self.tipo_a.primera_cosecha, self.antiguo.fecha_registro)
+        
+        salida = StringIO()
+        call_command('verificar_contadores', stdout=salida)
+        self.assertIn('Contadores correctos en 2 tipos de alga', salida.getvalue())
+
+
+@override_settings(DASHBOARD_CACHE_TTL=300)
+class CacheDashboardTest(TestCase):
+    """Tests para la caché de los datos compartidos del dashboard"""
+    
+    def setUp(self):
+        cache.clear()
+        self.trabajador = UsuarioSistema.objects.create(
+            username='trabajador', password='testpass123', email='t@test.cl',
+            telefono='456', rol='Trabajador'
+        )
+        iniciar_sesion(self.client, self.trabajador)
+        self.tipo = TipoAlga.objects.create(nombre='Pelillo')
+        RegistroProduccion.objects.create(
+            tipo_alga=self.tipo, cantidad_cosechada=Decimal('10.00'), sector='Norte'
+        )
+    
+    def test_cache_e_invalidacion(self):
+        """Test de que con la caché caliente solo se consultan los últimos registros"""
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['produccion_total'], Decimal('10.00'))
+        
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('dashboard'))
+        tablas_produccion = [
+            consulta['sql'] for consulta in consultas.captured_queries
+            if 'gestion_algas_registroproduccion' in consulta['sql']
+            or 'gestion_algas_tipoalga' in consulta['sql']
+            or 'gestion_algas_capacidadproductiva' in consulta['sql']
+        ]
+        self.assertEqual(len(tablas_produccion), 1)
+        self.assertIn('LIMIT 10', tablas_produccion[0])
+        
+        # Un registro nuevo invalida la caché al confirmar la transacción
+        with self.captureOnCommitCallbacks(execute=True):
+            RegistroProduccion.objects.create(
+                tipo_alga=self.tipo, cantidad_cosechada=Decimal('5.00'), sector='Norte'
+            )
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['produccion_total'], Decimal('15.00'))
+        self.assertEqual(response.context['produccion_por_tipo'][0]['total_cosechado'], Decimal('15.00'))
+
+
+class ConexionBaseDatosTest(TestCase):
+    """Tests para la verificación de la conexión a la base de datos"""
+    
+    def test_chequeo_de_conexion(self):
+        """Test del chequeo del sistema con la base disponible y sin conexión"""
+        from django.db import OperationalError
+        from .conexion import verificar_conexion_base_datos
+        self.assertEqual(verificar_conexion_base_datos(databases=['default']), [])
+        
+        with mock.patch('gestion_algas.conexion.connections') as conexiones:
+            conexiones.__getitem__.return_value.cursor.side_effect = OperationalError('sin red')
+            errores = verificar_conexion_base_datos(databases=['default'])
+        self.assertEqual([error.id for error in errores], ['gestion_algas.E001'])
+
+
+class ReplicaRouterTest(TestCase):
+    """
+    Tests para el enrutamiento de lecturas a la réplica. La réplica es un
+    archivo SQLite aparte con datos distintos a los de la base de prueba,
+    así cada consulta muestra de qué base leyó.
+    """
+    
+    @classmethod
+    def setUpClass(cls):
+        # La réplica no está en settings cuando el runner crea las bases de
+        # prueba: se agrega aquí y se declara antes de preparar la clase
+        cls.directorio = tempfile.mkdtemp()
+        configuracion = {'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(cls.directorio, 'replica.sqlite3')}}
+        cls.patcher = mock.patch.dict(settings.DATABASES, configuracion)
+        cls.patcher.start()
+        connections.settings['replica'] = connections.configure_settings(dict(settings.DATABASES))['replica']
+        with connections['replica'].schema_editor() as editor:
+            for modelo in (UsuarioSistema, TipoAlga, Sector, RegistroProduccion):
+                editor.create_model(modelo)
+        cls.databases = {'default', 'replica'}
+        super().setUpClass()
+    
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.patcher.stop()
+        shutil.rmtree(cls.directorio, ignore_errors=True)
+    
+    def setUp(self):
+        cache.clear()
+        self.usuario = UsuarioSistema.objects.create(
+            username='trabajador', password='testpass123', email='t@test.cl',
+            telefono='123', rol='Trabajador'
+        )
+        self.tipo = TipoAlga.objects.create(nombre='Pelillo')
+        RegistroProduccion.objects.create(
+            usuario=self.usuario, tipo_alga=self.tipo, cantidad_cosechada=Decimal('10.00'), sector='Principal'
+        )
+        # Mismo usuario y tipo en la réplica, con un registro que la base principal no tiene
+        UsuarioSistema.objects.using('replica').bulk_create([self.usuario])
+        TipoAlga.objects.using('replica').bulk_create([self.tipo])
+        RegistroProduccion.objects.using('replica').bulk_create([RegistroProduccion(
+            usuario=self.usuario, tipo_alga=self.tipo, cantidad_cosechada=Decimal('99.00'), sector='Replica'
+        )])
+        iniciar_sesion(self.client, self.usuario)
+    
+    def sectores_listado(self):
+        response = self.client.get(reverse('listado_registros'))
+        self.assertEqual(response.status_code, 200)
+        return sorted(registro.sector for registro in response.context['registros'])
+    
+    def test_vista_con_replica_lee_la_replica(self):
+        """Test de que una vista con @usar_replica muestra los datos de la réplica"""
+        self.assertEqual(self.sectores_listado(), ['Replica'])
+        # Fuera de la vista decorada todo va a la base principal
+        self.assertEqual(list(RegistroProduccion.objects.values_list('sector', flat=True)), ['Principal'])
+    
+    def test_lectura_despues_de_escribir_en_la_misma_peticion(self):
+        """Test de que tras una escritura la misma petición lee de la base principal"""
+        from .routers import usar_replica
+        
+        @usar_replica
+        def vista(request):
+            antes = list(RegistroProduccion.objects.values_list('sector', flat=True))
+            TipoAlga.objects.create(nombre='Luga')
+            return antes, list(RegistroProduccion.objects.values_list('sector', flat=True))
+        
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        self.assertEqual(vista(request), (['Replica'], ['Principal']))
+    
+    def test_post_fija_la_sesion_a_la_principal(self):
+        """Test de que después de un POST las vistas con réplica leen la base principal"""
+        response = self.client.post(reverse('registro_produccion'), {
+            'tipo_alga': self.tipo.id, 'cantidad_cosechada': '5.00', 'sector': 'Nuevo'
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.sectores_listado(), ['Nuevo', 'Principal'])
+    
+    def test_vistas_sin_marcar_no_usan_la_replica(self):
+        """Test de que las vistas sin @usar_replica no consultan la réplica"""
+        with CaptureQueriesContext(connections['replica']) as consultas:
+            self.client.get(reverse('registro_produccion'))
+            self.client.post(reverse('registro_produccion'), {
+                'tipo_alga': self.tipo.id, 'cantidad_cosechada': '5.00', 'sector': 'Nuevo'
+            })
+            self.client.get(reverse('tipos_alga'))
+        self.assertEqual(consultas.captured_queries, [])
+
+
+@override_settings(API_PRODUCCION_CACHE_TTL=300)
+class ApiProduccionTest(TestCase):
+    """Tests para la API de producción diaria con ETag"""
+    
+    def setUp(self):
+        cache.clear()
+        trabajador = UsuarioSistema.objects.create(
+            username='trabajador', password='testpass123', email='t@test.cl',
+            telefono='456', rol='Trabajador'
+        )
+        iniciar_sesion(self.client, trabajador)
+        self.tipo = TipoAlga.objects.create(nombre='Pelillo')
+        otro = TipoAlga.objects.create(nombre='Luga')
+        ayer = timezone.now() - timedelta(days=1)
+        RegistroProduccion.objects.create(
+            tipo_alga=self.tipo, cantidad_cosechada=Decimal('10.00'), sector='Norte', fecha_registro=ayer
+        )
+        RegistroProduccion.objects.create(
+            tipo_alga=self.tipo, cantidad_cosechada=Decimal('2.50'), sector='Sur', fecha_registro=ayer
+        )
+        RegistroProduccion.objects.create(
+            tipo_alga=otro, cantidad_cosechada=Decimal('4.00'), sector='Norte'
+        )
+        self.url = reverse('api_produccion_semanal')
+    
+    def test_serie_diaria_y_filtros(self):
+        """Test de la serie por día con filtros de tipo y sector"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([dia['total'] for dia in response.json()], [12.5, 4.0])
+        
+        response = self.client.get(self.url, {'tipo': self.tipo.id, 'sector': 'Norte'})
+        self.assertEqual([dia['total'] for dia in response.json()], [10.0])
+        
+        response = self.client.get(self.url, {'desde': '2024-13-01'})
+        self.assertEqual(response.status_code, 400)
+    
+    def test_etag_y_304(self):
+        """Test de respuesta 304 mientras los registros no cambian"""
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        consultas_registros = [
+            c['sql'] for c in consultas.captured_queries
+            if 'gestion_algas_registroproduccion' in c['sql']
+        ]
+        self.assertEqual(len(consultas_registros), 1)
+        
+        RegistroProduccion.objects.create(
+            tipo_alga=self.tipo, cantidad_cosechada=Decimal('1.00'), sector='Norte'
+        )
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()[-1]['total'], 5.0)
+
+
+class PeriodosTest(TestCase):
+    """Tests para la agrupación por período en hora local de Chile"""
+    
+    def setUp(self):
+        from datetime import datetime, timezone as tz
+        tipo = TipoAlga.objects.create(nombre='Pelillo')
+        # Instantes UTC alrededor de los cambios de horario de 2024
+        instantes = {
+            '2024-04-07 02:30': '1.00',   # 06/04 23:30 (-03)
+            '2024-04-07 03:30': '2.00',   # 06/04 23:30 (-04), se repite la hora
+            '2024-04-07 04:30': '4.00',   # 07/04 00:30 (-04)
+            '2024-09-08 03:30': '8.00',   # 07/09 23:30 (-04)
+            '2024-09-08 04:30': '16.00',  # 08/09 01:30 (-03), no existe la medianoche
+        }
+        for instante, cantidad in instantes.items():
+            RegistroProduccion.objects.create(
+                tipo_alga=tipo, cantidad_cosechada=Decimal(cantidad), sector='Norte',
+                fecha_registro=datetime.fromisoformat(instante).replace(tzinfo=tz.utc)
+            )
+    
+    def agrupar(self, unidad, desde, hasta):
+        from datetime import date
+        from django.db.models import Sum
+        from .periodos import agrupar_por_periodo, rango_fechas
+        desde, hasta = date.fromisoformat(desde), date.fromisoformat(hasta)
+        inicio, fin = rango_fechas(desde, hasta)
+        query = RegistroProduccion.objects.filter(fecha_registro__gte=inicio, fecha_registro__lt=fin)
+        return {
+            item['periodo'].isoformat(): item['total']
+            for item in agrupar_por_periodo(query, unidad, desde, hasta, total=Sum('cantidad_cosechada'))
+        }
+    
+    def test_dias_en_cambios_de_horario(self):
+        """Test de días locales correctos con Trunc y con rangos (sin zonas en la BD)"""
+        esperado_abril = {'2024-04-06': Decimal('3.00'), '2024-04-07': Decimal('4.00')}
+        esperado_septiembre = {'2024-09-07': Decimal('8.00'), '2024-09-08': Decimal('16.00')}
+        for zonas_en_bd in (True, False):
+            with self.subTest(zonas_en_bd=zonas_en_bd), self.settings(BD_ZONAS_HORARIAS=zonas_en_bd):
+                self.assertEqual(self.agrupar('dia', '2024-04-06', '2024-04-07'), esperado_abril)
+                self.assertEqual(self.agrupar('dia', '2024-09-07', '2024-09-08'), esperado_septiembre)
+                self.assertEqual(self.agrupar('mes', '2024-04-01', '2024-09-30'), {
+                    '2024-04-01': Decimal('7.00'), '2024-09-01': Decimal('24.00')
+                })
+                self.assertEqual(self.agrupar('trimestre', '2024-01-01', '2024-12-31'), {
+                    '2024-04-01': Decimal('7.00'), '2024-07-01': Decimal('24.00')
+                })
+    
+    def test_rango_periodo(self):
+        """Test de los límites de semana y mes como rangos con zona horaria"""
+        from datetime import date
+        from .periodos import rango_periodo
+        inicio, fin = rango_periodo(date(2024, 9, 11), 'semana')
+        self.assertEqual(timezone.localtime(inicio).date(), date(2024, 9, 9))
+        self.assertEqual(fin - inicio, timedelta(days=7))
+        # El 08/09 no tiene medianoche: el mes empieza y termina en hora local
+        inicio, fin = rango_periodo(date(2024, 9, 8), 'mes')
+        self.assertEqual(inicio.isoformat(), '2024-09-01T00:00:00-04:00')
+        self.assertEqual(fin.isoformat(), '2024-10-01T00:00:00-03:00')
+
+
+class ConsultaReporteTest(TestCase):
+    """Tests para las consultas compartidas del reporte personalizado"""
+    
+    def setUp(self):
+        self.usuario = UsuarioSistema.objects.create(
+            username='admin', password='testpass123', email='a@test.cl',
+            telefono='123', rol='Administrador'
+        )
+        iniciar_sesion(self.client, self.usuario)
+        pelillo = TipoAlga.objects.create(nombre='Pelillo')
+        luga = TipoAlga.objects.create(nombre='Luga')
+        fecha = timezone.make_aware(timezone.datetime(2024, 5, 20, 12))
+        for tipo, sector, cantidad, dias in [
+            (pelillo, 'Norte', '10.00', 0), (pelillo, 'Sur', '4.00', 0),
+            (luga, 'Norte', '3.00', 0), (pelillo, 'Norte', '6.00', 31),
+        ]:
+            RegistroProduccion.objects.create(
+                tipo_alga=tipo, cantidad_cosechada=Decimal(cantidad), sector=sector,
+                fecha_registro=fecha - timedelta(days=dias), observaciones='obs'
+            )
+        CapacidadProductiva.objects.create(mes=timezone.datetime(2024, 4, 1).date(), capacidad_mensual_maxima=Decimal('100'))
+        self.configuracion = ConfiguracionReporte.objects.create(
+            empresa='Cliente', pais='Chile', email='c@test.cl', formato_preferido='pdf',
+            usar_fecha_personalizada=True, fecha_desde=timezone.datetime(2024, 4, 1).date(),
+            fecha_hasta=timezone.datetime(2024, 5, 31).date(),
+            mostrar_historial_produccion=True, mostrar_capacidad_instalada=True, incluir_observaciones=True
+        )
+        self.configuracion.tipos_alga.add(pelillo, luga)
+        self.configuracion.sectores.add(Sector.objects.get(clave='norte'))
+    
+    def test_contexto_en_pocas_consultas(self):
+        """Test de historial, serie mensual, capacidad y detalle con una consulta cada uno"""
+        desde, hasta = periodo_reporte(self.configuracion)
+        # Tipos de alga, sectores, producción por mes y tipo, capacidad con volumen y detalle
+        with self.assertNumQueries(5):
+            contexto = ConsultaReporte(self.configuracion, desde, hasta).contexto
+            self.assertEqual(contexto['capacidad_actual'].mes.month, 4)
+            self.assertEqual(contexto['capacidad_actual'].volumen_producido, Decimal('6.00'))
+        self.assertEqual(contexto['produccion_historial'], [
+            {'tipo_alga__nombre': 'Pelillo', 'total_cosechado': Decimal('16.00'), 'total_registros': 2},
+            {'tipo_alga__nombre': 'Luga', 'total_cosechado': Decimal('3.00'), 'total_registros': 1},
+        ])
+        self.assertEqual(
+            [(item['mes'].month, item['total']) for item in contexto['produccion_por_mes']],
+            [(4, Decimal('6.00')), (5, Decimal('13.00'))]
+        )
+        self.assertEqual(len(contexto['registros_detallados']), 3)
+    
+    def test_configuracion_precargada(self):
+        """Test de que con con_filtros() la consulta no vuelve a leer tipos de alga ni sectores"""
+        desde, hasta = periodo_reporte(self.configuracion)
+        # Configuración, tipos de alga y sectores
+        with self.assertNumQueries(3):
+            configuracion = ConfiguracionReporte.objects.con_filtros().get(pk=self.configuracion.pk)
+        with self.assertNumQueries(0):
+            consulta = ConsultaReporte(configuracion, desde, hasta)
+        self.assertEqual(len(consulta.tipos_ids), 2)
+        self.assertEqual(len(consulta.sectores_ids), 1)
+    
+    def test_html_de_respaldo_reutiliza_la_consulta(self):
+        """Test de que el HTML mostrado cuando falla el archivo no repite las consultas de datos"""
+        tabla = RegistroProduccion._meta.db_table
+        with mock.patch('gestion_algas.exportacion.generar_pdf', side_effect=DependenciaNoInstalada('Sin PDF')):
+            with CaptureQueriesContext(connection) as consultas:
+                response = self.client.get(reverse('generar_reporte_personalizado', args=[self.configuracion.id]))
+        self.assertTemplateUsed(response, 'gestion_algas/reporte_personalizado.html')
+        # Versión para la clave de caché, producción por mes y tipo, y detalle
+        consultas_registros = [q for q in consultas.captured_queries if f'"{tabla}"' in q['sql']]
+        self.assertEqual(len(consultas_registros), 3)
+
+
+class SectorTest(TestCase):
+    """Tests para el catálogo de sectores"""
+    
+    def setUp(self):
+        cache.clear()
+        self.tipo = TipoAlga.objects.create(nombre='Pelillo')
+    
+    def test_variantes_del_mismo_sector(self):
+        """Test de que mayúsculas, tildes y espacios no crean sectores distintos"""
+        for nombre in ['Bahía Sur', '  bahia   SUR ', 'Norte']:
+            RegistroProduccion.objects.create(
+                tipo_alga=self.tipo, cantidad_cosechada=Decimal('1.00'), sector=nombre
+            )
+        self.assertEqual(list(Sector.objects.values_list('nombre', flat=True)), ['Bahía Sur', 'Norte'])
+        bahia = Sector.objects.get(clave='bahia sur')
+        self.assertEqual(
+            list(bahia.registros.values_list('sector', flat=True)), ['Bahía Sur', 'Bahía Sur']
+        )
+    
+    def test_guardar_sin_cambiar_sector_no_consulta_catalogo(self):
+        """Test de que el sector solo se resuelve de nuevo si cambió"""
+        registro = RegistroProduccion.objects.create(
+            tipo_alga=self.tipo, cantidad_cosechada=Decimal('1.00'), sector='Norte'
+        )
+        registro = RegistroProduccion.objects.get(pk=registro.pk)
+        registro.cantidad_cosechada = Decimal('2.00')
+        with CaptureQueriesContext(connection) as consultas:
+            registro.save()
+        self.assertFalse([c for c in consultas.captured_queries if 'gestion_algas_sector' in c['sql']])
+        
+        registro.sector = ' sur '
+        registro.save()
+        self.assertEqual(registro.sector, 'sur')
+        self.assertEqual(registro.sector_catalogo, Sector.objects.get(clave='sur'))
+    
+    def test_filtro_api_por_nombre_de_sector(self):
+        """Test de que la API filtra por el sector del catálogo sin distinguir mayúsculas"""
+        trabajador = UsuarioSistema.objects.create(
+            username='trabajador', password='testpass123', email='t@test.cl',
+            telefono='456', rol='Trabajador'
+        )
+        iniciar_sesion(self.client, trabajador)
+        for nombre, cantidad in [('Norte', '3.00'), ('Sur', '5.00')]:
+            RegistroProduccion.objects.create(
+                tipo_alga=self.tipo, cantidad_cosechada=Decimal(cantidad), sector=nombre
+            )
+        url = reverse('api_produccion_semanal')
+        datos = self.client.get(url, {'sector': ' NORTE'}).json()
+        self.assertEqual(sum(dia['total'] for dia in datos), 3.0)
+        self.assertEqual(self.client.get(url, {'sector': 'Inexistente'}).json(), [])
+
+
+class PaginacionCursorTest(TestCase):
+    """Tests para la paginación por cursor y los listados de registros y auditoría"""
+    
+    def setUp(self):
+        cache.clear()
+        self.admin = UsuarioSistema.objects.create(
+            username='admin', password='adminpass', email='a@test.cl',
+            telefono='123', rol='Administrador'
+        )
+        self.tipo = TipoAlga.objects.create(nombre='Pelillo')
+        # Cuatro registros comparten fecha para probar el desempate por id
+        ahora = timezone.now()
+        for i in range(12):
+            RegistroProduccion.objects.create(
+                tipo_alga=self.tipo, usuario=self.admin, cantidad_cosechada=Decimal('1.00'),
+                sector='Norte', fecha_registro=ahora - timedelta(hours=max(i, 3))
+            )
+        self.orden = list(RegistroProduccion.objects.order_by('-fecha_registro', '-id').values_list('id', flat=True))
+    
+    def test_recorre_todas_las_filas_en_ambas_direcciones(self):
+        """Test de que siguiente y anterior recorren todas las filas sin repetir ni saltar"""
+        paginador = PaginadorCursor(RegistroProduccion.objects.all(), 'fecha_registro', 5)
+        paginas = [paginador.get_page()]
+        self.assertFalse(paginas[0].has_previous())
+        while paginas[-1].has_next():
+            paginas.append(paginador.get_page(paginas[-1].siguiente))
+        self.assertEqual([len(pagina) for pagina in paginas], [5, 5, 2])
+        self.assertEqual([registro.id for pagina in paginas for registro in pagina], self.orden)
+        
+        # Hacia atrás desde la última página se vuelve a las mismas páginas
+        pagina = paginador.get_page(paginador.cursor_ultima())
+        self.assertEqual([registro.id for registro in pagina], self.orden[-5:])
+        self.assertFalse(pagina.has_next())
+        pagina = paginador.get_page(paginas[2].anterior)
+        self.assertEqual([registro.id for registro in pagina], self.orden[5:10])
+        pagina = paginador.get_page(pagina.anterior)
+        self.assertEqual([registro.id for registro in pagina], self.orden[:5])
+        self.assertFalse(pagina.has_previous())
+    
+    def test_cursor_alterado_vuelve_a_la_primera_pagina(self):
+        """Test de que un cursor inválido o alterado muestra la primera página"""
+        paginador = PaginadorCursor(RegistroProduccion.objects.all(), 'fecha_registro', 5)
+        cursor = paginador.get_page().siguiente
+        for invalido in ['basura', cursor[:-2] + 'xx']:
+            with self.subTest(cursor=invalido):
+                pagina = paginador.get_page(invalido)
+                self.assertEqual([registro.id for registro in pagina], self.orden[:5])
+    
+    @mock.patch('gestion_algas.views.TAMANO_PAGINA_LISTADOS', 2)
+    def test_listado_registros_cuesta_lo_mismo_en_cualquier_pagina(self):
+        """Test de que una página profunda hace las mismas consultas que la primera, sin COUNT ni OFFSET"""
+        iniciar_sesion(self.client, self.admin)
+        url = reverse('listado_registros')
+        with CaptureQueriesContext(connection) as primera:
+            response = self.client.get(url)
+        cursor = response.context['registros'].siguiente
+        for _ in range(4):
+            cursor = self.client.get(url, {'cursor': cursor}).context['registros'].siguiente
+        with CaptureQueriesContext(connection) as profunda:
+            response = self.client.get(url, {'cursor': cursor})
+        self.assertEqual([registro.id for registro in response.context['registros']], self.orden[10:])
+        self.assertEqual(len(profunda), len(primera))
+        for consulta in profunda.captured_queries:
+            self.assertNotIn('OFFSET', consulta['sql'])
+            self.assertNotIn('COUNT(', consulta['sql'])
+    
+    def test_usuarios_y_reportes_sin_contar_filas(self):
+        """Test de que el listado de usuarios no cuenta filas y las semanas de reportes se leen en una consulta"""
+        iniciar_sesion(self.client, self.admin)
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get(reverse('usuarios')).status_code, 200)
+        for consulta in consultas.captured_queries:
+            self.assertNotIn('COUNT(', consulta['sql'])
+        
+        tabla = RegistroProduccion._meta.db_table
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('reportes'), {'page': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len([q for q in consultas.captured_queries if f'"{tabla}"' in q['sql']]), 1)
+    
+    def test_trabajador_solo_ve_sus_registros(self):
+        """Test de que el listado de un trabajador no incluye registros de otros"""
+        trabajador = UsuarioSistema.objects.create(
+            username='trabajador', password='testpass123', email='t@test.cl',
+            telefono='456', rol='Trabajador'
+        )
+        propio = RegistroProduccion.objects.create(
+            tipo_alga=self.tipo, usuario=trabajador, cantidad_cosechada=Decimal('2.00'), sector='Sur'
+        )
+        iniciar_sesion(self.client, trabajador)
+        response = self.client.get(reverse('listado_registros'), {'usuario': 'admin'})
+        self.assertEqual([registro.id for registro in response.context['registros']], [propio.id])
+    
+    def test_auditoria(self):
+        """Test de la auditoría de accesos: solo admin, estadísticas y filtro por tipo"""
+        ControlAcceso.objects.create(usuario=self.admin, ip_origen='127.0.0.1', tipo_acceso='login_exitoso')
+        ControlAcceso.objects.create(ip_origen='127.0.0.1', tipo_acceso='login_fallido')
+        ControlAcceso.objects.create(ip_origen='10.0.0.9', tipo_acceso='login_fallido')
+        iniciar_sesion(self.client, self.admin)
+        response = self.client.get(reverse('auditoria'), {'tipo': 'login_fallido'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['stats']['login_exitoso'], 1)
+        self.assertEqual(response.context['total_accesos'], 2)
+        self.assertEqual(len(response.context['accesos']), 2)
+        response = self.client.get(reverse('auditoria'), {'ip': '10.0.0.9'})
+        self.assertEqual(len(response.context['accesos']), 1)
+        
+        trabajador = UsuarioSistema.objects.create(
+            username='trabajador', password='testpass123', email='t@test.cl',
+            telefono='456', rol='Trabajador'
+        )
+        iniciar_sesion(self.client, trabajador)
+        self.assertRedirects(self.client.get(reverse('auditoria')), reverse('dashboard'))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Los planes se comparan con el planificador de SQLite')
+class PlanesConsultaReportesTest(TestCase):
+    """
+    Tests de regresión de los planes de ejecución de las consultas de reportes.
+    
+    Se ejecuta EXPLAIN sobre cada consulta a RegistroProduccion que hacen los
+    reportes y falla si alguna recorre la tabla completa. SQLite sin ANALYZE
+    elige el plan según el esquema y no según la cantidad de filas, así que
+    un índice faltante se detecta aunque la tabla de pruebas sea pequeña.
+    """
+    
+    TABLA = RegistroProduccion._meta.db_table
+    
+    def setUp(self):
+        cache.clear()
+        self.usuario = UsuarioSistema.objects.create(
+            username='trabajador', password='testpass123', email='t@test.cl',
+            telefono='123', rol='Trabajador'
+        )
+        iniciar_sesion(self.client, self.usuario)
+        self.tipo = TipoAlga.objects.create(nombre='Pelillo')
+        for dias, sector in [(1, 'Norte'), (2, 'Sur'), (40, 'Norte')]:
+            RegistroProduccion.objects.create(
+                tipo_alga=self.tipo, usuario=self.usuario, cantidad_cosechada=Decimal('3.00'),
+                sector=sector, fecha_registro=timezone.now() - timedelta(days=dias)
+            )
+        self.hasta = timezone.now()
+        self.desde = self.hasta - timedelta(days=30)
+    
+    def planes(self, funcion):
+        """Ejecuta funcion y retorna [(sql, plan)] de sus consultas a la tabla de registros"""
+        with CaptureQueriesContext(connection) as consultas:
+            funcion()
+        planes = []
+        for consulta in consultas.captured_queries:
+            sql = consulta['sql']
+            if not sql.startswith('SELECT') or f'"{self.TABLA}"' not in sql:
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+                plan = '\n'.join(str(fila[-1]) for fila in cursor.fetchall())
+            planes.append((sql, plan))
+        return planes
+    
+    def assertSinRecorridoCompleto(self, funcion):
+        planes = self.planes(funcion)
+        self.assertTrue(planes, 'No se ejecutó ninguna consulta a los registros')
+        for sql, plan in planes:
+            with self.subTest(sql=sql):
+                self.assertNotRegex(
+                    plan, rf'\bSCAN {self.TABLA}\b',
+                    f'Recorrido completo de {self.TABLA}:\n{sql}\n{plan}'
+                )
+    
+    def test_reporte_personalizado(self):
+        """Test de historial, detalle, hoja de registros y versión de caché con cada combinación de filtros"""
+        for tipos, sectores in [(False, []), (True, []), (False, ['Norte', 'Sur']), (True, ['Norte'])]:
+            configuracion = ConfiguracionReporte.objects.create(
+                empresa='Cliente', pais='Chile', email='c@test.cl',
+                incluir_observaciones=True, incluir_hoja_registros=True
+            )
+            if tipos:
+                configuracion.tipos_alga.add(self.tipo)
+            configuracion.sectores.add(*Sector.desde_nombres(sectores).values())
+            with self.subTest(tipos=tipos, sectores=sectores):
+                self.assertSinRecorridoCompleto(lambda: generar_excel_personalizado(
+                    contexto_reporte_personalizado(configuracion, self.desde, self.hasta)
+                ))
+                self.assertSinRecorridoCompleto(lambda: cache_reportes.version_datos(
+                    ConsultaReporte(configuracion, self.desde, self.hasta)
+                ))
+    
+    def test_estadisticas_y_vistas(self):
+        """Test del dashboard, la vista de reportes y la API de producción"""
+        self.assertSinRecorridoCompleto(calcular_estadisticas_dashboard)
+        self.assertSinRecorridoCompleto(lambda: self.client.get(reverse('reportes')))
+        luga = TipoAlga.objects.create(nombre='Luga')
+        RegistroProduccion.objects.create(
+            tipo_alga=luga, usuario=self.usuario, cantidad_cosechada=Decimal('5.00'),
+            sector='Sur', fecha_registro=timezone.now() - timedelta(days=3)
+        )
+        for filtros, total in [({}, 11.0), ({'tipo': self.tipo.id}, 6.0), ({'sector': 'Norte'}, 3.0)]:
+            with self.subTest(filtros=filtros):
+                respuestas = []
+                self.assertSinRecorridoCompleto(
+                    lambda: respuestas.append(self.client.get(reverse('api_produccion_semanal'), filtros))
+                )
+                self.assertEqual(sum(dia['total'] for dia in respuestas[0].json()), total)
+    
+    def test_listado_registros(self):
+        """Test de la primera página y una página siguiente del listado de registros"""
+        url = reverse('listado_registros')
+        self.assertSinRecorridoCompleto(lambda: self.client.get(url))
+        cursor = PaginadorCursor(RegistroProduccion.objects.all(), 'fecha_registro', 1).get_page().siguiente
+        self.assertSinRecorridoCompleto(lambda: self.client.get(url, {'cursor': cursor}))
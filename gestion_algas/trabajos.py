@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Cola de trabajos de reportes respaldada por la tabla TrabajoReporte
+
+Las vistas encolan el trabajo y responden de inmediato; el comando
+procesar_reportes toma los trabajos pendientes y genera los archivos
+fuera de los workers web.
+"""
+import logging
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from . import cache_reportes
+from .exportacion import (
+    ConsultaReporte, exportar_reporte_personalizado, exportar_pdf_semanal, formato_archivo, nombre_archivo_reporte
+)
+from .models import ConfiguracionReporte, TrabajoReporte
+
+logger = logging.getLogger(__name__)
+
+
+def encolar_reporte_personalizado(configuracion, fecha_desde, fecha_hasta, usuario=None):
+    """Crear un trabajo pendiente para el reporte personalizado de una configuración"""
+    return TrabajoReporte.objects.create(
+        tipo='personalizado',
+        configuracion=configuracion,
+        fecha_desde=fecha_desde,
+        fecha_hasta=fecha_hasta,
+        usuario_id=getattr(usuario, 'pk', None),
+    )
+
+
+def encolar_pdf_semanal(inicio, fin, usuario=None):
+    """Crear un trabajo pendiente para el PDF semanal entre dos fechas"""
+    return TrabajoReporte.objects.create(
+        tipo='semanal',
+        fecha_desde=timezone.make_aware(datetime.combine(inicio, datetime.min.time())),
+        fecha_hasta=timezone.make_aware(datetime.combine(fin, datetime.max.time())),
+        usuario_id=getattr(usuario, 'pk', None),
+    )
+
+
+def reencolar_trabajos_vencidos():
+    """
+    Devolver a pendiente los trabajos en proceso desde hace más de
+    REPORTES_TIMEOUT_TRABAJO segundos (el procesador que los tomó se
+    detuvo sin terminarlos). Retorna cuántos se reencolaron.
+    """
+    timeout = getattr(settings, 'REPORTES_TIMEOUT_TRABAJO', 1800)
+    vencidos = TrabajoReporte.objects.filter(
+        estado='en_proceso', fecha_inicio__lt=timezone.now() - timedelta(seconds=timeout)
+    ).update(estado='pendiente', fecha_inicio=None)
+    if vencidos:
+        logger.warning('%s trabajos de reporte vencidos devueltos a la cola', vencidos)
+    return vencidos
+
+
+def tomar_siguiente_trabajo():
+    """
+    Reservar el trabajo pendiente más antiguo y retornarlo (o None).
+
+    La reserva es un UPDATE condicionado al estado, así dos procesadores
+    nunca toman el mismo trabajo aunque la base no soporte SKIP LOCKED.
+    Antes se reencolan los trabajos vencidos.
+    """
+    reencolar_trabajos_vencidos()
+    while True:
+        trabajo = TrabajoReporte.objects.filter(
+            estado='pendiente'
+        ).order_by('fecha_creacion', 'id').first()
+        if trabajo is None:
+            return None
+        ahora = timezone.now()
+        reservado = TrabajoReporte.objects.filter(
+            pk=trabajo.pk, estado='pendiente'
+        ).update(estado='en_proceso', fecha_inicio=ahora)
+        if reservado:
+            trabajo.estado = 'en_proceso'
+            trabajo.fecha_inicio = ahora
+            return trabajo
+
+
+def generar_archivo(trabajo):
+    """Generar el archivo de un trabajo. Retorna (contenido, nombre, content type)"""
+    if trabajo.tipo == 'personalizado':
+        configuracion = ConfiguracionReporte.objects.con_filtros().get(pk=trabajo.configuracion_id)
+        consulta = ConsultaReporte(configuracion, trabajo.fecha_desde, trabajo.fecha_hasta)
+        formato = formato_archivo(configuracion)
+        clave = cache_reportes.clave_reporte(consulta) if formato else None
+        archivo = cache_reportes.abrir(clave, formato) if clave else None
+        if archivo:
+            with archivo:
+                return (archivo.read(),) + nombre_archivo_reporte(configuracion)
+        resultado = exportar_reporte_personalizado(consulta)
+        if clave:
+            cache_reportes.guardar(clave, formato, resultado[0])
+        return resultado
+    return exportar_pdf_semanal(
+        timezone.localtime(trabajo.fecha_desde).date(),
+        timezone.localtime(trabajo.fecha_hasta).date()
+    )
+
+
+def procesar_trabajo(trabajo):
+    """Generar y guardar el archivo del trabajo, dejando registrado el resultado"""
+    try:
+        contenido, nombre, content_type = generar_archivo(trabajo)
+    except Exception as e:
+        logger.exception('Error al generar el reporte del trabajo %s', trabajo.pk)
+        trabajo.estado = 'error'
+        trabajo.error = str(e)
+    else:
+        trabajo.archivo.save(f'{trabajo.pk}_{nombre}', ContentFile(contenido), save=False)
+        trabajo.nombre_archivo = nombre
+        trabajo.content_type = content_type
+        trabajo.estado = 'completado'
+    trabajo.fecha_fin = timezone.now()
+    trabajo.save()
+    return trabajo
+
+
+def procesar_pendientes(limite=None):
+    """Procesar trabajos pendientes hasta vaciar la cola (o hasta el límite)"""
+    procesados = 0
+    while limite is None or procesados < limite:
+        trabajo = tomar_siguiente_trabajo()
+        if trabajo is None:
+            break
+        procesar_trabajo(trabajo)
+        procesados += 1
+    return procesados
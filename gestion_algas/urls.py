@@ -16,6 +16,7 @@ urlpatterns = [
     # Producción
     path('registro/', views.registro_produccion, name='registro_produccion'),
     path('registro/eliminar/<int:registro_id>/', views.eliminar_registro, name='eliminar_registro'),
+    path('registros/', views.listado_registros, name='listado_registros'),
     
     # Reportes
     path('reportes/', views.reportes, name='reportes'),
@@ -25,6 +26,9 @@ urlpatterns = [
     path('usuarios/', views.usuarios, name='usuarios'),
     path('usuarios/eliminar/<int:usuario_id>/', views.eliminar_usuario, name='eliminar_usuario'),
     
+    # Auditoría
+    path('auditoria/', views.auditoria, name='auditoria'),
+    
     # Perfil de Usuario
     path('perfil/', views.perfil_usuario, name='perfil_usuario'),
     
@@ -44,7 +48,11 @@ urlpatterns = [
     path('configuracion-reportes/editar/<int:config_id>/', views.editar_configuracion, name='editar_configuracion'),
     path('configuracion-reportes/eliminar/<int:config_id>/', views.eliminar_configuracion, name='eliminar_configuracion'),
     path('reportes/personalizado/<int:config_id>/', views.generar_reporte_personalizado, name='generar_reporte_personalizado'),
+    path('reportes/exportar/<int:config_id>/', views.exportar_registros, name='exportar_registros'),
+    path('reportes/trabajos/<int:trabajo_id>/', views.estado_trabajo_reporte, name='estado_trabajo_reporte'),
+    path('reportes/trabajos/<int:trabajo_id>/descargar/', views.descargar_trabajo_reporte, name='descargar_trabajo_reporte'),
     
     # API
     path('api/produccion-semanal/', views.api_produccion_semanal, name='api_produccion_semanal'),
+    path('api/registros/lote/', views.api_ingesta_registros, name='api_ingesta_registros'),
 ]
@@ -3,16 +3,38 @@
 Vistas de la aplicación de gestión de algas
 """
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth import login, logout
-from django.contrib.auth.decorators import login_required, user_passes_test
+from django.contrib.auth.hashers import make_password
 from django.contrib import messages
+from django.db import transaction
 from django.db.models import Sum, Count, Q
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, FileResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.conf import settings
 from django.utils import timezone
 from django.core.paginator import Paginator
+from urllib.parse import urlencode
 from datetime import timedelta, datetime
 from functools import wraps
-from .models import Usuario, TipoAlga, RegistroProduccion, ControlAcceso, CapacidadProductiva, ConfiguracionReporte
+import ipaddress
+import json
+from .models import Usuario, TipoAlga, Sector, RegistroProduccion, ControlAcceso, CapacidadProductiva, ConfiguracionReporte, TrabajoReporte, clave_sector
+from . import cache_reportes
+from .auditoria import registrar_evento_acceso
+from .estadisticas import datos_dashboard, registros_periodo, version_registros, produccion_diaria
+from .exportacion import (
+    ErrorExportacion, DependenciaNoInstalada, periodo_reporte, formato_archivo, nombre_archivo_reporte,
+    ConsultaReporte, exportar_reporte_personalizado, exportar_pdf_semanal,
+    FORMATOS_EXPORTACION, registros_filtrados, lineas_exportacion
+)
+from .ingesta import ingresar_registros
+from .limite_login import limitador_login
+from .trabajos import encolar_reporte_personalizado, encolar_pdf_semanal
+from .middleware import obtener_usuario_sesion, obtener_rol_sesion
+from .paginacion import PaginadorCursor
+from .periodos import agrupar_por_periodo, inicio_periodo, rango_fechas
+from .routers import usar_replica
 from .forms import CustomLoginForm, UsuarioCreationForm, RegistroProduccionForm, CapacidadProductivaForm, ConfiguracionReporteForm, TipoAlgaForm
 
 
@@ -40,13 +62,29 @@ PERMISOS_ROL = {
     ],
 }
 
+# Máximo de registros aceptados por petición en la API de ingesta
+MAX_FILAS_INGESTA = 5000
+
+# Días por defecto y máximos del período de la API de producción diaria
+DIAS_API_PRODUCCION = 30
+MAX_DIAS_API_PRODUCCION = 366
+
+# Filas por página de los listados de registros y de auditoría
+TAMANO_PAGINA_LISTADOS = 25
+
+# Ventana por defecto y máxima (en semanas) de la producción semanal en reportes
+SEMANAS_REPORTE = 8
+MAX_SEMANAS_REPORTE = 104
+
 # Mapeo de vistas a módulos requeridos
 VISTA_MODULO = {
     'dashboard': 'dashboard',
     'registro_produccion': 'registro_produccion',
+    'listado_registros': 'registro_produccion',
     'reportes': 'reportes',
     'usuarios': 'usuarios',
     'eliminar_usuario': 'usuarios',
+    'auditoria': 'usuarios',
     'capacidad_productiva': 'capacidad_productiva',
     'editar_capacidad': 'capacidad_productiva',
     'eliminar_capacidad': 'capacidad_productiva',
@@ -54,7 +92,11 @@ VISTA_MODULO = {
     'editar_configuracion': 'configuracion_reportes',
     'eliminar_configuracion': 'configuracion_reportes',
     'generar_reporte_personalizado': 'reportes',
+    'exportar_registros': 'reportes',
+    'estado_trabajo_reporte': 'reportes',
+    'descargar_trabajo_reporte': 'reportes',
     'api_produccion_semanal': 'reportes',
+    'api_ingesta_registros': 'registro_produccion',
 }
 
 
@@ -159,20 +201,19 @@ def requiere_permiso(*modulos):
                 return redirect('login')
             
             # Obtener usuario de la sesión
-            try:
-                user = Usuario.objects.get(id=request.session.get('user_id'))
-            except Usuario.DoesNotExist:
+            rol = obtener_rol_sesion(request)
+            if rol is None:
                 request.session.flush()
                 messages.error(request, 'Sesión inválida. Por favor, inicia sesión nuevamente.')
                 return redirect('login')
             
             # Verificar permisos
-            tiene_acceso = any(tiene_permiso(user, mod) for mod in modulos)
+            tiene_acceso = any(mod in PERMISOS_ROL.get(rol, []) for mod in modulos)
             
             if not tiene_acceso:
                 messages.error(request, 'No tienes permisos para acceder a esta sección')
-                registrar_acceso(request, 'acceso_denegado', user,
-                               detalles=f'Permiso denegado - Vista: {view_func.__name__} - Rol: {user.rol}')
+                registrar_acceso(request, 'acceso_denegado', request.usuario,
+                               detalles=f'Permiso denegado - Vista: {view_func.__name__} - Rol: {rol}')
                 return redirect('dashboard')
             
             return view_func(request, *args, **kwargs)
@@ -196,17 +237,16 @@ def solo_admin(view_func):
             messages.error(request, 'Debes iniciar sesión')
             return redirect('login')
         
-        try:
-            user = Usuario.objects.get(id=request.session.get('user_id'))
-        except Usuario.DoesNotExist:
+        rol = obtener_rol_sesion(request)
+        if rol is None:
             request.session.flush()
             messages.error(request, 'Sesión inválida. Por favor, inicia sesión nuevamente.')
             return redirect('login')
         
         # Verificar que sea admin del sistema
-        if user.rol != 'Administrador':
+        if rol != 'Administrador':
             messages.error(request, 'Esta función es exclusiva para administradores')
-            registrar_acceso(request, 'acceso_denegado', user,
+            registrar_acceso(request, 'acceso_denegado', request.usuario,
                            detalles=f'Acceso admin requerido - Vista: {view_func.__name__}')
             return redirect('dashboard')
         
@@ -240,25 +280,24 @@ def permiso_lectura_escritura(modulo, requiere_escritura=False):
                 messages.error(request, 'Debes iniciar sesión')
                 return redirect('login')
             
-            try:
-                user = Usuario.objects.get(id=request.session.get('user_id'))
-            except Usuario.DoesNotExist:
+            rol = obtener_rol_sesion(request)
+            if rol is None:
                 request.session.flush()
                 messages.error(request, 'Sesión inválida. Por favor, inicia sesión nuevamente.')
                 return redirect('login')
             
             # Verificar permiso de lectura
-            if not tiene_permiso(user, modulo):
+            if modulo not in PERMISOS_ROL.get(rol, []):
                 messages.error(request, 'No tienes permisos para acceder a esta sección')
-                registrar_acceso(request, 'acceso_denegado', user,
+                registrar_acceso(request, 'acceso_denegado', request.usuario,
                                detalles=f'Sin permiso de lectura - Vista: {view_func.__name__}')
                 return redirect('dashboard')
             
             # Si requiere escritura, verificar que sea admin
             if requiere_escritura:
-                if user.rol != 'Administrador':
+                if rol != 'Administrador':
                     messages.error(request, 'No tienes permisos para modificar esta información')
-                    registrar_acceso(request, 'acceso_denegado', user,
+                    registrar_acceso(request, 'acceso_denegado', request.usuario,
                                    detalles=f'Sin permiso de escritura - Vista: {view_func.__name__}')
                     return redirect('dashboard')
             
@@ -271,26 +310,69 @@ def permiso_lectura_escritura(modulo, requiere_escritura=False):
 # FUNCIONES AUXILIARES
 # ============================================================================
 
+def es_proxy_confiable(ip):
+    """Si la IP (o su red) está en PROXIES_CONFIABLES"""
+    try:
+        direccion = ipaddress.ip_address(ip.strip())
+    except ValueError:
+        return False
+    return any(
+        direccion in ipaddress.ip_network(red, strict=False)
+        for red in getattr(settings, 'PROXIES_CONFIABLES', [])
+    )
+
+
 def get_client_ip(request):
-    """Obtener IP del cliente"""
+    """
+    Obtener IP del cliente.
+    
+    X-Forwarded-For lo escribe el cliente, así que solo se lee si la
+    petición llega desde un proxy de PROXIES_CONFIABLES; en ese caso se
+    toma el salto más a la derecha que no sea un proxy confiable.
+    """
+    ip = request.META.get('REMOTE_ADDR')
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
-    else:
-        ip = request.META.get('REMOTE_ADDR')
+    if x_forwarded_for and ip and es_proxy_confiable(ip):
+        for salto in reversed(x_forwarded_for.split(',')):
+            ip = salto.strip()
+            if not es_proxy_confiable(ip):
+                break
     return ip
 
 
 def registrar_acceso(request, tipo, usuario=None, detalles=None):
-    """Registrar acceso en el sistema"""
-    ControlAcceso.objects.create(
+    """Registrar acceso en el sistema (en lote, ver auditoria.py)"""
+    registrar_evento_acceso(
+        tipo,
+        get_client_ip(request),
         usuario=usuario,
-        ip_origen=get_client_ip(request),
-        tipo_acceso=tipo,
         detalles=detalles
     )
 
 
+def filtro_fechas(request, campo):
+    """
+    Lee fecha_desde/fecha_hasta (AAAA-MM-DD, inclusive) de la petición.
+
+    Retorna (filtros para el queryset sobre campo, desde, hasta); las
+    fechas vacías o inválidas se ignoran y vuelven como ''.
+    """
+    fechas = {}
+    for nombre in ('fecha_desde', 'fecha_hasta'):
+        try:
+            fechas[nombre] = datetime.strptime(request.GET.get(nombre, ''), '%Y-%m-%d').date()
+        except ValueError:
+            fechas[nombre] = None
+    desde, hasta = fechas['fecha_desde'], fechas['fecha_hasta']
+    
+    filtros = {}
+    if desde:
+        filtros[f'{campo}__gte'] = rango_fechas(desde, desde)[0]
+    if hasta:
+        filtros[f'{campo}__lt'] = rango_fechas(hasta, hasta)[1]
+    return filtros, desde.isoformat() if desde else '', hasta.isoformat() if hasta else ''
+
+
 def login_view(request):
     """Vista de inicio de sesión"""
     if request.session.get('user_logged', False):
@@ -301,10 +383,22 @@ def login_view(request):
         if form.is_valid():
             username = form.cleaned_data['username']
             password = form.cleaned_data['password']
+            ip = get_client_ip(request)
+            
+            # Sobre el límite de fallos se rechaza sin consultar la base de datos
+            bloqueo = limitador_login.bloqueo(ip, username)
+            if bloqueo is not None:
+                tipo, valor = bloqueo
+                bloqueados = limitador_login.registrar_bloqueo(tipo, valor)
+                if bloqueados:
+                    registrar_acceso(request, 'acceso_denegado',
+                                   detalles=f'{bloqueados} intentos de login bloqueados - {tipo}: {valor}')
+                messages.error(request, 'Demasiados intentos fallidos. Espera unos minutos antes de volver a intentarlo')
+                return render(request, 'gestion_algas/login.html', {'form': form}, status=429)
             
             try:
                 user = Usuario.objects.get(username=username)
-                if user.password == password:
+                if user.check_password(password):
                     # Iniciar sesión guardando en session
                     request.session['user_logged'] = True
                     request.session['user_id'] = user.id
@@ -312,13 +406,18 @@ def login_view(request):
                     request.session['rol'] = user.rol
                     request.session['email'] = user.email
                     
+                    limitador_login.registrar_exito(username)
                     registrar_acceso(request, 'login_exitoso', user)
                     messages.success(request, f'¡Bienvenido {user.username}!')
                     return redirect('dashboard')
                 else:
+                    limitador_login.registrar_fallo(ip, username)
                     registrar_acceso(request, 'login_fallido', detalles=username)
                     messages.error(request, 'Usuario o contraseña incorrectos')
             except Usuario.DoesNotExist:
+                # Mismo costo que verificar una contraseña, para no revelar qué usuarios existen
+                make_password(password)
+                limitador_login.registrar_fallo(ip, username)
                 registrar_acceso(request, 'login_fallido', detalles=username)
                 messages.error(request, 'Usuario o contraseña incorrectos')
         else:
@@ -331,14 +430,9 @@ def login_view(request):
 
 def logout_view(request):
     """Vista de cierre de sesión"""
-    if request.session.get('user_logged', False):
-        try:
-            user_id = request.session.get('user_id')
-            if user_id:
-                user = Usuario.objects.get(id=user_id)
-                registrar_acceso(request, 'logout', user)
-        except Usuario.DoesNotExist:
-            pass
+    user = obtener_usuario_sesion(request)
+    if user is not None:
+        registrar_acceso(request, 'logout', user)
     
     request.session.flush()
     messages.info(request, 'Sesión cerrada correctamente')
@@ -346,147 +440,41 @@ def logout_view(request):
 
 
 @requiere_permiso('dashboard')
+@usar_replica
 def dashboard(request):
     """Dashboard principal con estadísticas"""
-    user = Usuario.objects.get(id=request.session.get('user_id'))
+    user = request.usuario
     
-    # Estadísticas según el rol
+    # Estadísticas generales de producción (de todos, iguales para ambos roles; en caché)
+    datos = datos_dashboard()
+    
+    # Últimos registros: el administrador ve todos, el trabajador solo los suyos
     if user.rol == 'Administrador':
-        # Registros del mes actual
-        inicio_mes = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        total_registros = RegistroProduccion.objects.filter(
-            fecha_registro__gte=inicio_mes
-        ).count()
-        
-        # Producción de la última semana
-        produccion_semanal = RegistroProduccion.objects.filter(
-            fecha_registro__gte=timezone.now() - timedelta(days=7)
-        ).aggregate(total=Sum('cantidad_cosechada'))['total'] or 0
-        
-        # Producción del mes actual
-        produccion_total = RegistroProduccion.objects.filter(
-            fecha_registro__gte=inicio_mes
-        ).aggregate(total=Sum('cantidad_cosechada'))['total'] or 0
-        
         ultimos_registros = RegistroProduccion.objects.select_related(
             'usuario', 'tipo_alga'
         ).order_by('-fecha_registro')[:10]
-        
-        # Producción por semana (últimas 4 semanas)
-        produccion_por_semana = []
-        etiquetas_semanas = []
-        for i in range(4):
-            inicio = timezone.now() - timedelta(weeks=i+1)
-            fin = timezone.now() - timedelta(weeks=i)
-            total_semana = RegistroProduccion.objects.filter(
-                fecha_registro__gte=inicio,
-                fecha_registro__lt=fin
-            ).aggregate(total=Sum('cantidad_cosechada'))['total'] or 0
-            produccion_por_semana.insert(0, round(float(total_semana), 2))
-            # Crear etiqueta con rango de fechas
-            etiqueta = f"{inicio.strftime('%d/%m')} - {fin.strftime('%d/%m')}"
-            etiquetas_semanas.insert(0, etiqueta)
-        
-        # Producción por tipo de alga (todas las algas con producción)
-        produccion_por_tipo = TipoAlga.objects.annotate(
-            total=Sum('registros__cantidad_cosechada')
-        ).filter(total__gt=0).order_by('-total')
-        
-        # Capacidad del mes actual
-        capacidad_mes_actual = CapacidadProductiva.objects.filter(
-            mes__year=inicio_mes.year,
-            mes__month=inicio_mes.month
-        ).first()
-        
-        if capacidad_mes_actual:
-            capacidad_total = capacidad_mes_actual.capacidad_mensual_maxima
-        else:
-            capacidad_total = 2400  # Valor por defecto si no hay capacidad definida para el mes
-        
-        # Calcular porcentaje de capacidad utilizada
-        if capacidad_total > 0:
-            porcentaje_capacidad = round((float(produccion_total) / float(capacidad_total)) * 100, 1)
-        else:
-            porcentaje_capacidad = 0
-            
     else:
-        # Trabajador - Ver todos los datos de producción agregados (estadísticas generales)
-        # pero solo sus propios registros individuales
-        inicio_mes = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
-        # Registros totales del mes (de todos, no solo suyos)
-        total_registros = RegistroProduccion.objects.filter(
-            fecha_registro__gte=inicio_mes
-        ).count()
-        
-        # Producción semanal total (de todos)
-        produccion_semanal = RegistroProduccion.objects.filter(
-            fecha_registro__gte=timezone.now() - timedelta(days=7)
-        ).aggregate(total=Sum('cantidad_cosechada'))['total'] or 0
-        
-        # Producción del mes actual total (de todos)
-        produccion_total = RegistroProduccion.objects.filter(
-            fecha_registro__gte=inicio_mes
-        ).aggregate(total=Sum('cantidad_cosechada'))['total'] or 0
-        
-        # Últimos registros solo del trabajador
         ultimos_registros = RegistroProduccion.objects.filter(
             usuario=user
         ).select_related('tipo_alga').order_by('-fecha_registro')[:10]
-        
-        # Producción por semana (últimas 4 semanas) - de todos
-        produccion_por_semana = []
-        etiquetas_semanas = []
-        for i in range(4):
-            inicio = timezone.now() - timedelta(weeks=i+1)
-            fin = timezone.now() - timedelta(weeks=i)
-            total_semana = RegistroProduccion.objects.filter(
-                fecha_registro__gte=inicio,
-                fecha_registro__lt=fin
-            ).aggregate(total=Sum('cantidad_cosechada'))['total'] or 0
-            produccion_por_semana.insert(0, round(float(total_semana), 2))
-            # Crear etiqueta con rango de fechas
-            etiqueta = f"{inicio.strftime('%d/%m')} - {fin.strftime('%d/%m')}"
-            etiquetas_semanas.insert(0, etiqueta)
-        
-        # Producción por tipo de alga (todas las algas con producción, de todos)
-        produccion_por_tipo = TipoAlga.objects.annotate(
-            total=Sum('registros__cantidad_cosechada')
-        ).filter(total__gt=0).order_by('-total')
-        
-        # Capacidad del mes actual
-        capacidad_mes_actual = CapacidadProductiva.objects.filter(
-            mes__year=inicio_mes.year,
-            mes__month=inicio_mes.month
-        ).first()
-        
-        if capacidad_mes_actual:
-            capacidad_total = capacidad_mes_actual.capacidad_mensual_maxima
-        else:
-            capacidad_total = 2400  # Valor por defecto si no hay capacidad definida para el mes
-        
-        if capacidad_total > 0:
-            porcentaje_capacidad = round((float(produccion_total) / float(capacidad_total)) * 100, 1)
-        else:
-            porcentaje_capacidad = 0
     
     # Obtener permisos del usuario
     permisos = obtener_permisos_usuario(user)
     
     context = {
-        'total_registros': total_registros,
-        'produccion_semanal': produccion_semanal,
-        'produccion_total': produccion_total,
+        'total_registros': datos['total_registros'],
+        'produccion_semanal': datos['produccion_semanal'],
+        'produccion_total': datos['produccion_total'],
         'ultimos_registros': ultimos_registros,
         'user': user,  # Pasar objeto completo
         'username': user.username,
         'rol': user.rol,
         'permisos': permisos,
-        'produccion_por_semana': produccion_por_semana,
-        'etiquetas_semanas': etiquetas_semanas,
-        'produccion_por_tipo': produccion_por_tipo,
-        'capacidad_total': capacidad_total,
-        'porcentaje_capacidad': porcentaje_capacidad,
+        'produccion_por_semana': datos['produccion_por_semana'],
+        'etiquetas_semanas': datos['etiquetas_semanas'],
+        'produccion_por_tipo': datos['produccion_por_tipo'],
+        'capacidad_total': datos['capacidad_total'],
+        'porcentaje_capacidad': datos['porcentaje_capacidad'],
     }
     
     return render(request, 'gestion_algas/dashboard.html', context)
@@ -495,7 +483,7 @@ def dashboard(request):
 @requiere_permiso('registro_produccion')
 def registro_produccion(request):
     """Vista para registrar producción (Admin y Trabajador)"""
-    user = Usuario.objects.get(id=request.session.get('user_id'))
+    user = request.usuario
     
     if request.method == 'POST':
         form = RegistroProduccionForm(request.POST)
@@ -511,6 +499,7 @@ def registro_produccion(request):
     
     context = {
         'form': form,
+        'sectores': Sector.objects.filter(activo=True).only('nombre'),
         'user': user,
         'username': user.username,
         'rol': user.rol,
@@ -538,65 +527,113 @@ def eliminar_registro(request, registro_id):
     return redirect('dashboard')
 
 
+@requiere_permiso('registro_produccion')
+@usar_replica
+def listado_registros(request):
+    """
+    Listado paginado de registros de producción (Admin ve todos, Trabajador
+    los suyos). Pagina por cursor sobre (fecha_registro, id): cualquier
+    página cuesta lo mismo que la primera.
+    """
+    user = request.usuario
+    
+    registros = RegistroProduccion.objects.select_related('tipo_alga')
+    if user.rol != 'Administrador':
+        registros = registros.filter(usuario=user)
+    
+    # Filtros
+    filtros_fecha, fecha_desde, fecha_hasta = filtro_fechas(request, 'fecha_registro')
+    registros = registros.filter(**filtros_fecha)
+    
+    tipo_filtro = request.GET.get('tipo', '')
+    if tipo_filtro.isdigit():
+        registros = registros.filter(tipo_alga_id=tipo_filtro)
+    else:
+        tipo_filtro = ''
+    
+    # El sector llega por nombre y se filtra por el id del catálogo
+    sector_filtro = request.GET.get('sector', '').strip()
+    if sector_filtro:
+        sector_id = Sector.objects.filter(clave=clave_sector(sector_filtro)).values_list('id', flat=True).first()
+        registros = registros.filter(sector_catalogo_id=sector_id) if sector_id else registros.none()
+    
+    usuario_filtro = ''
+    if user.rol == 'Administrador':
+        usuario_filtro = request.GET.get('usuario', '').strip()
+        if usuario_filtro:
+            # Por el usuario (no por nombre_usuario) para usar el índice (usuario, -fecha_registro)
+            registros = registros.filter(usuario__username=usuario_filtro)
+    
+    paginador = PaginadorCursor(registros, 'fecha_registro', TAMANO_PAGINA_LISTADOS)
+    pagina = paginador.get_page(request.GET.get('cursor'))
+    
+    parametros = {
+        'fecha_desde': fecha_desde, 'fecha_hasta': fecha_hasta,
+        'tipo': tipo_filtro, 'sector': sector_filtro, 'usuario': usuario_filtro,
+    }
+    
+    context = {
+        'user': user,
+        'registros': pagina,
+        'cursor_ultima': paginador.cursor_ultima(),
+        'parametros': urlencode({clave: valor for clave, valor in parametros.items() if valor}),
+        'tipos_alga': TipoAlga.objects.filter(activo=True).only('nombre').order_by('nombre'),
+        'sectores': Sector.objects.filter(activo=True).only('nombre').order_by('nombre'),
+        'tipo_filtro': tipo_filtro,
+        'sector_filtro': sector_filtro,
+        'usuario_filtro': usuario_filtro,
+        'fecha_desde': fecha_desde,
+        'fecha_hasta': fecha_hasta,
+    }
+    
+    return render(request, 'gestion_algas/registros.html', context)
+
+
 @requiere_permiso('reportes', 'reportes_basicos')
+@usar_replica
 def reportes(request):
     """Vista de reportes y estadísticas (Admin y Trabajador)"""
-    user = Usuario.objects.get(id=request.session.get('user_id'))
+    user = request.usuario
     
     # Búsqueda
     busqueda = request.GET.get('busqueda', '')
     
-    # Producción por tipo de alga
-    reporte_tipos = TipoAlga.objects.annotate(
-        total_cosechado=Sum('registros__cantidad_cosechada'),
-        total_registros=Count('registros')
-    ).filter(total_cosechado__isnull=False)
+    # Producción por tipo de alga (totales mantenidos en cada tipo)
+    reporte_tipos = TipoAlga.objects.filter(total_registros__gt=0)
     
     if busqueda:
         reporte_tipos = reporte_tipos.filter(nombre__icontains=busqueda)
     
-    # Producción por semana (últimas 8 semanas) con fechas de inicio y fin
-    hace_8_semanas = timezone.now() - timedelta(weeks=8)
-    registros = RegistroProduccion.objects.filter(
-        fecha_registro__gte=hace_8_semanas
-    ).order_by('-fecha_registro')
-    
-    # Agrupar por semanas de 7 días
-    semanas_dict = {}
-    for registro in registros:
-        # Calcular el inicio de la semana (lunes)
-        dias_desde_lunes = registro.fecha_registro.weekday()
-        inicio_semana = (registro.fecha_registro - timedelta(days=dias_desde_lunes)).date()
-        fin_semana = inicio_semana + timedelta(days=6)
-        
-        semana_key = inicio_semana.strftime('%Y-%m-%d')
-        
-        if semana_key not in semanas_dict:
-            semanas_dict[semana_key] = {
-                'inicio': inicio_semana,
-                'fin': fin_semana,
-                'total_cosechado': 0,
-                'registros_count': 0
-            }
-        
-        semanas_dict[semana_key]['total_cosechado'] += float(registro.cantidad_cosechada)
-        semanas_dict[semana_key]['registros_count'] += 1
-    
-    # Convertir a lista ordenada
-    reporte_semanas = [
-        {
-            'inicio': data['inicio'],
-            'fin': data['fin'],
-            'total_cosechado': data['total_cosechado'],
-            'registros_count': data['registros_count']
-        }
-        for semana_key, data in sorted(semanas_dict.items(), reverse=True)
-    ]
-    
-    # Paginacion para semanas
-    paginator = Paginator(reporte_semanas, 5)
+    # Producción por semana (por defecto últimas 8 semanas, hasta 2 años)
+    try:
+        semanas = int(request.GET.get('semanas', SEMANAS_REPORTE))
+    except ValueError:
+        semanas = SEMANAS_REPORTE
+    semanas = min(max(semanas, 1), MAX_SEMANAS_REPORTE)
+    
+    # La ventana parte un lunes a medianoche (hora local) para no cortar semanas
+    hoy = timezone.localdate()
+    inicio_ventana = inicio_periodo(hoy, 'semana') - timedelta(weeks=semanas - 1)
+    
+    # Agrupar por semana (lunes, hora local) en la base de datos; la ventana
+    # termina hoy, los registros con fecha futura no entran
+    inicio, fin = rango_fechas(inicio_ventana, hoy)
+    reporte_semanas = agrupar_por_periodo(
+        RegistroProduccion.objects.filter(fecha_registro__gte=inicio, fecha_registro__lt=fin),
+        'semana', inicio_ventana, hoy,
+        total_cosechado=Sum('cantidad_cosechada'),
+        registros_count=Count('id')
+    ).order_by('-periodo')
+    
+    # Paginación en memoria: son a lo más MAX_SEMANAS_REPORTE filas agrupadas,
+    # se leen de una vez y Paginator no hace COUNT ni OFFSET sobre una lista
+    paginator = Paginator(list(reporte_semanas), 5)
     page_number = request.GET.get('page')
     semanas_page = paginator.get_page(page_number)
+    semanas_page.object_list = [
+        dict(semana, inicio=semana['periodo'], fin=semana['periodo'] + timedelta(days=6))
+        for semana in semanas_page.object_list
+    ]
     
     # Obtener permisos del usuario para mostrar/ocultar secciones
     permisos_usuario = obtener_permisos_usuario(user)
@@ -607,6 +644,8 @@ def reportes(request):
         'reporte_semanas': semanas_page,
         'permisos_usuario': permisos_usuario,
         'busqueda': busqueda,
+        'semanas': semanas,
+        'opciones_semanas': [8, 26, 52, 104],
     }
     
     return render(request, 'gestion_algas/reportes.html', context)
@@ -615,10 +654,6 @@ def reportes(request):
 @requiere_permiso('reportes')
 def generar_pdf_semanal(request):
     """Genera PDF de producción semanal"""
-    from django.template.loader import render_to_string
-    from django.http import HttpResponse
-    from datetime import datetime
-    
     # Obtener parámetros de la semana
     inicio_str = request.GET.get('inicio')
     fin_str = request.GET.get('fin')
@@ -634,78 +669,29 @@ def generar_pdf_semanal(request):
         messages.error(request, 'Formato de fecha inválido')
         return redirect('reportes')
     
-    # Convertir a datetime para las consultas
-    from django.utils import timezone as tz
-    inicio_dt = tz.make_aware(datetime.combine(inicio, datetime.min.time()))
-    fin_dt = tz.make_aware(datetime.combine(fin, datetime.max.time()))
-    
-    # Obtener todos los registros de la semana
-    registros = RegistroProduccion.objects.filter(
-        fecha_registro__gte=inicio_dt,
-        fecha_registro__lte=fin_dt
-    ).select_related('tipo_alga', 'usuario').order_by('fecha_registro')
-    
-    # Agrupar por tipo de alga
-    produccion_por_tipo = {}
-    total_general = 0
-    
-    for registro in registros:
-        tipo = registro.tipo_alga.nombre
-        if tipo not in produccion_por_tipo:
-            produccion_por_tipo[tipo] = {
-                'cantidad': 0,
-                'registros': []
-            }
-        produccion_por_tipo[tipo]['cantidad'] += float(registro.cantidad_cosechada)
-        produccion_por_tipo[tipo]['registros'].append(registro)
-        total_general += float(registro.cantidad_cosechada)
-    
-    context = {
-        'inicio': inicio,
-        'fin': fin,
-        'produccion_por_tipo': produccion_por_tipo,
-        'total_general': total_general,
-        'registros': registros,
-        'fecha_generacion': timezone.now(),
-    }
+    # Generación en segundo plano: responder de inmediato con el estado del trabajo
+    if settings.REPORTES_EN_SEGUNDO_PLANO:
+        trabajo = encolar_pdf_semanal(inicio, fin, request.usuario)
+        return redirect('estado_trabajo_reporte', trabajo_id=trabajo.id)
     
     try:
-        from xhtml2pdf import pisa
-        from io import BytesIO
-        
-        # Renderizar template
-        html_string = render_to_string('gestion_algas/pdf_semanal.html', context, request=request)
-        
-        # Crear respuesta PDF
-        response = HttpResponse(content_type='application/pdf')
-        filename = f'produccion_semanal_{inicio.strftime("%Y%m%d")}_{fin.strftime("%Y%m%d")}.pdf'
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        # Generar PDF con encoding UTF-8 usando BytesIO
-        pisa_status = pisa.CreatePDF(
-            BytesIO(html_string.encode('utf-8')),
-            dest=response,
-            encoding='utf-8'
-        )
-        
-        if pisa_status.err:
-            messages.error(request, 'Error al generar el PDF')
-            return redirect('reportes')
-        
-        return response
-    except ImportError:
-        messages.error(request, 'xhtml2pdf no está instalado. Ejecuta: pip install xhtml2pdf')
+        contenido, filename, content_type = exportar_pdf_semanal(inicio, fin)
+    except ErrorExportacion as e:
+        messages.error(request, str(e))
         return redirect('reportes')
     except Exception as e:
         messages.error(request, f'Error al generar PDF: {str(e)}')
         return redirect('reportes')
-
+    
+    response = HttpResponse(contenido, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 
 @solo_admin
 def usuarios(request):
     """Vista de gestión de usuarios (solo admin)"""
-    user = Usuario.objects.get(id=request.session.get('user_id'))
+    user = request.usuario
     
     if request.method == 'POST':
         form = UsuarioCreationForm(request.POST)
@@ -727,12 +713,9 @@ def usuarios(request):
             Q(rol__icontains=busqueda)
         )
     
-    lista_usuarios = lista_usuarios.order_by('username')
-    
-    # Paginación
-    paginator = Paginator(lista_usuarios, 5)
-    page_number = request.GET.get('page')
-    usuarios_page = paginator.get_page(page_number)
+    # Paginación por cursor sobre (username, id), sin OFFSET
+    paginador = PaginadorCursor(lista_usuarios, 'username', 5, descendente=False)
+    usuarios_page = paginador.get_page(request.GET.get('cursor'))
     
     context = {
         'user': user,
@@ -751,7 +734,7 @@ def eliminar_usuario(request, usuario_id):
         usuario = get_object_or_404(Usuario, id=usuario_id)
         
         # No permitir eliminar el propio usuario
-        if usuario == request.user:
+        if usuario == request.usuario:
             messages.error(request, 'No puedes eliminar tu propio usuario')
             return redirect('usuarios')
         
@@ -762,35 +745,173 @@ def eliminar_usuario(request, usuario_id):
     return redirect('usuarios')
 
 
-@login_required
+@solo_admin
+@usar_replica
+def auditoria(request):
+    """
+    Auditoría de accesos al sistema (solo admin), paginada por cursor sobre
+    (fecha_acceso, id).
+    """
+    user = request.usuario
+    
+    accesos = ControlAcceso.objects.select_related('usuario')
+    
+    # Filtros
+    filtros_fecha, fecha_desde, fecha_hasta = filtro_fechas(request, 'fecha_acceso')
+    accesos = accesos.filter(**filtros_fecha)
+    
+    usuario_filtro = request.GET.get('usuario', '').strip()
+    if usuario_filtro:
+        accesos = accesos.filter(usuario__username=usuario_filtro)
+    
+    ip_filtro = request.GET.get('ip', '').strip()
+    if ip_filtro:
+        accesos = accesos.filter(ip_origen=ip_filtro)
+    
+    # Estadísticas por tipo en una sola consulta, antes de filtrar por tipo
+    stats = accesos.order_by().aggregate(**{
+        tipo: Count('id', filter=Q(tipo_acceso=tipo))
+        for tipo, _ in ControlAcceso.TIPOS_ACCESO
+    })
+    
+    tipo_filtro = request.GET.get('tipo', '')
+    if tipo_filtro in stats:
+        accesos = accesos.filter(tipo_acceso=tipo_filtro)
+        total_accesos = stats[tipo_filtro]
+    else:
+        tipo_filtro = ''
+        total_accesos = sum(stats.values())
+    
+    paginador = PaginadorCursor(accesos, 'fecha_acceso', TAMANO_PAGINA_LISTADOS)
+    pagina = paginador.get_page(request.GET.get('cursor'))
+    
+    parametros = {
+        'tipo': tipo_filtro, 'usuario': usuario_filtro, 'ip': ip_filtro,
+        'fecha_desde': fecha_desde, 'fecha_hasta': fecha_hasta,
+    }
+    
+    context = {
+        'user': user,
+        'accesos': pagina,
+        'page_obj': pagina,
+        'cursor_ultima': paginador.cursor_ultima(),
+        'parametros': urlencode({clave: valor for clave, valor in parametros.items() if valor}),
+        'total_accesos': total_accesos,
+        'stats': stats,
+        'tipo_filtro': tipo_filtro,
+        'usuario_filtro': usuario_filtro,
+        'ip_filtro': ip_filtro,
+        'fecha_desde': fecha_desde,
+        'fecha_hasta': fecha_hasta,
+    }
+    
+    return render(request, 'gestion_algas/auditoria.html', context)
+
+
+def _consulta_api_produccion(request):
+    """
+    Lee desde/hasta (AAAA-MM-DD), tipo (id) y sector de la petición y
+    retorna (consulta, etag, última modificación, error, (desde, hasta)). Se calcula una
+    vez por petición y lo comparten las funciones de @condition y la vista.
+    """
+    if hasattr(request, '_consulta_api_produccion'):
+        return request._consulta_api_produccion
+    
+    resultado = None
+    hasta = timezone.localdate()
+    desde = hasta - timedelta(days=DIAS_API_PRODUCCION)
+    try:
+        if request.GET.get('hasta'):
+            hasta = datetime.strptime(request.GET['hasta'], '%Y-%m-%d').date()
+        if request.GET.get('desde'):
+            desde = datetime.strptime(request.GET['desde'], '%Y-%m-%d').date()
+        tipo = int(request.GET['tipo']) if request.GET.get('tipo') else None
+    except ValueError:
+        resultado = (None, None, None, 'Parámetros inválidos: use desde/hasta AAAA-MM-DD y tipo numérico', None)
+    else:
+        if desde > hasta:
+            resultado = (None, None, None, 'La fecha desde debe ser anterior a hasta', None)
+        elif (hasta - desde).days > MAX_DIAS_API_PRODUCCION:
+            resultado = (None, None, None, f'El período no puede superar {MAX_DIAS_API_PRODUCCION} días', None)
+    
+    if resultado is None:
+        # El sector llega por nombre y se filtra por el id del catálogo
+        sector = request.GET.get('sector', '').strip()
+        sector_id = None
+        if sector:
+            sector_id = Sector.objects.filter(clave=clave_sector(sector)).values_list('id', flat=True).first()
+        query = registros_periodo(desde, hasta, tipo, sector_id)
+        if sector and sector_id is None:
+            query = query.none()
+        etag, ultima_modificacion = version_registros(query, f'{desde}:{hasta}:{tipo}:{sector}')
+        resultado = (query, etag, ultima_modificacion, None, (desde, hasta))
+    
+    request._consulta_api_produccion = resultado
+    return resultado
+
+
+@requiere_permiso('reportes')
+@usar_replica
+@cache_control(private=True, no_cache=True)
+@condition(
+    etag_func=lambda request: _consulta_api_produccion(request)[1],
+    last_modified_func=lambda request: _consulta_api_produccion(request)[2],
+)
 def api_produccion_semanal(request):
-    """API JSON para gráficos de producción semanal"""
-    hace_30_dias = timezone.now() - timedelta(days=30)
-    
-    datos = RegistroProduccion.objects.filter(
-        fecha_registro__gte=hace_30_dias
-    ).extra(
-        select={'fecha': 'DATE(fecha_registro)'}
-    ).values('fecha').annotate(
-        total=Sum('cantidad_cosechada')
-    ).order_by('fecha')
-    
-    # Convertir a lista para JSON
-    resultado = [
-        {
-            'fecha': str(item['fecha']),
-            'total': float(item['total'])
-        }
-        for item in datos
-    ]
+    """
+    API JSON para gráficos de producción: total cosechado por día.
+    
+    Acepta desde/hasta (por defecto los últimos 30 días), tipo y sector.
+    Responde con ETag y Last-Modified y con 304 si los registros no
+    cambiaron desde la última consulta del cliente.
+    """
+    query, etag, _, error, periodo = _consulta_api_produccion(request)
+    if error:
+        return JsonResponse({'error': error}, status=400)
+    
+    desde, hasta = periodo
+    return JsonResponse(produccion_diaria(query, desde, hasta, etag), safe=False)
+
+
+@requiere_permiso('registro_produccion')
+def api_ingesta_registros(request):
+    """
+    API JSON para cargar varios registros de producción en una petición.
+    
+    Recibe una lista de objetos con tipo_alga (nombre), cantidad_cosechada,
+    sector y opcionalmente observaciones, fecha_registro y usuario (solo
+    administradores). Si alguna fila tiene errores no se guarda nada, salvo
+    con ?parcial=1, que guarda las filas válidas.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    
+    try:
+        filas = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'El cuerpo no es un JSON válido'}, status=400)
+    
+    if not isinstance(filas, list):
+        return JsonResponse({'error': 'Se esperaba una lista de registros'}, status=400)
+    if len(filas) > MAX_FILAS_INGESTA:
+        return JsonResponse({'error': f'Máximo {MAX_FILAS_INGESTA} registros por petición'}, status=400)
+    
+    user = request.usuario
+    resultado = ingresar_registros(
+        filas,
+        usuario=user,
+        permitir_otro_usuario=user.rol == 'Administrador',
+        omitir_errores=request.GET.get('parcial') == '1'
+    )
     
-    return JsonResponse(resultado, safe=False)
+    status = 400 if resultado['errores'] and not resultado['creados'] else 201
+    return JsonResponse(resultado, status=status)
 
 
 @permiso_lectura_escritura('capacidad_productiva', requiere_escritura=True)
 def capacidad_productiva(request):
     """Vista de gestión de capacidad productiva (solo admin puede crear/editar)"""
-    user = Usuario.objects.get(id=request.session.get('user_id'))
+    user = request.usuario
     
     if request.method == 'POST':
         form = CapacidadProductivaForm(request.POST)
@@ -802,7 +923,7 @@ def capacidad_productiva(request):
         form = CapacidadProductivaForm()
     
     # Listar capacidades existentes
-    capacidades = CapacidadProductiva.objects.all().order_by('-mes')
+    capacidades = CapacidadProductiva.objects.con_volumen_producido().order_by('-mes')
     
     context = {
         'user': user,
@@ -851,7 +972,7 @@ def eliminar_capacidad(request, capacidad_id):
 @permiso_lectura_escritura('configuracion_reportes', requiere_escritura=False)
 def configuracion_reportes(request):
     """Vista de gestión de configuraciones de reportes (solo admin puede crear/editar)"""
-    user = Usuario.objects.get(id=request.session.get('user_id'))
+    user = request.usuario
     
     # Solo admin puede crear/editar
     if request.method == 'POST':
@@ -879,12 +1000,9 @@ def configuracion_reportes(request):
             Q(email__icontains=busqueda)
         )
     
-    configuraciones = configuraciones.order_by('-fecha_creacion')
-    
-    # Paginación
-    paginator = Paginator(configuraciones, 5)
-    page_number = request.GET.get('page')
-    configuraciones_page = paginator.get_page(page_number)
+    # Paginación por cursor sobre (fecha_creacion, id), las más recientes primero
+    paginador = PaginadorCursor(configuraciones, 'fecha_creacion', 5)
+    configuraciones_page = paginador.get_page(request.GET.get('cursor'))
     
     # Verificar si el usuario puede editar
     puede_editar = user.rol == 'Administrador'
@@ -905,8 +1023,7 @@ def editar_configuracion(request, config_id):
     """Editar configuración de reporte (solo admin)"""
     configuracion = get_object_or_404(ConfiguracionReporte, id=config_id)
     
-    # Obtener usuario desde la sesión (sistema de autenticación personalizado)
-    user = Usuario.objects.get(id=request.session.get('user_id'))
+    user = request.usuario
     
     if request.method == 'POST':
         form = ConfiguracionReporteForm(request.POST, instance=configuracion)
@@ -942,235 +1059,118 @@ def eliminar_configuracion(request, config_id):
 
 
 @requiere_permiso('reportes', 'configuracion_reportes')
+@usar_replica
 def generar_reporte_personalizado(request, config_id):
     """Generar reporte personalizado según configuración del cliente (solo admin)"""
-    configuracion = get_object_or_404(ConfiguracionReporte, id=config_id)
+    configuracion = get_object_or_404(ConfiguracionReporte.objects.con_filtros(), id=config_id)
     
     # Determinar período de tiempo
-    if configuracion.usar_fecha_personalizada and configuracion.fecha_desde and configuracion.fecha_hasta:
-        fecha_desde = timezone.make_aware(datetime.combine(configuracion.fecha_desde, datetime.min.time()))
-        fecha_hasta = timezone.make_aware(datetime.combine(configuracion.fecha_hasta, datetime.max.time()))
+    fecha_desde, fecha_hasta = periodo_reporte(configuracion)
+    
+    # Generación en segundo plano: responder de inmediato con el estado del trabajo
+    if settings.REPORTES_EN_SEGUNDO_PLANO and configuracion.formato_preferido in ('pdf', 'excel'):
+        trabajo = encolar_reporte_personalizado(configuracion, fecha_desde, fecha_hasta, request.usuario)
+        return redirect('estado_trabajo_reporte', trabajo_id=trabajo.id)
+    
+    # Los filtros se evalúan una vez para la caché, el archivo y el HTML
+    consulta = ConsultaReporte(configuracion, fecha_desde, fecha_hasta)
+    
+    # Reportes de rangos cerrados: servir el archivo ya generado si existe
+    formato = formato_archivo(configuracion)
+    clave = cache_reportes.clave_reporte(consulta) if formato else None
+    if clave:
+        archivo = cache_reportes.abrir(clave, formato)
+        if archivo:
+            filename, content_type = nombre_archivo_reporte(configuracion)
+            return FileResponse(archivo, as_attachment=True,
+                                filename=filename, content_type=content_type)
+    
+    # Renderizar según formato
+    try:
+        contenido, filename, content_type = exportar_reporte_personalizado(consulta)
+        if clave:
+            cache_reportes.guardar(clave, formato, contenido)
+    except DependenciaNoInstalada as e:
+        messages.warning(request, f'{e}. Mostrando reporte en HTML.')
+    except ErrorExportacion:
+        if configuracion.formato_preferido in ('pdf', 'excel'):
+            messages.warning(request, 'Error al generar el archivo. Mostrando reporte en HTML.')
     else:
-        fecha_hasta = timezone.now()
-        fecha_desde = fecha_hasta - timedelta(days=30 * configuracion.periodo_historial_meses)
-    
-    # Obtener datos de producción con filtros
-    produccion_historial = None
-    produccion_por_mes = None
-    if configuracion.mostrar_historial_produccion:
-        query = RegistroProduccion.objects.filter(
-            fecha_registro__gte=fecha_desde,
-            fecha_registro__lte=fecha_hasta
-        )
-        
-        # Filtrar por tipos de alga si están especificados
-        tipos_seleccionados = configuracion.tipos_alga.all()
-        if tipos_seleccionados.exists():
-            query = query.filter(tipo_alga__in=tipos_seleccionados)
-        
-        # Filtrar por sectores si están especificados
-        if configuracion.sectores_especificos:
-            sectores = [s.strip() for s in configuracion.sectores_especificos.split(',')]
-            query = query.filter(sector__in=sectores)
-        
-        produccion_historial = query.values('tipo_alga__nombre').annotate(
-            total_cosechado=Sum('cantidad_cosechada'),
-            total_registros=Count('id')
-        ).order_by('-total_cosechado')
-        
-        # Datos para gráficos - usando RawSQL para compatibilidad con MySQL sin timezone
-        from django.db.models import Value
-        from django.db.models.functions import Concat, Substr
-        
-        produccion_por_mes = query.annotate(
-            mes=Concat(
-                Substr('fecha_registro', 1, 7),  # YYYY-MM
-                Value('-01')  # Agregar día para crear fecha completa
-            )
-        ).values('mes').annotate(
-            total=Sum('cantidad_cosechada')
-        ).order_by('mes')
-    
-    # Factor de conversión según unidad (definir ANTES de usarlo)
-    factor_conversion = 1
-    if configuracion.unidad_medida == 'ton':
-        factor_conversion = 0.001  # kg a toneladas
-    elif configuracion.unidad_medida == 'lb':
-        factor_conversion = 2.20462  # kg a libras
-    
-    # Obtener capacidad productiva y convertir valores
-    capacidad_actual = None
-    capacidad_convertida = None
-    if configuracion.mostrar_capacidad_instalada or configuracion.mostrar_disponibilidad:
-        # Intentar obtener la capacidad del mes del periodo final del reporte
-        capacidad_actual = CapacidadProductiva.objects.filter(
-            mes__year=fecha_hasta.year,
-            mes__month=fecha_hasta.month
-        ).first()
-        
-        # Si no existe capacidad para ese mes, buscar la más cercana anterior
-        if not capacidad_actual:
-            capacidad_actual = CapacidadProductiva.objects.filter(
-                mes__lte=fecha_hasta
-            ).order_by('-mes').first()
-        
-        if capacidad_actual:
-            # Convertir valores según unidad de medida
-            capacidad_convertida = {
-                'capacidad_mensual_maxima': float(capacidad_actual.capacidad_mensual_maxima) * factor_conversion,
-                'volumen_producido': float(capacidad_actual.volumen_producido) * factor_conversion,
-                'disponibilidad_mensual': float(capacidad_actual.disponibilidad_mensual) * factor_conversion,
-                'porcentaje_utilizado': capacidad_actual.porcentaje_utilizado,
-                'porcentaje_disponible': capacidad_actual.porcentaje_disponible,
-            }
-    
-    # Obtener registros detallados si incluyen observaciones
-    registros_detallados = None
-    if configuracion.incluir_observaciones:
-        query_detalle = RegistroProduccion.objects.filter(
-            fecha_registro__gte=fecha_desde,
-            fecha_registro__lte=fecha_hasta
-        )
-        
-        tipos_seleccionados = configuracion.tipos_alga.all()
-        if tipos_seleccionados.exists():
-            query_detalle = query_detalle.filter(tipo_alga__in=tipos_seleccionados)
-        
-        if configuracion.sectores_especificos:
-            sectores = [s.strip() for s in configuracion.sectores_especificos.split(',')]
-            query_detalle = query_detalle.filter(sector__in=sectores)
-        
-        registros_detallados = query_detalle.select_related('tipo_alga', 'usuario').order_by('-fecha_registro')[:50]
+        response = HttpResponse(contenido, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
     
-    context = {
-        'configuracion': configuracion,
-        'produccion_historial': produccion_historial,
-        'produccion_por_mes': produccion_por_mes,
-        'capacidad_actual': capacidad_actual,
-        'capacidad_convertida': capacidad_convertida,
-        'factor_conversion': factor_conversion,
-        'fecha_desde': fecha_desde,
-        'fecha_hasta': fecha_hasta,
-        'fecha_generacion': timezone.now(),
-        'registros_detallados': registros_detallados,
-    }
+    return render(request, 'gestion_algas/reporte_personalizado.html', consulta.contexto)
+
+
+@requiere_permiso('reportes', 'configuracion_reportes')
+def exportar_registros(request, config_id):
+    """Exportar en streaming (CSV o NDJSON) todos los registros que cumplen los filtros de la configuración"""
+    configuracion = get_object_or_404(ConfiguracionReporte.objects.con_filtros(), id=config_id)
+    formato = request.GET.get('formato', 'csv')
     
-    # Renderizar según formato
-    if configuracion.formato_preferido == 'pdf' or configuracion.formato_preferido == 'ambos':
-        # Generar PDF con xhtml2pdf (más compatible con Windows)
-        from django.template.loader import render_to_string
-        from django.http import HttpResponse
-        try:
-            from xhtml2pdf import pisa
-            from io import BytesIO
-            
-            # Renderizar template PDF optimizado (sin gráficos para mejor compatibilidad)
-            html_string = render_to_string('gestion_algas/reporte_pdf.html', context, request=request)
-            
-            # Crear respuesta PDF
-            response = HttpResponse(content_type='application/pdf')
-            filename = 'reporte_{}_{}.pdf'.format(
-                configuracion.empresa.replace(' ', '_'),
-                timezone.now().strftime('%Y%m%d')
-            )
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
-            
-            # Convertir HTML a PDF con encoding UTF-8 usando BytesIO
-            pisa_status = pisa.CreatePDF(
-                BytesIO(html_string.encode('utf-8')),
-                dest=response,
-                encoding='utf-8'
-            )
-            
-            if pisa_status.err:
-                messages.warning(request, 'Error al generar PDF. Mostrando reporte en HTML.')
-                return render(request, 'gestion_algas/reporte_personalizado.html', context)
-            
-            return response
-            
-        except ImportError:
-            messages.warning(request, 'xhtml2pdf no está instalado. Mostrando reporte en HTML.')
-            messages.info(request, 'Para generar PDFs, instala: pip install xhtml2pdf')
-            return render(request, 'gestion_algas/reporte_personalizado.html', context)
+    if formato not in FORMATOS_EXPORTACION:
+        messages.error(request, 'Formato de exportación no soportado')
+        return redirect('configuracion_reportes')
     
-    elif configuracion.formato_preferido == 'excel':
-        # Generar Excel
-        try:
-            from openpyxl import Workbook
-            from openpyxl.styles import Font, PatternFill, Alignment
-            from django.http import HttpResponse
-            
-            wb = Workbook()
-            ws = wb.active
-            ws.title = 'Reporte de Producción'
-            
-            # Encabezado
-            ws.merge_cells('A1:E1')
-            header_cell = ws['A1']
-            header_cell.value = f'Reporte de Producción - {configuracion.empresa}'
-            header_cell.font = Font(size=16, bold=True)
-            header_cell.alignment = Alignment(horizontal='center')
-            
-            # Información general
-            row = 3
-            ws[f'A{row}'] = 'País:'
-            ws[f'B{row}'] = configuracion.pais
-            row += 1
-            ws[f'A{row}'] = 'Período:'
-            periodo_texto = '{} - {}'.format(
-                fecha_desde.strftime('%d/%m/%Y'),
-                fecha_hasta.strftime('%d/%m/%Y')
-            )
-            ws[f'B{row}'] = periodo_texto
-            row += 1
-            ws[f'A{row}'] = 'Fecha de Generación:'
-            ws[f'B{row}'] = timezone.now().strftime('%d/%m/%Y %H:%M')
-            row += 2
-            
-            # Tabla de producción
-            if produccion_historial:
-                headers = ['Tipo de Alga', f'Total Cosechado ({configuracion.get_unidad_medida_display()})', 'Total Registros']
-                for col, header in enumerate(headers, start=1):
-                    cell = ws.cell(row=row, column=col)
-                    cell.value = header
-                    cell.font = Font(bold=True)
-                    cell.fill = PatternFill(start_color='CCCCCC', end_color='CCCCCC', fill_type='solid')
-                
-                row += 1
-                for item in produccion_historial:
-                    ws.cell(row=row, column=1, value=item['tipo_alga__nombre'])
-                    ws.cell(row=row, column=2, value=float(item['total_cosechado']) * factor_conversion)
-                    ws.cell(row=row, column=3, value=item['total_registros'])
-                    row += 1
-            
-            # Ajustar anchos de columna
-            for col in range(1, 6):
-                ws.column_dimensions[chr(64 + col)].width = 20
-            
-            # Crear respuesta HTTP
-            response = HttpResponse(
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
-            filename = 'reporte_{}_{}.xlsx'.format(
-                configuracion.empresa,
-                timezone.now().strftime('%Y%m%d')
-            )
-            response['Content-Disposition'] = f'attachment; filename=\"{filename}\"'
-            wb.save(response)
-            return response
-            
-        except ImportError:
-            messages.warning(request, 'openpyxl no está instalado. Mostrando reporte en HTML.')
-            return render(request, 'gestion_algas/reporte_personalizado.html', context)
+    fecha_desde, fecha_hasta = periodo_reporte(configuracion)
+    query = registros_filtrados(configuracion, fecha_desde, fecha_hasta)
     
-    else:
-        return render(request, 'gestion_algas/reporte_personalizado.html', context)
+    response = StreamingHttpResponse(
+        lineas_exportacion(query, formato),
+        content_type=FORMATOS_EXPORTACION[formato]
+    )
+    filename = 'registros_{}_{}.{}'.format(
+        configuracion.empresa.replace(' ', '_'),
+        timezone.now().strftime('%Y%m%d'),
+        formato
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def trabajos_visibles(usuario):
+    """Trabajos de reporte que puede ver el usuario: todos si es admin, si no solo los que solicitó"""
+    trabajos = TrabajoReporte.objects.all()
+    if usuario.rol != 'Administrador':
+        trabajos = trabajos.filter(usuario=usuario)
+    return trabajos
+
+
+@requiere_permiso('reportes', 'configuracion_reportes')
+def estado_trabajo_reporte(request, trabajo_id):
+    """Estado de un trabajo de reporte en segundo plano (HTML o JSON con ?formato=json)"""
+    trabajo = get_object_or_404(trabajos_visibles(request.usuario), id=trabajo_id)
+    
+    if request.GET.get('formato') == 'json':
+        return JsonResponse({
+            'id': trabajo.id,
+            'estado': trabajo.estado,
+            'terminado': trabajo.terminado,
+            'error': trabajo.error,
+            'descarga': reverse('descargar_trabajo_reporte', args=[trabajo.id])
+                        if trabajo.estado == 'completado' else None,
+        })
+    
+    return render(request, 'gestion_algas/trabajo_reporte.html', {'trabajo': trabajo})
+
+
+@requiere_permiso('reportes', 'configuracion_reportes')
+def descargar_trabajo_reporte(request, trabajo_id):
+    """Descargar el archivo generado por un trabajo de reporte"""
+    trabajo = get_object_or_404(trabajos_visibles(request.usuario), id=trabajo_id, estado='completado')
+    return FileResponse(
+        trabajo.archivo.open('rb'),
+        as_attachment=True,
+        filename=trabajo.nombre_archivo,
+        content_type=trabajo.content_type
+    )
 
 
 @solo_admin
 def tipos_alga(request):
     """Vista de gestión de tipos de alga (solo admin)"""
-    user = Usuario.objects.get(id=request.session.get('user_id'))
+    user = request.usuario
     
     if request.method == 'POST':
         form = TipoAlgaForm(request.POST)
@@ -1191,22 +1191,25 @@ def tipos_alga(request):
             Q(descripcion__icontains=busqueda)
         )
     
-    lista_tipos = lista_tipos.order_by('nombre')
-    
-    tipos_activos = lista_tipos.filter(activo=True).count()
-    total_registros = sum(tipo.registros.count() for tipo in lista_tipos)
+    # Totales de la lista filtrada en una sola consulta; los registros, kg y
+    # última cosecha de cada tipo son contadores del propio tipo
+    totales = lista_tipos.aggregate(
+        total_tipos=Count('id'),
+        tipos_activos=Count('id', filter=Q(activo=True)),
+        total_registros=Sum('total_registros'),
+    )
     
-    # Paginación
-    paginator = Paginator(lista_tipos, 5)
-    page_number = request.GET.get('page')
-    tipos_page = paginator.get_page(page_number)
+    # Paginación por cursor sobre (nombre, id), sin COUNT ni OFFSET
+    paginador = PaginadorCursor(lista_tipos, 'nombre', 5, descendente=False)
+    tipos_page = paginador.get_page(request.GET.get('cursor'))
 
     context = {
         'user': user,
         'form': form,
         'tipos_alga': tipos_page,
-        'tipos_activos': tipos_activos,
-        'total_registros': total_registros,
+        'total_tipos': totales['total_tipos'],
+        'tipos_activos': totales['tipos_activos'],
+        'total_registros': totales['total_registros'] or 0,
         'busqueda': busqueda,
     }
 
@@ -1217,7 +1220,7 @@ def tipos_alga(request):
 def editar_tipo_alga(request, tipo_id):
     """Editar un tipo de alga (solo admin)"""
     tipo_alga = get_object_or_404(TipoAlga, id=tipo_id)
-    user = Usuario.objects.get(id=request.session.get('user_id'))
+    user = request.usuario
     
     if request.method == 'POST':
         form = TipoAlgaForm(request.POST, instance=tipo_alga)
@@ -1245,14 +1248,16 @@ def eliminar_tipo_alga(request, tipo_id):
     if request.method == 'POST':
         tipo_alga = get_object_or_404(TipoAlga, id=tipo_id)
         
-        # Guardar el nombre del tipo de alga en todos los registros antes de eliminar
-        for registro in tipo_alga.registros.all():
-            if not registro.nombre_tipo_alga:
-                registro.nombre_tipo_alga = tipo_alga.nombre
-                registro.save(update_fields=['nombre_tipo_alga'])
-        
         nombre = tipo_alga.nombre
-        tipo_alga.delete()
+        with transaction.atomic():
+            # Guardar el nombre del tipo de alga en todos los registros antes de
+            # eliminar, con un solo UPDATE. Los registros conservan mes y cantidad,
+            # así que ProduccionMensual no cambia; los resúmenes del tipo
+            # (ProduccionMensualTipo) se eliminan en cascada junto con él.
+            tipo_alga.registros.filter(
+                Q(nombre_tipo_alga__isnull=True) | Q(nombre_tipo_alga='')
+            ).update(nombre_tipo_alga=nombre)
+            tipo_alga.delete()
         messages.success(request, f'Tipo de alga "{nombre}" eliminado correctamente')
     
     return redirect('tipos_alga')
@@ -1279,7 +1284,7 @@ def toggle_tipo_alga(request, tipo_id):
 @requiere_permiso('dashboard')
 def perfil_usuario(request):
     """Vista para mostrar y editar el perfil del usuario logueado"""
-    user = Usuario.objects.get(id=request.session.get('user_id'))
+    user = request.usuario
     
     if request.method == 'POST':
         # Obtener datos del formulario
@@ -7,6 +7,7 @@ Sistema de Gestión de Algas - Configuración completa
 
 from pathlib import Path
 import os
+import sys
 import pymysql
 pymysql.install_as_MySQLdb()
 
@@ -40,6 +41,9 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'gestion_algas.middleware.RenovarSesionMiddleware',  # vencimiento deslizante
+    'gestion_algas.middleware.UsuarioSesionMiddleware',  # request.usuario
+    'gestion_algas.middleware.FijarPrimariaMiddleware',  # leer lo propio tras escribir
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -69,16 +73,58 @@ WSGI_APPLICATION = 'sistema_algas.wsgi.application'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
 # Configuración para MySQL (local o Clever Cloud)
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': 'bqdnieilyetbny8w8pae', 
-        'USER': 'ulfdx05ailcjf4rp',     
-        'PASSWORD': '8ggl3dO3Zxxzhm0jXrqs', 
-        'HOST': 'bqdnieilyetbny8w8pae-mysql.services.clever-cloud.com',  
-        'PORT': '3306',           
+# Base de datos: MySQL remoto por defecto, configurable con variables de entorno.
+# DB_ENGINE=sqlite usa un archivo local (DB_NAME), útil para pruebas y benchmarks.
+# Las conexiones se reutilizan entre peticiones por DB_CONN_MAX_AGE segundos
+# (0 = una conexión por petición) y se verifican antes de reutilizarlas.
+if os.getenv('DB_ENGINE', 'mysql') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('DB_NAME', str(BASE_DIR / 'db.sqlite3')),
+        }
     }
-}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.mysql',
+            'NAME': os.getenv('DB_NAME', 'bqdnieilyetbny8w8pae'),
+            'USER': os.getenv('DB_USER', 'ulfdx05ailcjf4rp'),
+            'PASSWORD': os.getenv('DB_PASSWORD', '8ggl3dO3Zxxzhm0jXrqs'),
+            'HOST': os.getenv('DB_HOST', 'bqdnieilyetbny8w8pae-mysql.services.clever-cloud.com'),
+            'PORT': os.getenv('DB_PORT', '3306'),
+            'OPTIONS': {
+                'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '10')),
+            },
+        }
+    }
+DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', '60'))
+DATABASES['default']['CONN_HEALTH_CHECKS'] = os.getenv('DB_CONN_HEALTH_CHECKS', '1') == '1'
+
+# Réplica de solo lectura (opcional) para reportes, dashboard y API de gráficos.
+# Se activa definiendo DB_REPLICA_HOST o DB_REPLICA_NAME; los demás datos se
+# toman de la base principal si no se indican (DB_REPLICA_PORT, DB_REPLICA_USER,
+# DB_REPLICA_PASSWORD). Ver gestion_algas/routers.py.
+if os.getenv('DB_REPLICA_HOST') or os.getenv('DB_REPLICA_NAME'):
+    DATABASES['replica'] = dict(DATABASES['default'])
+    for clave in ('NAME', 'HOST', 'PORT', 'USER', 'PASSWORD'):
+        if os.getenv(f'DB_REPLICA_{clave}'):
+            DATABASES['replica'][clave] = os.getenv(f'DB_REPLICA_{clave}')
+    # En los tests la réplica usa la misma base que 'default'
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+DATABASE_ROUTERS = ['gestion_algas.routers.ReplicaRouter']
+# Segundos que una sesión lee de la base principal después de modificar datos
+REPLICA_VENTANA_LECTURA = int(os.getenv('DB_REPLICA_VENTANA_LECTURA', '10'))
+
+# True si la base de datos puede convertir zonas horarias (en MySQL requiere
+# cargar las tablas con mysql_tzinfo_to_sql). Si no, la agrupación por día,
+# semana o mes se hace con rangos calculados en Python (ver gestion_algas/periodos.py)
+BD_ZONAS_HORARIAS = os.getenv(
+    'DB_ZONAS_HORARIAS', '0' if DATABASES['default']['ENGINE'].endswith('mysql') else '1'
+) == '1'
+
+# Probar la conexión a la base de datos al iniciar el servidor (ver wsgi.py)
+DB_PROBAR_AL_INICIAR = os.getenv('DB_PROBAR_AL_INICIAR', '1') == '1'
 
 
 
@@ -97,6 +143,13 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Hashers de contraseñas de Usuario (ver gestion_algas/hashers.py); el primero
+# se usa para los hashes nuevos y el costo se ajusta con PASSWORD_ITERACIONES
+PASSWORD_HASHERS = [
+    'gestion_algas.hashers.PBKDF2AjustableHasher',
+    'gestion_algas.hashers.ScryptAjustableHasher',
+]
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -126,14 +179,108 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-# Configuración de sesiones
+# Configuración de sesiones. SESSION_BACKEND elige dónde se guardan:
+# - cached_db (por defecto): se leen de la caché y se escriben en la base de
+#   datos solo cuando cambian
+# - cookie: firmadas en la cookie del navegador, sin consultas (el contenido,
+#   id y rol del usuario, es legible por el cliente aunque no modificable)
+# - db: solo base de datos; cache: solo caché (requiere CACHE_BACKEND=file o
+#   una caché compartida, con locmem cada proceso tiene sus sesiones)
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'cookie': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_ENGINE = SESSION_ENGINES[os.getenv('SESSION_BACKEND', 'cached_db')]
 SESSION_COOKIE_AGE = 86400  # 24 horas
-SESSION_SAVE_EVERY_REQUEST = True
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
+# La sesión no se guarda en cada petición: RenovarSesionMiddleware extiende el
+# vencimiento (ventana deslizante de SESSION_COOKIE_AGE) solo cuando pasaron
+# más de SESSION_RENOVAR_CADA segundos desde la última renovación
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_RENOVAR_CADA = int(os.getenv('SESSION_RENOVAR_CADA', '900'))
 
 # URLs de autenticación personalizada
 LOGIN_URL = 'login'
 
+# Caché: memoria local por defecto. Con CACHE_BACKEND=file se usan archivos en
+# CACHE_DIR, compartidos por todos los procesos del servidor (la memoria local
+# es propia de cada proceso, así que una invalidación no llega a los demás
+# hasta que vence el TTL)
+if os.getenv('CACHE_BACKEND', 'locmem') == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_DIR', str(BASE_DIR / 'cache')),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'gestion-algas',
+        }
+    }
+
+# Segundos que se guarda en caché el rol de cada usuario para verificar permisos
+# sin consultar la base de datos (0 = desactivado)
+USUARIO_ROL_CACHE_TTL = int(os.getenv('USUARIO_ROL_CACHE_TTL', '60'))
+
+# Auditoría de accesos (ControlAcceso): los eventos se guardan en lotes desde un
+# hilo en segundo plano. Al ejecutar los tests se escriben de inmediato.
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+AUDITORIA_ASINCRONA = os.getenv('AUDITORIA_ASINCRONA', '1') == '1' and not TESTING
+AUDITORIA_TAMANO_LOTE = 50
+AUDITORIA_INTERVALO = 2.0  # segundos
+
+# Costo de los hashes de contraseñas: cada login paga una verificación, así que
+# se elige con "python manage.py medir_login" según la latencia aceptable en el
+# cambio de turno. Al ejecutar los tests se usa un costo mínimo.
+PASSWORD_ITERACIONES = 1000 if TESTING else int(os.getenv('PASSWORD_ITERACIONES', '600000'))
+PASSWORD_SCRYPT_WORK_FACTOR = 2 ** 10 if TESTING else int(os.getenv('PASSWORD_SCRYPT_WORK_FACTOR', str(2 ** 14)))
+
+# Retención de ControlAcceso: "python manage.py archivar_auditoria" mueve los
+# accesos más antiguos que AUDITORIA_RETENCION_DIAS a archivos mensuales
+# comprimidos (fuera de MEDIA_ROOT, que puede servirse por web)
+AUDITORIA_RETENCION_DIAS = int(os.getenv('AUDITORIA_RETENCION_DIAS', '180'))
+AUDITORIA_ARCHIVO_DIR = Path(os.getenv('AUDITORIA_ARCHIVO_DIR', BASE_DIR / 'archivo_auditoria'))
+
+# Límite de logins fallidos (ver limite_login.py): sobre el límite, los intentos
+# se rechazan sin consultar la base de datos durante la ventana deslizante
+LOGIN_VENTANA_SEGUNDOS = int(os.getenv('LOGIN_VENTANA_SEGUNDOS', '300'))
+LOGIN_MAX_FALLOS_IP = int(os.getenv('LOGIN_MAX_FALLOS_IP', '20'))
+LOGIN_MAX_FALLOS_USUARIO = int(os.getenv('LOGIN_MAX_FALLOS_USUARIO', '5'))
+
+# IPs o redes (separadas por comas) de los proxies inversos delante de la
+# aplicación. Solo las peticiones que llegan desde ellos pueden indicar la IP
+# del cliente con X-Forwarded-For; sin proxies se usa REMOTE_ADDR
+PROXIES_CONFIABLES = [red.strip() for red in os.getenv('PROXIES_CONFIABLES', '').split(',') if red.strip()]
+
+# Segundos que se guardan en caché los datos compartidos del dashboard; la
+# caché se invalida al modificar registros, tipos de alga o capacidades
+# (0 = desactivada, valor usado al ejecutar los tests)
+DASHBOARD_CACHE_TTL = 0 if TESTING else int(os.getenv('DASHBOARD_CACHE_TTL', '300'))
+
+# Segundos que se guarda la serie diaria de api_produccion_semanal; la clave
+# incluye la versión de los registros, así que nunca se sirven datos viejos
+API_PRODUCCION_CACHE_TTL = 0 if TESTING else int(os.getenv('API_PRODUCCION_CACHE_TTL', '3600'))
+
+# Reportes PDF/Excel: si está activo, las vistas solo encolan el trabajo y el
+# archivo lo genera el comando "python manage.py procesar_reportes".
+# Desactivado por defecto a propósito: sin ese proceso corriendo los trabajos
+# quedarían pendientes para siempre. Activarlo (REPORTES_EN_SEGUNDO_PLANO=1)
+# al desplegar el procesador junto a los workers web.
+REPORTES_EN_SEGUNDO_PLANO = os.getenv('REPORTES_EN_SEGUNDO_PLANO', '0') == '1'
+
+# Segundos que un trabajo puede estar en proceso; pasado ese tiempo se
+# considera abandonado (el procesador se detuvo) y vuelve a la cola
+REPORTES_TIMEOUT_TRABAJO = int(os.getenv('REPORTES_TIMEOUT_TRABAJO', '1800'))
+
+# Caché en disco de reportes de rangos de fecha cerrados (0 = desactivada)
+REPORTES_CACHE_DIR = MEDIA_ROOT / 'cache_reportes'
+REPORTES_CACHE_MAX_BYTES = int(os.getenv('REPORTES_CACHE_MAX_BYTES', str(200 * 1024 * 1024)))
+
 # Mensajes de Bootstrap
 from django.contrib.messages import constants as messages
 MESSAGE_TAGS = {
@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sistema_algas.settings')
 
 application = get_wsgi_application()
+
+# Probar la base de datos al iniciar para detectar errores de configuración
+from django.conf import settings  # noqa: E402
+
+if getattr(settings, 'DB_PROBAR_AL_INICIAR', False):
+    from gestion_algas.conexion import probar_conexion_al_iniciar
+    probar_conexion_al_iniciar()